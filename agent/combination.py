@@ -1,11 +1,15 @@
 from core.llm.client import invoke_llm
 from core.llm.outputs import CombinationLLMOutput
 from core.llm.prompts.combination_prompt import combination_prompt
-from core.constants import GPU_COMBINATION_LLM
+from core.constants import GPU_COMBINATION_LLM, PRIORITY_INTERACTIVE
 
 
 async def combination_node(
-    sub_answers: list, resolved_query: str, original_query: str
+    sub_answers: list,
+    resolved_query: str,
+    original_query: str,
+    user_id: str = None,
+    token_stream=None,
 ) -> str:
     combined_prompt = combination_prompt(query=resolved_query or original_query, sub_answers=sub_answers)
 
@@ -14,6 +18,9 @@ async def combination_node(
         gpu_model=GPU_COMBINATION_LLM.model,
         port=GPU_COMBINATION_LLM.port,
         response_schema=CombinationLLMOutput,
+        priority=PRIORITY_INTERACTIVE,
+        user_id=user_id,
+        token_stream=token_stream,
     )
 
     return result.answer
@@ -1,12 +1,85 @@
+import re
+from typing import Optional
+
 from core.llm.prompts.decomposition_prompt import decomposition_prompt
 from agent.graph_helpers import get_recent_history
 from core.llm.outputs import DecompositionLLMOutput
 from core.llm.client import invoke_llm
-from core.constants import GPU_DECOMPOSITION_LLM
+from core.constants import GPU_DECOMPOSITION_LLM, PRIORITY_INTERACTIVE, SWITCHES
+from core.utils.metrics import get_metrics, increment, set_value
+
+# Words that point back into the chat history and need context resolution
+_REFERENCE_WORDS = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|theirs|he|him|his|she|her|hers|"
+    r"both|each|every|all|either|neither|former|latter|above|previous|same|such|"
+    r"there|then|one|ones|other|others|another|else|more|further|again|also)\b",
+    re.IGNORECASE,
+)
+# Signals of multi-part, comparative, temporal or enumeration questions
+_SPLIT_SIGNALS = re.compile(
+    r"\b(and|or|vs|versus|compare|compared|comparison|differ|difference|differences|between|"
+    r"pros|cons|advantages|disadvantages|list|enumerate|respectively|timeline|over time|"
+    r"trend|trends|evolve|evolved|evolution|changed|better|worse|best|worst|most|least)\b",
+    re.IGNORECASE,
+)
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+# Follow-ups this short ("why?", "more details") usually lean on the history
+SHORT_FOLLOW_UP_WORDS = 4
+
+
+def needs_decomposition_llm(question: str, recent_history: list) -> Optional[str]:
+    """
+    Cheap check run before the decomposition LLM call.
+
+    Returns:
+        str: why the question should go to the LLM (rewrite or split), or
+        None if it is a single self-contained question that can be used as is.
+    """
+    text = question.strip()
+    if not text:
+        return None
+
+    if recent_history:
+        if len(text.split()) <= SHORT_FOLLOW_UP_WORDS:
+            return "short follow-up"
+        if _REFERENCE_WORDS.search(text):
+            return "reference to chat history"
+    elif re.search(r"\b(both|each|every|all)\b", text, re.IGNORECASE):
+        return "quantifier"
 
+    if _SPLIT_SIGNALS.search(text):
+        return "multi-part signal"
+    if text.count("?") > 1 or ";" in text or text.count(",") >= 2:
+        return "several clauses"
+    if len(set(_YEAR.findall(text))) > 1:
+        return "several years"
+    return None
 
-async def decomposition_node(question: str, messages: list) -> DecompositionLLMOutput:
+
+def _record_skip_rate(skipped: bool):
+    increment("decomposition", "skipped" if skipped else "llm_calls")
+    counters = get_metrics("decomposition")
+    total = counters.get("skipped", 0) + counters.get("llm_calls", 0)
+    set_value("decomposition", "skip_rate", counters.get("skipped", 0) / total)
+
+
+async def decomposition_node(
+    question: str, messages: list, user_id: str = None
+) -> DecompositionLLMOutput:
     recent_chat_history = get_recent_history(full_history=messages, turns=5)
+
+    if SWITCHES["DECOMPOSITION_PREFILTER"]:
+        reason = needs_decomposition_llm(question, recent_chat_history)
+        _record_skip_rate(skipped=reason is None)
+        if reason is None:
+            print("Decomposition skipped: single self-contained question")
+            return DecompositionLLMOutput(
+                requires_decomposition=False,
+                resolved_query=question,
+                sub_queries=[question],
+            )
+        print(f"Decomposition needed: {reason}")
+
     prompt = decomposition_prompt(recent_history=recent_chat_history, question=question)
 
     result: DecompositionLLMOutput = await invoke_llm(
@@ -14,5 +87,7 @@ async def decomposition_node(question: str, messages: list) -> DecompositionLLMO
         gpu_model=GPU_DECOMPOSITION_LLM.model,
         port=GPU_DECOMPOSITION_LLM.port,
         response_schema=DecompositionLLMOutput,
+        priority=PRIORITY_INTERACTIVE,
+        user_id=user_id,
     )
     return result
@@ -15,8 +15,15 @@ from agent.state import AgentState
 from agent.tools.search import search_tavily as search_tool
 
 from core.constants import *
-from core.embeddings.retriever import get_user_retriever
+from core.embeddings.reranker import rerank_within_budget
+from core.embeddings.retriever import (
+    get_user_retriever,
+    lexical_search,
+    reciprocal_rank_fusion,
+)
 from core.llm.client import invoke_llm
+from core.services import parsed_store
+from core.services.query_stream import get_stream
 from core.llm.outputs import (
     MainLLMOutputExternal,
     MainLLMOutputInternal,
@@ -27,40 +34,93 @@ from core.llm.outputs import (
 os.makedirs("DEBUG", exist_ok=True)
 
 
-async def retriever(state: AgentState) -> AgentState:
-    """Retrieves documents based on the user's question.
-    This is a placeholder function that simulates document retrieval.
+async def retrieve_chunks(
+    user_id: str, thread_id: str, query: str, gpu_model: str = GPT_OSS_20B
+) -> list:
+    """
+    Retrieve the most relevant chunks of a thread for a query: CHUNK_COUNT
+    chunks, or with reranking as many of RERANK_CANDIDATES reranked chunks as
+    fit the token budget of `gpu_model`.
+
+    Returns:
+        list: [{"document_id", "title", "page_no", "content"}]
     """
+    k = RERANK_CANDIDATES if SWITCHES["RERANKING"] else CHUNK_COUNT
     start_time = time.time()
-    doc_retriever = get_user_retriever(
-        state.user_id, state.thread_id, k=CHUNK_COUNT
-    )  # try different k values
+    doc_retriever = get_user_retriever(user_id, thread_id, k=k)
     end_time = time.time()
     print(
-        f"Initialized retriever in {end_time - start_time:.2f} seconds for user {state.user_id}"
+        f"Initialized retriever in {end_time - start_time:.2f} seconds for user {user_id}"
     )
 
     start_time = time.time()
-    retrieved_docs = await doc_retriever.ainvoke(
-        state.query or state.resolved_query or state.original_query
-    )
+    if SWITCHES["HYBRID_RETRIEVAL"]:
+        retrieved_docs, lexical_docs = await asyncio.gather(
+            doc_retriever.ainvoke(query),
+            lexical_search(user_id, thread_id, query, k),
+        )
+    else:
+        retrieved_docs, lexical_docs = await doc_retriever.ainvoke(query), []
     end_time = time.time()
     print(
-        f"Retrieved {len(retrieved_docs)} documents in {end_time - start_time:.2f} seconds for user {state.user_id}"
+        f"Retrieved {len(retrieved_docs)} dense and {len(lexical_docs)} lexical documents in {end_time - start_time:.2f} seconds for user {user_id}"
     )
     retrieved_docs = [doc.model_dump() for doc in retrieved_docs]
-    modified_docs = []
+    dense_docs = []
     for doc in retrieved_docs:
         metadata = doc.get("metadata", {}) or {}
-        modified_docs.append(
+        dense_docs.append(
             {
                 "document_id": metadata.get("document_id", ""),
                 "title": metadata.get("title", "Unknown Title"),
                 "page_no": metadata.get("page_no", 1),
+                "chunk_index": metadata.get("chunk_index"),
                 "content": doc.get("page_content", ""),
             }
         )
 
+    if lexical_docs:
+        fused_docs = reciprocal_rank_fusion([dense_docs, lexical_docs], k)
+    else:
+        fused_docs = dense_docs
+
+    if SWITCHES["RERANKING"]:
+        fused_docs = await asyncio.to_thread(
+            rerank_within_budget, query, fused_docs, gpu_model
+        )
+
+    # chunk_index only identifies chunks for fusion, the prompt doesn't need it
+    return [
+        {key: value for key, value in doc.items() if key != "chunk_index"}
+        for doc in fused_docs
+    ]
+
+
+async def retriever(state: AgentState) -> AgentState:
+    """Retrieves documents based on the user's question.
+    Chunks already fetched speculatively during decomposition (chunks_prefetched)
+    are used as they are.
+    """
+    query = state.query or state.resolved_query or state.original_query
+    if state.chunks_prefetched:
+        print(f"Using {len(state.chunks)} prefetched chunks for user {state.user_id}")
+        modified_docs = state.chunks
+    else:
+        modified_docs = await retrieve_chunks(
+            state.user_id,
+            state.thread_id,
+            query,
+            gpu_model=state.llm.model if state.llm else GPT_OSS_20B,
+        )
+
+    stream = get_stream(state.stream_id)
+    if stream:
+        await stream.status(
+            "retrieval_done",
+            query=query,
+            chunks=len(modified_docs),
+        )
+
     with open(f"DEBUG/retrieved_docs.json", "w") as f:
         json.dump(modified_docs, f, indent=2)
 
@@ -70,6 +130,9 @@ async def retriever(state: AgentState) -> AgentState:
 
 async def generate(state: AgentState) -> AgentState:
     prompt = build_main_prompt(state)
+    stream = get_stream(state.stream_id)
+    if stream:
+        await stream.status("generation_started", query=state.query)
 
     async with aiofiles.open(f"DEBUG/main_prompt.json", "w") as f:
         await f.write(json.dumps(prompt, indent=2))
@@ -91,6 +154,9 @@ async def generate(state: AgentState) -> AgentState:
                 contents=prompt,
                 gpu_model=state.llm.model,
                 port=state.llm.port,
+                priority=PRIORITY_INTERACTIVE,
+                user_id=state.user_id,
+                token_stream=stream if state.stream_tokens else None,
             )
             result = response_schema.model_validate(result)
             end_time = time.time()
@@ -119,6 +185,9 @@ async def generate(state: AgentState) -> AgentState:
 async def web_search(state: AgentState) -> AgentState:
     queries = state.web_search_queries
     max_retries = 3
+    stream = get_stream(state.stream_id)
+    if stream:
+        await stream.status("web_search_started", queries=queries)
     for attempt in range(max_retries):
         try:
             results = await parallel_search(queries, search_tool)
@@ -129,6 +198,8 @@ async def web_search(state: AgentState) -> AgentState:
             )
             state.web_search_attempts += 1
             state.web_search_results = results
+            if stream:
+                await stream.status("web_search_done", queries=queries)
             return state
         except Exception as e:
             print(f"Error in web_search (attempt {attempt+1}/{max_retries}): {e}")
@@ -165,6 +236,9 @@ async def self_knowledge(state: AgentState) -> AgentState:
         return state
 
     print("Using self-knowledge to answer the question.")
+    stream = get_stream(state.stream_id)
+    if stream:
+        await stream.status("self_knowledge_started")
     prompt = build_self_knowledge_prompt(state)
     with open(f"DEBUG/self_knowledge_prompt.json", "w") as f:
         json.dump(prompt, f, indent=2)
@@ -174,6 +248,9 @@ async def self_knowledge(state: AgentState) -> AgentState:
         contents=prompt,
         gpu_model=state.llm.model,
         port=state.llm.port,
+        priority=PRIORITY_INTERACTIVE,
+        user_id=state.user_id,
+        token_stream=stream if state.stream_tokens else None,
     )
     result = SelfKnowledgeLLMOutput.model_validate(result)
     state.messages.append(AIMessage(content=result.answer))
@@ -194,39 +271,26 @@ async def document_summarizer(state: AgentState) -> AgentState:
         HumanMessage(content=f"Summarizing document with ID: {document_id}")
     )
 
-    parsed_dir = f"data/{state.user_id}/threads/{state.thread_id}/parsed"
-    os.makedirs(parsed_dir, exist_ok=True)
-    for doc in state.chunks:
-        if doc["metadata"]["document_id"] == document_id:
-            file_name = doc["metadata"]["file_name"]
-            title = doc["metadata"]["title"]
-            if not file_name:
-                print(f"Document {doc['id']} has no file name, skipping...")
-                continue
-
-            name, _ = os.path.splitext(file_name)
-            json_file_path = os.path.join(parsed_dir, f"{name}.json")
-
-            if not os.path.exists(json_file_path):
-                print(f"Parsed file {json_file_path} does not exist, skipping...")
-                continue
-
-            async with aiofiles.open(json_file_path, "r", encoding="utf-8") as f:
-                content = await f.read()
-
-            document_data = json.loads(content)
-            if document_data.get("summary"):
-                state.answer = f"Summary: \n {document_data['summary']}"
-                state.summary = f"Summary for document {document_id}, title: {title}, summary: {document_data['summary']}"
-                state.after_summary = ANSWER
-                print(
-                    f"Summary for document {document_id}, title: {title}, summary: {document_data['summary']}"
-                )
-            else:
-                state.summary = "No summary available for this document. Use your own knowledge and context to provide an answer."
-                state.after_summary = GENERATE
-                print(f"No summary found for document {document_id}")
-            break
+    # The index entry holds title and summary; the full text is never loaded
+    document_data = await parsed_store.get_entry(
+        state.user_id, state.thread_id, document_id
+    )
+    if not document_data:
+        print(f"Parsed document {document_id} does not exist, skipping...")
+        return state
+
+    title = document_data.get("title")
+    if document_data.get("summary"):
+        state.answer = f"Summary: \n {document_data['summary']}"
+        state.summary = f"Summary for document {document_id}, title: {title}, summary: {document_data['summary']}"
+        state.after_summary = ANSWER
+        print(
+            f"Summary for document {document_id}, title: {title}, summary: {document_data['summary']}"
+        )
+    else:
+        state.summary = "No summary available for this document. Use your own knowledge and context to provide an answer."
+        state.after_summary = GENERATE
+        print(f"No summary found for document {document_id}")
 
     return state
 
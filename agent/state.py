@@ -16,6 +16,7 @@ class AgentState(BaseModel):
     messages: List[BaseMessage]
 
     chunks: List[Dict[str, Any]] = Field(default_factory=list)
+    chunks_prefetched: bool = False  # chunks were retrieved speculatively, skip retrieval
     web_search: bool = False
     web_search_queries: List[str] = Field(default_factory=list)
     web_search_results: List[Dict[str, Any]] = Field(default_factory=list)
@@ -58,3 +59,7 @@ class AgentState(BaseModel):
         default_factory=list
     )  # to store initial web search results
     use_self_knowledge: bool = False
+
+    # Streaming (see core/services/query_stream.py)
+    stream_id: Optional[str] = None  # node events are pushed to this stream
+    stream_tokens: bool = False  # also push answer tokens (only for the user-facing answer)
@@ -1,3 +1,4 @@
+import asyncio
 import socketio
 
 from fastapi import FastAPI
@@ -17,8 +18,14 @@ from app.routes import (
     strategic_roadmap,
     technical_roadmap,
     documents,
+    jobs,
 )
 from app.socket_handler import sio
+from core.embeddings.registry import vectorstore_registry
+from core.llm.http_pool import close_async_clients
+from core.parsers.executor import shutdown_parser_executor
+from core.services.jobs import job_watchdog
+from core.startup import cancel_background_init, start_background_init
 
 fastapi_app = FastAPI()
 
@@ -48,5 +55,28 @@ fastapi_app.include_router(strategic_roadmap.router)
 fastapi_app.include_router(insights.router)
 fastapi_app.include_router(technical_roadmap.router)
 fastapi_app.include_router(documents.router)
+fastapi_app.include_router(jobs.router)
+
+_job_watchdog = None
+
+
+@fastapi_app.on_event("startup")
+async def startup():
+    # Database indexes and model warm-up, reported by /health/ready
+    start_background_init()
+    # Resumes upload jobs left unfinished by a stopped worker
+    global _job_watchdog
+    _job_watchdog = asyncio.create_task(job_watchdog())
+
+
+@fastapi_app.on_event("shutdown")
+async def shutdown():
+    cancel_background_init()
+    if _job_watchdog:
+        _job_watchdog.cancel()
+    vectorstore_registry.close_all()
+    await close_async_clients()
+    shutdown_parser_executor()
+
 
 app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app)
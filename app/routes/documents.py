@@ -9,7 +9,7 @@ from fastapi.responses import FileResponse
 from jwt import ExpiredSignatureError, InvalidTokenError
 
 from core.config import settings
-from core.database import db
+from core.services import thread_store
 from core.models.user import UserJwtPayload
 
 router = APIRouter(prefix="/data", tags=["documents"])
@@ -48,23 +48,10 @@ def _is_inline_media(mime_type: str | None) -> bool:
     )
 
 
-def _get_thread_document(
+async def _get_thread_document(
     user_id: str, thread_id: str, file_name: str
 ) -> Optional[Dict]:
-    projection = {f"threads.{thread_id}.documents": 1, "_id": 0}
-    user = db.users.find_one({"userId": user_id}, projection)
-    if not user:
-        return None
-
-    thread = user.get("threads", {}).get(thread_id)
-    if not thread:
-        return None
-
-    documents = thread.get("documents", [])
-    for document in documents:
-        if document.get("file_name") == file_name:
-            return document
-    return None
+    return await thread_store.find_thread_document(user_id, thread_id, file_name)
 
 
 @router.get("/{user_id}/threads/{thread_id}/uploads/{file_name:path}")
@@ -86,7 +73,7 @@ async def get_document(
     if clean_file_name != file_name:
         raise HTTPException(status_code=400, detail="Invalid file name")
 
-    document = _get_thread_document(user_id, thread_id, clean_file_name)
+    document = await _get_thread_document(user_id, thread_id, clean_file_name)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
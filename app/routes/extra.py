@@ -3,7 +3,7 @@ from fastapi import APIRouter, Body, Request, HTTPException
 import os
 import json
 from pydantic import BaseModel
-from core.database import db
+from core.services import parsed_store, thread_store
 from core.studio_features.word_cloud import generate_word_cloud
 from app.socket_handler import sio
 from core.constants import SWITCHES
@@ -39,41 +39,28 @@ async def get_word_cloud(
 
     user_id = payload.userId
 
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
+    )
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
     stop_words_dir = f"data/{user_id}/threads/{thread_id}/stop_words"
 
     combined_text = ""
     combined_stop_words = set()
 
-    # Combine text from matching parsed files
-    if os.path.exists(parsed_dir):
-        files_in_dir = os.listdir(parsed_dir)
-
-        for file_name in files_in_dir:
-            file_path = os.path.join(parsed_dir, file_name)
-
-            try:
-                async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                    content = await f.read()
-                data = json.loads(content)
-                # Get document_id from the file - try both 'id' and 'document_id' fields
-                file_document_id = data.get("id") or data.get("document_id")
-
-                # Check if this document_id is in our requested list
-                if file_document_id in body.document_ids:
-                    text_content = data.get("full_text", "")
-                    if text_content:
-                        combined_text += text_content + " "
-            except Exception as e:
-                continue
+    # Combine text of the requested parsed documents
+    for data in await parsed_store.load_documents(
+        user_id, thread_id, document_ids, with_pages=False
+    ):
+        text_content = data.get("full_text", "")
+        if text_content:
+            combined_text += text_content + " "
 
     # Combine stop words from matching files
     if os.path.exists(stop_words_dir):
@@ -124,11 +111,11 @@ async def get_mind_map(request: Request, thread_id: str):
         return {"error": "User not authenticated"}
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(user_id, thread_id, with_chats=False)
     if not thread:
         return {"error": "Thread not found"}
 
@@ -175,29 +162,22 @@ async def get_summary(request: Request, body: MindMapRequest = Body(...)):
     print(f"Fetching summary for document_id: {document_id} in thread_id: {thread_id}")
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
+    )
     if not thread:
         return {"error": "Thread not found"}
 
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
-    if not os.path.exists(parsed_dir):
+    if not os.path.exists(parsed_store.parsed_dir(user_id, thread_id)):
         return {"error": "Parsed directory does not exist"}
 
-    for filename in os.listdir(parsed_dir):
-        if filename.endswith(".json"):
-            file_path = os.path.join(parsed_dir, filename)
-            try:
-                async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                    content = await f.read()
-                data = json.loads(content)
-                if isinstance(data, dict) and data.get("id") == document_id:
-                    return {"status": True, "summary": data.get("summary")}
-            except Exception as e:
-                continue
+    document_data = await parsed_store.get_entry(user_id, thread_id, document_id)
+    if document_data:
+        return {"status": True, "summary": document_data.get("summary")}
 
     return {"status": False, "error": "Summary not yet generated. Generating..."}
 
@@ -217,11 +197,13 @@ async def get_global_summary(request: Request, body: GlobalSummaryRequest = Body
     print(f"Fetching global summary for thread_id: {thread_id}")
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
+    )
     if not thread:
         return {"error": "Thread not found"}
 
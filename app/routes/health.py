@@ -9,9 +9,22 @@ Expected Input:
 Returns:
     - JSON response with the current health status of the service.
     - Example: {"status": "ok"}
+
+GET /health/live
+    Liveness: 200 as soon as the worker serves requests.
+
+GET /health/ready
+    Readiness: 200 once the worker finished its startup (database indexes, model
+    warm-up, see core/startup.py), 503 before that.
+
+GET /health/metrics
+    Returns the in-process metrics of this worker (cache hit/miss counters, open handles, ...).
 """
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from core.startup import readiness
+from core.utils.metrics import get_metrics
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -19,3 +32,22 @@ router = APIRouter(prefix="/health", tags=["health"])
 @router.get("/")
 async def health_check():
     return {"status": "ok"}
+
+
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    state = readiness()
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ok" if state["ready"] else "starting", **state},
+    )
+
+
+@router.get("/metrics")
+async def metrics():
+    return {"status": "ok", "metrics": get_metrics()}
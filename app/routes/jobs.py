@@ -0,0 +1,41 @@
+"""
+Routes for background jobs.
+Routes:
+-------
+GET /jobs/{job_id}
+    Return the state of a background job of the authenticated user (e.g. an upload).
+    Returns (JSON):
+        - On success:
+                "job": {
+                    "jobId", "type", "threadId",
+                    "status": "queued" | "running" | "completed" | "failed",
+                    "stage": "queued" | "parsing" | "saving" | "done",
+                    "files": [{"title", "file_name", "doc_id", "status", "error"}, ...],
+                    "documents": [...documents added to the thread...],
+                    "errors": [...], "error": <message or null>,
+                    "attempts", "createdAt", "updatedAt", "heartbeatAt"
+                }
+        - On error:
+                "error": <error_message>
+"""
+
+from fastapi import APIRouter, Request
+
+from core.services.jobs import get_job
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job_status(request: Request, job_id: str):
+    payload = request.state.user
+    if not payload:
+        return {"error": "User not authenticated"}
+
+    job = await get_job(job_id, payload.userId)
+    if not job:
+        return {"error": "Job not found"}
+
+    for file_data in job.get("files", []):
+        file_data.pop("path", None)
+    return {"job": job}
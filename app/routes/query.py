@@ -1,19 +1,32 @@
 import asyncio
+import difflib
 import json
 import time
 from datetime import datetime, timezone
 from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from langchain_core.messages import AIMessage, HumanMessage
 from core.llm.outputs import DecompositionLLMOutput
 from agent.builder import Agent, AgentState
 from agent.decomposition import decomposition_node
 from agent.combination import combination_node
-from core.database import db
+from agent.graph_nodes import retrieve_chunks
+from core.services import thread_store
 from core.utils.extra_done_check import is_extra_done
-from core.constants import GPU_QUERY_LLM, GPU_QUERY_LLM2, INTERNAL, EXTERNAL, SWITCHES
+from core.constants import (
+    GPU_QUERY_LLM,
+    GPU_QUERY_LLM2,
+    INTERNAL,
+    EXTERNAL,
+    SPECULATIVE_MATCH_RATIO,
+    SWITCHES,
+)
 from agent.tools.search import search_tavily as search_tool
-from typing import Literal
+from core.services import answer_cache
+from core.services.query_stream import QueryStream, create_stream
+from core.utils.metrics import increment
+from typing import Literal, Optional
 
 router = APIRouter(prefix="/query", tags=["query"])
 
@@ -25,6 +38,22 @@ class QueryRequest(BaseModel):
     use_self_knowledge: bool = False
 
 
+# Keeps streamed query tasks referenced until they finish
+_stream_tasks = set()
+
+
+async def _load_thread(user_id: str, thread_id: str):
+    """Return (thread, None) or (None, error_response)."""
+    user = await thread_store.get_user(user_id)
+    if not user:
+        return None, {"error": "User not found"}
+
+    thread = await thread_store.get_thread(user_id, thread_id)
+    if not thread:
+        return None, {"error": "Thread not found"}
+    return thread, None
+
+
 @router.post("/")
 async def query(request: Request, body: QueryRequest):
     payload = request.state.user
@@ -32,23 +61,127 @@ async def query(request: Request, body: QueryRequest):
     if not payload:
         return {"error": "User not authenticated"}
 
-    thread_id = body.thread_id
-    question = body.question
-    mode = body.mode
-    use_self_knowledge = body.use_self_knowledge
+    print(
+        f"Received query for thread_id: {body.thread_id} with question: {body.question} and mode: {body.mode} (use_self_knowledge={body.use_self_knowledge})"
+    )
+
+    user_id = payload.userId
+    thread, error = await _load_thread(user_id, body.thread_id)
+    if error:
+        return error
+
+    return await run_query(user_id, thread, body)
+
+
+@router.post("/stream")
+async def query_stream(request: Request, body: QueryRequest):
+    """
+    Same as POST /query/ but answers with server-sent events while the agent runs:
+    status events per pipeline step, answer tokens as they are generated and
+    finally a `done` event carrying the regular /query response.
+    """
+    payload = request.state.user
+
+    if not payload:
+        return {"error": "User not authenticated"}
 
     print(
-        f"Received query for thread_id: {thread_id} with question: {question} and mode: {mode} (use_self_knowledge={use_self_knowledge})"
+        f"Received streaming query for thread_id: {body.thread_id} with question: {body.question} and mode: {body.mode}"
     )
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
-    if not user:
-        return {"error": "User not found"}
+    thread, error = await _load_thread(user_id, body.thread_id)
+    if error:
+        return error
+
+    stream = create_stream()
+
+    async def produce():
+        try:
+            response = await run_query(user_id, thread, body, stream=stream)
+            await stream.emit("done", response)
+        except Exception as e:
+            print(f"Streaming query failed: {e}")
+            await stream.emit("error", {"error": str(e)})
+        finally:
+            await stream.close()
+
+    # The query keeps running if the client disconnects so the chat is still saved
+    task = asyncio.create_task(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    return StreamingResponse(
+        stream.sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    thread = user["threads"].get(thread_id)
-    if not thread:
-        return {"error": "Thread not found"}
+
+def _start_speculation(user_id: str, thread_id: str, question: str, mode: str) -> dict:
+    """
+    Start retrieval and, in External mode, the web search for the raw question
+    so they overlap with the decomposition LLM call.
+    """
+    # Undecomposed questions are answered by GPU_QUERY_LLM, so budget chunks for it
+    tasks = {
+        "chunks": asyncio.create_task(
+            retrieve_chunks(user_id, thread_id, question, GPU_QUERY_LLM.model)
+        )
+    }
+    if mode == EXTERNAL:
+        tasks["search"] = asyncio.create_task(search_tool(question))
+    return tasks
+
+
+def _cancel_speculation(tasks: dict):
+    for task in tasks.values():
+        task.cancel()
+        # Retrieve a failure (if any) so it is not reported as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _use_speculation(
+    tasks: dict, question: str, resolved_query: str, decomposed: bool
+) -> dict:
+    """
+    Return the speculative results ({"chunks": [...], "search": {...}}) if they
+    were made for (nearly) the query that will actually run, else cancel them
+    and return {}.
+    """
+    if not tasks:
+        return {}
+    similarity = difflib.SequenceMatcher(
+        None, question.strip().lower(), resolved_query.strip().lower()
+    ).ratio()
+    if decomposed or similarity < SPECULATIVE_MATCH_RATIO:
+        increment("speculation", "discarded")
+        _cancel_speculation(tasks)
+        return {}
+
+    results = {}
+    for name, task in tasks.items():
+        try:
+            results[name] = await task
+        except Exception as e:
+            print(f"Speculative {name} failed, running it again: {e}")
+    increment("speculation", "used")
+    return results
+
+
+async def run_query(
+    user_id: str, thread: dict, body: QueryRequest, stream: Optional[QueryStream] = None
+) -> dict:
+    """
+    Run decomposition, the agent (per sub-query) and combination for a question,
+    store the exchange in the thread and return the response body.
+    If `stream` is given, progress events and answer tokens are pushed to it.
+    """
+    thread_id = body.thread_id
+    question = body.question
+    mode = body.mode
+    use_self_knowledge = body.use_self_knowledge
+    stream_id = stream.stream_id if stream else None
 
     messages = []
     chunks = []
@@ -59,23 +192,69 @@ async def query(request: Request, body: QueryRequest):
             messages.append(HumanMessage(content=message["content"]))
         elif message["type"] == "agent":
             messages.append(AIMessage(content=message["content"]))
-    ds = time.time()
-    if SWITCHES["DECOMPOSITION"]:
-        decomposition_result: DecompositionLLMOutput = await decomposition_node(
-            question, messages
+    # Before any retrieval, so an upload finishing meanwhile keeps this answer out of the cache
+    cache_version = await answer_cache.current_version(user_id, thread_id)
+    speculation = {}
+    if SWITCHES["SPECULATIVE_RETRIEVAL"]:
+        speculation = _start_speculation(user_id, thread_id, question, mode)
+
+    # Until the speculative tasks are used or discarded, any failure must cancel them
+    try:
+        ds = time.time()
+        if SWITCHES["DECOMPOSITION"]:
+            decomposition_result: DecompositionLLMOutput = await decomposition_node(
+                question, messages, user_id=user_id
+            )
+        else:
+            decomposition_result = DecompositionLLMOutput(
+                requires_decomposition=False, resolved_query=question, sub_queries=[]
+            )
+
+        de = time.time() - ds
+        print(f"Rewrite query time: {de:.2f} seconds")
+        decomposed = decomposition_result.requires_decomposition
+        if stream:
+            await stream.status(
+                "decomposition_done",
+                decomposed=decomposed,
+                resolved_query=decomposition_result.resolved_query,
+                sub_queries=decomposition_result.sub_queries if decomposed else [],
+            )
+
+        # Repeated or near-duplicate questions of the thread reuse the earlier answer
+        resolved_query = decomposition_result.resolved_query or question
+        cached = await answer_cache.lookup(
+            user_id, thread_id, mode, use_self_knowledge, resolved_query, cache_version
         )
-    else:
-        decomposition_result = DecompositionLLMOutput(
-            requires_decomposition=False, resolved_query=question, sub_queries=[]
+        if not cached:
+            speculative = await _use_speculation(
+                speculation, question, resolved_query, decomposed
+            )
+    except BaseException:
+        _cancel_speculation(speculation)
+        raise
+
+    if cached:
+        _cancel_speculation(speculation)
+        if stream:
+            await stream.status(
+                "answer_cache_hit", cached_query=cached["resolved_query"]
+            )
+            await stream.token(cached["answer"])
+            await stream.emit("sources", cached["sources"])
+        return await _save_exchange(
+            user_id,
+            thread_id,
+            question,
+            cached["answer"],
+            cached["sources"],
+            use_self_knowledge,
         )
 
-    de = time.time() - ds
-    print(f"Rewrite query time: {de:.2f} seconds")
-    decomposed = decomposition_result.requires_decomposition
     all_favicons = []
     start_time = time.time()
     if decomposed:
-        can_use_second_model = is_extra_done(user_id, thread_id)
+        can_use_second_model = await is_extra_done(user_id, thread_id)
         print("Query to be decomposed")
         print("No of sub-queries:", len(decomposition_result.sub_queries))
 
@@ -101,6 +280,7 @@ async def query(request: Request, body: QueryRequest):
                         initial_search_results=query_data["results"] or [],
                         mode=mode,
                         use_self_knowledge=use_self_knowledge,
+                        stream_id=stream_id,
                     )
                 )
 
@@ -119,6 +299,10 @@ async def query(request: Request, body: QueryRequest):
                 print(
                     f"Sub-query '{idx}. {query_data['query']}' processed in {qe:.2f} seconds using {model}"
                 )
+                if stream:
+                    await stream.status(
+                        "sub_query_done", index=idx, sub_query=query_data["query"]
+                    )
 
                 results[idx] = {
                     "sub_query": query_data["query"],
@@ -127,6 +311,10 @@ async def query(request: Request, body: QueryRequest):
 
         # Prepare a queue of sub-queries
         if mode == EXTERNAL:
+            if stream:
+                await stream.status(
+                    "web_search_started", queries=decomposition_result.sub_queries
+                )
             search_results = await asyncio.gather(
                 *(
                     search_tool(sub_query)
@@ -215,8 +403,14 @@ async def query(request: Request, body: QueryRequest):
         await asyncio.gather(*workers)
 
         cs = time.time()
+        if stream:
+            await stream.status("combination_started")
         answer = await combination_node(
-            results, decomposition_result.resolved_query, question
+            results,
+            decomposition_result.resolved_query,
+            question,
+            user_id=user_id,
+            token_stream=stream,
         )
         ce = time.time() - cs
         print(f"Subqueries combination time: {ce:.2f} seconds")
@@ -224,9 +418,14 @@ async def query(request: Request, body: QueryRequest):
         print("Query not being decomposed")
 
         if mode == EXTERNAL:
-            search_result = await search_tool(
-                decomposition_result.resolved_query or question
-            )
+            if stream:
+                await stream.status(
+                    "web_search_started",
+                    queries=[resolved_query],
+                )
+            search_result = speculative.get("search")
+            if search_result is None:
+                search_result = await search_tool(resolved_query)
         else:
             search_result = {}
 
@@ -246,9 +445,6 @@ async def query(request: Request, body: QueryRequest):
             r.pop("score", None)
             r.pop("favicon", None)
 
-        resolved_query = (
-            getattr(decomposition_result, "resolved_query", None) or question
-        )
         state = await Agent.ainvoke(
             AgentState(
                 user_id=user_id,
@@ -263,6 +459,10 @@ async def query(request: Request, body: QueryRequest):
                 initial_search_answer=search_result.get("answer", ""),
                 initial_search_results=search_result.get("results", []),
                 use_self_knowledge=use_self_knowledge,
+                stream_id=stream_id,
+                stream_tokens=True,
+                chunks=speculative.get("chunks") or [],
+                chunks_prefetched="chunks" in speculative,
             )
         )
 
@@ -309,6 +509,10 @@ async def query(request: Request, body: QueryRequest):
         )
 
     print(f"Found {len(documents_used)} citation matches")
+    if stream:
+        await stream.emit(
+            "sources", {"documents_used": modified_used, "web_used": all_favicons}
+        )
 
     with open("debug_agent_response.json", "w", encoding="utf-8") as f:
         json.dump(
@@ -331,7 +535,31 @@ async def query(request: Request, body: QueryRequest):
             indent=4,
         )
 
-    # Update the thread with the new messages
+    sources = {"documents_used": modified_used, "web_used": all_favicons}
+    await answer_cache.store(
+        user_id,
+        thread_id,
+        mode,
+        use_self_knowledge,
+        resolved_query,
+        answer,
+        sources,
+        cache_version,
+    )
+    return await _save_exchange(
+        user_id, thread_id, question, answer, sources, use_self_knowledge
+    )
+
+
+async def _save_exchange(
+    user_id: str,
+    thread_id: str,
+    question: str,
+    answer: str,
+    sources: dict,
+    use_self_knowledge: bool,
+) -> dict:
+    """Store the question and answer in the thread and return the /query response."""
     now = datetime.now(timezone.utc)
     new_messages = [
         {"type": "user", "content": question, "timestamp": now},
@@ -339,27 +567,18 @@ async def query(request: Request, body: QueryRequest):
             "type": "agent",
             "content": answer,
             "timestamp": now,
-            "sources": {"documents_used": modified_used, "web_used": all_favicons},
+            "sources": sources,
         },
     ]
 
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$push": {f"threads.{thread_id}.chats": {"$each": new_messages}},
-            "$set": {f"threads.{thread_id}.updatedAt": now},
-        },
-    )
+    await thread_store.add_chat_messages(user_id, thread_id, new_messages)
 
     response = {
         "thread_id": thread_id,
         "user_id": user_id,
         "question": question,
         "answer": answer,
-        "sources": {
-            "documents_used": modified_used,
-            "web_used": all_favicons,
-        },
+        "sources": sources,
         "use_self_knowledge": use_self_knowledge,
     }
 
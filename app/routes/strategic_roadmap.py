@@ -5,7 +5,7 @@ import json
 from fastapi import APIRouter, Body, Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from core.database import db
+from core.services import parsed_store, thread_store
 from core.models.document import Document
 from core.studio_features.strategic_roadmap import generate_strategic_roadmap
 from app.socket_handler import sio
@@ -35,30 +35,20 @@ async def get_strategic_roadmap(
     document_id = body.document_id
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
+    )
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    # Locate the parsed document to retrieve metadata (e.g., title)
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
-    document_data = None
-    if os.path.exists(parsed_dir):
-        for filename in os.listdir(parsed_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(parsed_dir, filename)
-                try:
-                    async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                        content = await f.read()
-                    data = json.loads(content)
-                    if isinstance(data, dict) and data.get("id") == document_id:
-                        document_data = data
-                        break
-                except Exception:
-                    continue
+    # Load the parsed document (looked up by id in the thread's parsed store)
+    document_data = await parsed_store.load_document(
+        user_id, thread_id, document_id, with_pages=False
+    )
 
     if document_data is None:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -72,7 +62,7 @@ async def get_strategic_roadmap(
     async def _generate_and_write():
         try:
             doc = Document.model_validate(document_data)
-            result = await generate_strategic_roadmap(doc)
+            result = await generate_strategic_roadmap(doc, user_id=user_id)
             # Persist the strategic roadmap output
             async with aiofiles.open(roadmap_path, "w", encoding="utf-8") as f:
                 await f.write(
@@ -154,34 +144,27 @@ async def strategic_roadmap_global(
     thread_id = body.thread_id
 
     user_id = payload.userId
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    thread = user["threads"].get(thread_id)
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
+    )
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
     # Load all parsed documents for this thread
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
     documents: list[Document] = []
-    if os.path.exists(parsed_dir):
-        for filename in os.listdir(parsed_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(parsed_dir, filename)
-                try:
-                    async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                        content = await f.read()
-                    data = json.loads(content)
-                    if isinstance(data, dict):
-                        try:
-                            documents.append(Document.model_validate(data))
-                        except Exception:
-                            # Skip invalid document entries gracefully
-                            print(f"Skipping invalid document in strategic roadmap global: {file_path}")
-                            continue
-                except Exception:
-                    continue
+    for data in await parsed_store.load_documents(
+        user_id, thread_id, with_pages=False
+    ):
+        try:
+            documents.append(Document.model_validate(data))
+        except Exception:
+            # Skip invalid document entries gracefully
+            print(f"Skipping invalid document in strategic roadmap global: {data.get('id')}")
+            continue
 
     if not documents:
         raise HTTPException(status_code=404, detail="No documents found for thread")
@@ -194,7 +177,7 @@ async def strategic_roadmap_global(
     async def _generate_and_write_global():
         try:
             # Pass a list[Document] to the generator (it supports list input downstream)
-            result = await generate_strategic_roadmap(documents)
+            result = await generate_strategic_roadmap(documents, user_id=user_id)
             async with aiofiles.open(roadmap_path, "w", encoding="utf-8") as f:
                 await f.write(
                     json.dumps(result.model_dump(), ensure_ascii=False, indent=2)
@@ -2,12 +2,15 @@
 Routes for thread management functionality.
 """
 
-import datetime
+import asyncio
 import uuid
 from fastapi import APIRouter, Request
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from core.database import db
+from core.embeddings.lexical import delete_index, mark_complete
+from core.embeddings.registry import invalidate_vectorstore
+from core.embeddings.vectorstore import delete_thread_vectors
+from core.services import thread_store
 
 router = APIRouter(prefix="/thread", tags=["thread"])
 
@@ -27,28 +30,15 @@ async def create_thread(request: Request, thread_data: ThreadCreateRequest):
     user_id = payload.userId
 
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
     # Create new thread
     thread_id = str(uuid.uuid4())[:7]
-    now = datetime.datetime.now(datetime.timezone.utc)
-
-    new_thread = {
-        f"threads.{thread_id}": {
-            "thread_name": thread_data.thread_name,
-            "documents": [],
-            "chats": [],
-            "createdAt": now,
-            "updatedAt": now,
-            "extra_done": False,
-            "mindmap_enabled": False,
-        }
-    }
-
-    # Add thread to user
-    db.users.update_one({"userId": user_id}, {"$set": new_thread})
+    await thread_store.create_thread(user_id, thread_id, thread_data.thread_name)
+    # A new thread has no chunks yet, so its BM25 index is complete (no backfill)
+    await asyncio.to_thread(mark_complete, user_id, thread_id)
 
     return {
         "status": "success",
@@ -68,17 +58,18 @@ async def get_thread(request: Request, thread_id: str):
     user_id = payload.userId
 
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
     # Check if thread exists
-    if thread_id not in user.get("threads", {}):
+    thread = await thread_store.get_thread(user_id, thread_id)
+    if thread is None:
         return {"error": "Thread not found"}
 
     return {
         "status": "success",
-        "thread": user["threads"][thread_id],
+        "thread": thread,
     }
 
 
@@ -93,18 +84,18 @@ async def get_threads(request: Request):
     user_id = payload.userId
 
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
-    return {"status": "success", "threads": user.get("threads", {})}
+    return {"status": "success", "threads": await thread_store.list_threads(user_id)}
 
 
 class ThreadUpdateRequest(BaseModel):
     thread_name: str
 
 
-def _get_authenticated_user(request: Request):
+async def _get_authenticated_user(request: Request):
     """Retrieve the authenticated user payload and database document."""
 
     payload = request.state.user
@@ -113,7 +104,7 @@ def _get_authenticated_user(request: Request):
 
     user_id = payload.userId
 
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return None, None, {"error": "User not found"}
 
@@ -130,20 +121,19 @@ async def delete_thread(request: Request, thread_id: str):
     user_id = payload.userId
 
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"status": False, "error": "User not found"}
 
     # Check if thread exists
-    if thread_id not in user.get("threads", {}):
+    if not await thread_store.thread_exists(user_id, thread_id):
         return {"status": False, "error": "Thread not found"}
 
     # Delete thread
-    result = db.users.update_one(
-        {"userId": user_id}, {"$unset": {f"threads.{thread_id}": ""}}
-    )
-
-    if result.modified_count == 1:
+    if await thread_store.delete_thread(user_id, thread_id):
+        await asyncio.to_thread(delete_thread_vectors, user_id, thread_id)
+        invalidate_vectorstore(user_id, thread_id)
+        delete_index(user_id, thread_id)
         return {"status": True}
     else:
         return {"status": False}
@@ -161,25 +151,15 @@ async def update_thread(
     user_id = payload.userId
 
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         return {"error": "User not found"}
 
-    # Check if thread exists
-    if thread_id not in user.get("threads", {}):
-        return {"error": "Thread not found"}
-
     # Update thread name
-    now = datetime.datetime.now(datetime.timezone.utc)
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                f"threads.{thread_id}.thread_name": thread_data.thread_name,
-                f"threads.{thread_id}.updatedAt": now,
-            }
-        },
-    )
+    if not await thread_store.update_thread(
+        user_id, thread_id, thread_name=thread_data.thread_name
+    ):
+        return {"error": "Thread not found"}
 
     return {
         "status": "success",
@@ -193,7 +173,7 @@ async def update_thread(
 async def delete_thread(request: Request, thread_id: str):
     """Delete a thread for the authenticated user."""
 
-    payload, user, error_response = _get_authenticated_user(request)
+    payload, user, error_response = await _get_authenticated_user(request)
     if error_response:
         print(f"DELETE /thread/{thread_id} - {error_response['error']}")
         return error_response
@@ -206,17 +186,16 @@ async def delete_thread(request: Request, thread_id: str):
         print(f"DELETE /thread/{thread_id} - Thread ID is required")
         return {"error": "Thread ID is required"}
 
-    if thread_id not in user.get("threads", {}):
+    if not await thread_store.thread_exists(user_id, thread_id):
         print(f"DELETE /thread/{thread_id} - Thread not found")
         return {"error": "Thread not found"}
 
     try:
-        # Remove thread from user
-        result = db.users.update_one(
-            {"userId": user_id}, {"$unset": {f"threads.{thread_id}": ""}}
-        )
-
-        if result.modified_count > 0:
+        # Remove thread with its documents and chats
+        if await thread_store.delete_thread(user_id, thread_id):
+            await asyncio.to_thread(delete_thread_vectors, user_id, thread_id)
+            invalidate_vectorstore(user_id, thread_id)
+            delete_index(user_id, thread_id)
             print(f"DELETE /thread/{thread_id} - Thread deleted successfully")
             return {
                 "status": "success",
@@ -239,35 +218,21 @@ async def delete_thread(request: Request, thread_id: str):
 async def delete_chat_from_thread(request: Request, thread_id: str, chat_index: int):
     """Delete a specific chat message by index from a thread."""
 
-    payload, user, error_response = _get_authenticated_user(request)
+    payload, user, error_response = await _get_authenticated_user(request)
     if error_response:
         return error_response
 
     user_id = payload.userId
 
-    thread = user.get("threads", {}).get(thread_id)
-    if not thread:
+    if not await thread_store.thread_exists(user_id, thread_id):
         return {"error": "Thread not found"}
 
-    chats = thread.get("chats", [])
-
-    if not isinstance(chat_index, int) or chat_index < 0 or chat_index >= len(chats):
+    updated_chats = None
+    if isinstance(chat_index, int):
+        updated_chats = await thread_store.delete_chat_message(user_id, thread_id, chat_index)
+    if updated_chats is None:
         return {"error": "Invalid chat index"}
 
-    updated_chats = chats[:chat_index] + chats[chat_index + 1 :]
-
-    now = datetime.datetime.now(datetime.timezone.utc)
-
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                f"threads.{thread_id}.chats": updated_chats,
-                f"threads.{thread_id}.updatedAt": now,
-            }
-        },
-    )
-
     return {
         "status": "success",
         "message": "Chat deleted successfully",
@@ -281,26 +246,16 @@ async def delete_chat_from_thread(request: Request, thread_id: str, chat_index:
 async def clear_thread_chats(request: Request, thread_id: str):
     """Remove all chat messages from a thread."""
 
-    payload, user, error_response = _get_authenticated_user(request)
+    payload, user, error_response = await _get_authenticated_user(request)
     if error_response:
         return error_response
 
     user_id = payload.userId
 
-    if thread_id not in user.get("threads", {}):
+    if not await thread_store.thread_exists(user_id, thread_id):
         return {"error": "Thread not found"}
 
-    now = datetime.datetime.now(datetime.timezone.utc)
-
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                f"threads.{thread_id}.chats": [],
-                f"threads.{thread_id}.updatedAt": now,
-            }
-        },
-    )
+    await thread_store.clear_chat_messages(user_id, thread_id)
 
     return {
         "status": "success",
@@ -9,13 +9,18 @@ POST /upload/
         - files: Optional list of files to upload (multipart/form-data)
         - thread_id: Optional string, existing thread ID to associate files with (form field)
         - thread_name: Optional string, name for a new thread if thread_id is not provided (form field)
+        - wait: Optional bool (form field). If true, block until the files are processed (old behaviour).
         - User authentication must be present in request.state.user
     Behavior:
         - If no files are provided and thread_name is provided (and no thread_id): create a new thread and return it with empty documents.
         - If thread_id is provided and no files are provided: do nothing and return the thread_id with empty documents.
+        - Otherwise the files are saved and a background job parses and indexes them. The response
+          carries its job_id and empty documents; progress is pushed on `{user_id}/progress` and
+          can be polled at GET /jobs/{job_id}. With wait=true the processed documents are returned.
     Returns (JSON):
         - On success:
                 "thread_id": <thread_id>,
+                "job_id": <job_id> (only when files were uploaded),
                 "documents": [
                         {"docId": <document_id>,
                          "title": <document_title>,
@@ -27,20 +32,17 @@ POST /upload/
                 "error": <error_message>
 """
 
+import asyncio
 import datetime
 import uuid
-import asyncio
 from typing import List, Optional
 
 from fastapi import APIRouter, File, Form, Request, UploadFile
 
-from core.database import db
-from core.embeddings.vectorstore import save_documents_to_store
-from core.parsers.process_files import process_files
+from core.embeddings import lexical
+from core.services import thread_store
+from core.services.jobs import create_upload_job, run_upload_job, start_job
 from core.services.upload_files import upload_files
-from core.models.document import Documents
-from core.studio_features.summarizer import summarize_documents
-from core.studio_features.word_cloud import create_stop_words
 from app.socket_handler import sio
 from core.utils.extra_done_check import mark_extra_done
 from core.constants import SWITCHES
@@ -54,6 +56,7 @@ async def upload_file(
     files: Optional[List[UploadFile]] = File(None),
     thread_id: Optional[str] = Form(None),
     thread_name: Optional[str] = Form(None),
+    wait: bool = Form(False),
 ):
     """Handle multiple file uploads."""
     file_count = len(files) if files else 0
@@ -67,7 +70,7 @@ async def upload_file(
     user_id = payload.userId
     await sio.emit(f"{user_id}/progress", {"message": "request for upload received"})
     # Find user in DB
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         print(f"User {user_id} not found in database")
         await sio.emit(f"{user_id}/progress", {"message": "User not found"})
@@ -83,8 +86,7 @@ async def upload_file(
         if thread_id:
             # Validate the thread belongs to user, but make no modifications
             print(f"No files provided. Returning existing thread_id: {thread_id}")
-            user_threads = user.get("threads", {})
-            if thread_id not in user_threads:
+            if not await thread_store.thread_exists(user_id, thread_id):
                 print(f"Thread {thread_id} not found for user {user_id}")
                 await sio.emit(f"{user_id}/progress", {"message": "Thread not found"})
                 return {"error": "Thread not found for the user"}
@@ -100,18 +102,15 @@ async def upload_file(
             if thread_name:
                 print("No files provided. Creating a new thread only.")
                 thread_id = str(uuid.uuid4())[:7]
-                new_thread = {
-                    f"threads.{thread_id}": {
-                        "thread_name": thread_name or "New Thread",
-                        "documents": [],
-                        "chats": [],
-                        "createdAt": now,
-                        "updatedAt": now,
-                        "extra_done": False,
-                        "mindmap_enabled": SWITCHES["MIND_MAP"],
-                    }
-                }
-                db.users.update_one({"userId": user_id}, {"$set": new_thread})
+                await thread_store.create_thread(
+                    user_id,
+                    thread_id,
+                    thread_name or "New Thread",
+                    mindmap_enabled=SWITCHES["MIND_MAP"],
+                    now=now,
+                )
+                # A new thread has no chunks yet, so its BM25 index is complete (no backfill)
+                await asyncio.to_thread(lexical.mark_complete, user_id, thread_id)
                 return {
                     "status": "success",
                     "message": "Thread created with no files",
@@ -129,77 +128,39 @@ async def upload_file(
     if not thread_id:
         print("Creating a new thread")
         thread_id = str(uuid.uuid4())[:7]
-        new_thread = {
-            f"threads.{thread_id}": {
-                "thread_name": thread_name or "New Thread",
-                "documents": [],
-                "chats": [],
-                "createdAt": now,
-                "updatedAt": now,
-                "extra_done": False,
-                "mindmap_enabled": SWITCHES["MIND_MAP"],
-            }
-        }
-        db.users.update_one({"userId": user_id}, {"$set": new_thread})
+        await thread_store.create_thread(
+            user_id,
+            thread_id,
+            thread_name or "New Thread",
+            mindmap_enabled=SWITCHES["MIND_MAP"],
+            now=now,
+        )
+        await asyncio.to_thread(lexical.mark_complete, user_id, thread_id)
     else:
-        mark_extra_done(user_id, thread_id, False)
+        await mark_extra_done(user_id, thread_id, False)
         print(f"Updating existing thread with ID: {thread_id}")
         # Check if thread exists for this user
-        user_threads = user.get("threads", {})
-        if thread_id not in user_threads:
+        if not await thread_store.update_thread(
+            user_id, thread_id, updatedAt=now, mindmap_enabled=SWITCHES["MIND_MAP"]
+        ):
             print(f"Thread {thread_id} not found for user {user_id}")
             return {"error": "Thread not found for the user"}
 
-        db.users.update_one(
-            {"userId": user_id},
-            {
-                "$set": {
-                    f"threads.{thread_id}.updatedAt": now,
-                    f"threads.{thread_id}.mindmap_enabled": SWITCHES["MIND_MAP"],
-                }
-            },
-        )
-
     # Upload and parse files
     files_data = await upload_files(files, user_id, thread_id)
     if not files_data:
         return {"error": "No files uploaded or failed to upload files"}
 
-    parsed_data: Documents = await process_files(files_data, user_id, thread_id)
-
-    asyncio.create_task(summarize_documents(parsed_data.model_copy()))
-    # Check if any documents were successfully parsed
-    if not parsed_data.documents:
-        return {"error": "No documents could be processed successfully"}
-
-    # Build document objects for DB
-    parsed_data_dict = parsed_data.model_dump()
-    documents_to_add = [
-        {
-            "docId": doc.get("id"),
-            "title": doc.get("title"),
-            "type": doc.get("type"),
-            "time_uploaded": now,
-            "file_name": doc.get("file_name"),
-        }
-        for doc in parsed_data_dict.get("documents", [])
-    ]
-
-    # Add document objects to the thread
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$push": {f"threads.{thread_id}.documents": {"$each": documents_to_add}},
-            "$set": {f"threads.{thread_id}.updatedAt": now},
-        },
-    )
-
-    # Save documents to vector store
-    await save_documents_to_store(parsed_data, user_id, thread_id)
+    # Parsing and indexing run as a background job so the request returns right away
+    job = await create_upload_job(user_id, thread_id, files_data)
+    if wait:
+        return await run_upload_job(job["jobId"])
 
+    start_job(job["jobId"])
     return {
         "status": "success",
-        "message": "Files uploaded and processed",
+        "message": "Files uploaded, processing started",
         "thread_id": thread_id,
-        "documents": documents_to_add,
+        "job_id": job["jobId"],
+        "documents": [],
     }
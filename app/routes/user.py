@@ -1,9 +1,11 @@
+import asyncio
 import jwt
 import uuid
 
 from fastapi import APIRouter, HTTPException, Request
 from core.config import settings
-from core.database import db
+from core.database import async_db
+from core.services import thread_store
 from core.models.user import (
     UserCreateModel,
     UserJwtPayload,
@@ -15,25 +17,27 @@ router = APIRouter(prefix="/user", tags=["user"])
 
 
 @router.post("/")
-def create_user(user_input: UserCreateModel):
+async def create_user(user_input: UserCreateModel):
     print("Creating user with input:", user_input.model_dump())
-    if db.users.find_one({"email": user_input.email}):
+    if await async_db.users.find_one({"email": user_input.email}):
         raise HTTPException(status_code=400, detail="Email already exists")
 
     user_dict = user_input.model_dump()
     print("Creating user with input:", user_dict)
     name_filtered = user_dict["name"].strip().lower().replace(" ", "_")
     user_dict["name"] = user_dict["name"].strip().title()
-    user_dict["password"] = hash_password(user_dict["password"])
+    user_dict["password"] = await asyncio.to_thread(
+        hash_password, user_dict["password"]
+    )
     user_dict["userId"] = f"{name_filtered}_{uuid.uuid4().hex[:6]}"
     user_dict["is_active"] = True
     user_dict["threads"] = {}
 
-    result = db.users.insert_one(user_dict)
+    result = await async_db.users.insert_one(user_dict)
     
     print("User created with ID:", result.inserted_id)
 
-    created_user = db.users.find_one(
+    created_user = await async_db.users.find_one(
         {"_id": result.inserted_id}, {"password": 0, "_id": 0}
     )
     return {
@@ -44,7 +48,7 @@ def create_user(user_input: UserCreateModel):
 
 
 @router.get("/{user_id}")
-def get_user(request: Request, user_id: str):
+async def get_user(request: Request, user_id: str):
     payload = request.state.user
     if not payload:
         raise HTTPException(status_code=401, detail="User not authenticated")
@@ -52,10 +56,11 @@ def get_user(request: Request, user_id: str):
     if payload.userId != user_id:
         raise HTTPException(status_code=403, detail="Access denied to this user")
 
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         print("User not found for userId:", user_id)
         raise HTTPException(status_code=404, detail="User not found")
+    user["threads"] = await thread_store.list_threads(user_id)
     return {
         "status": "success",
         "message": "User retrieved successfully",
@@ -64,12 +69,15 @@ def get_user(request: Request, user_id: str):
 
 
 @router.post("/login")
-def login_user(user_input: UserLoginModel):
+async def login_user(user_input: UserLoginModel):
     user_data = user_input.model_dump()
     print("Login attempt with input:", user_data)
 
-    user = db.users.find_one({"email": user_data["email"]}, {"_id": 0})
-    if not user or not verify_password(user_data["password"], user["password"]):
+    user = await async_db.users.find_one({"email": user_data["email"]}, {"_id": 0})
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not user or not await asyncio.to_thread(
+        verify_password, user_data["password"], user["password"]
+    ):
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     token = jwt.encode(
@@ -84,6 +92,7 @@ def login_user(user_input: UserLoginModel):
     )
 
     user.pop("password", None)
+    user["threads"] = await thread_store.list_threads(user["userId"])
     print("User logged in successfully:", user["userId"])
     return {
         "status": "success",
@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     SECRET_KEY: str
     DATABASE_NAME: str = "bedrock"
+    MONGO_MAX_POOL_SIZE: int = 50  # connections per client per worker
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_TIMEOUT_MS: int = 5000  # default timeout of every Mongo operation, 0 = none
     MODE: str = "development"
     API_KEY_1: str
     API_KEY_2: str
@@ -19,6 +22,17 @@ class Settings(BaseSettings):
     VISION_URL: str
     REMOTE_GPU: bool = False
     USE_VISION_MODEL: bool = False
+    OLLAMA_NUM_PARALLEL: int = 1
+    PARSER_MAX_WORKERS: int = 0  # 0 = derive from CPU count
+    PDF_SHARD_SIZE: int = 50  # pages per parsing shard, 0 disables sharding
+    VISION_BATCH_SIZE: int = 4  # images per local vision request, 1 disables batching
+    VECTORSTORE_LAYOUT: str = "thread"  # "thread": one Chroma collection per thread, "user": one shared per user
+    EMBEDDING_BACKEND: str = "torch"  # "torch" or "onnx" (pip install -r requirements-onnx.txt); switching needs a re-ingest
+    EMBEDDING_ONNX_FILE: str = "onnx/model_quint8_avx2.onnx"  # int8 export used by the onnx backend
+    EMBEDDING_BATCH_SIZE: int = 64  # texts per forward pass
+    EMBEDDING_NUM_THREADS: int = 0  # CPU threads for embedding, 0 = derive from CPU count
+    PARSED_DOCUMENT_FORMAT: str = "docpack"  # "docpack" (msgpack + zstd, needs msgpack and zstandard) or "json"
+    PRELOAD_MODELS: bool = False  # load models in the gunicorn master (--preload) and share them with workers
 
     class Config:
         env_file = ".env"
@@ -1,3 +1,4 @@
+import os
 from core.models.gpu_config import GPULLMConfig
 from core.config import settings
 
@@ -10,18 +11,119 @@ SWITCHES = {
     "FALLBACK_TO_OPENAI": False,  # Fallback to OpenAI if BOTH Ollama and Gemini fails
     "DECOMPOSITION": True,  # Decomposition of query into sub-queries. This also serves as rewriting the query according to the context of the previous chat history.
                             # This can be turned off if all the queries are independent and do not need context from previous chats.
+    "DECOMPOSITION_PREFILTER": True,  # Skip the decomposition LLM call for single self-contained questions (cheap heuristics, see agent/decomposition.py)
+    "SPECULATIVE_RETRIEVAL": True,  # Start retrieval (and web search in External mode) for the raw question while decomposition runs
+    "HYBRID_RETRIEVAL": True,  # Fuse dense (Chroma) and BM25 (per-thread lexical index) results with reciprocal rank fusion
+    "RERANKING": True,  # Over-fetch chunks and rerank them with a CPU cross-encoder under a token budget (core/embeddings/reranker.py)
 
     "REMOTE_GPU": settings.REMOTE_GPU,  # Use remote GPU LLMs
     # please refer to core/Setup_Local_ollama.md for setting up local LLM server
 }
 CHUNK_COUNT = 12  # Number of chunks to retrieve from vector DB for each query
+SPECULATIVE_MATCH_RATIO = 0.9  # difflib similarity of resolved query and raw question needed to reuse speculative results
+RRF_K = 60  # reciprocal rank fusion constant, score = sum(1 / (RRF_K + rank))
+# Reranking (used if SWITCHES["RERANKING"] = True)
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 30  # chunks fetched from each retriever before reranking
+RETRIEVAL_TOKEN_BUDGET = 6000  # max tokens of chunks put into one main prompt
+RERANK_MIN_CHUNKS = 3  # always kept, even if they score low
+RERANK_MIN_SCORE = 0.05  # relevance probability below which further chunks are dropped
+VECTORSTORE_MAX_OPEN_HANDLES = 32  # Max number of users whose Chroma store is kept open (LRU evicted)
+VECTORSTORE_LAYOUT = settings.VECTORSTORE_LAYOUT  # "thread" or "user", see core/embeddings/vectorstore.py
+EMBEDDING_CACHE_PATH = "data/_cache/embeddings.sqlite3"  # chunk embeddings shared across users/threads
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000  # ~0.8 KB per all-MiniLM vector, LRU evicted
+
+# Parser process pool size per app worker. Default splits the cores between the
+# 4 gunicorn workers of docker-entrypoint.sh, capped so huge boxes don't spawn dozens
+GUNICORN_WORKERS = 4
+PARSER_MAX_WORKERS = settings.PARSER_MAX_WORKERS or max(
+    1, min(8, (os.cpu_count() or 1) // GUNICORN_WORKERS)
+)
+
+# Embedding engine (core/embeddings/engine.py)
+EMBEDDING_BACKEND = settings.EMBEDDING_BACKEND
+EMBEDDING_ONNX_FILE = settings.EMBEDDING_ONNX_FILE
+EMBEDDING_BATCH_SIZE = settings.EMBEDDING_BATCH_SIZE
+EMBEDDING_NUM_THREADS = settings.EMBEDDING_NUM_THREADS or max(
+    1, (os.cpu_count() or 1) // GUNICORN_WORKERS
+)
+EMBEDDING_QUERY_BATCH_SIZE = 32  # concurrent query embeddings encoded together
+EMBEDDING_QUERY_BATCH_WAIT = 0.005  # seconds a query waits for others to join its batch
+
+OCR_MAX_WORKERS = max(1, min(4, (os.cpu_count() or 1) // GUNICORN_WORKERS))  # Tesseract processes per app worker
+OCR_BATCH_SIZE = 8  # images per OCR pool submission
+OCR_BATCH_TIMEOUT = 0.2  # seconds to wait for a batch to fill
+OCR_MAX_PENDING_PER_UPLOAD = 16  # images of one user parsed concurrently (vision or OCR)
+# Images skipped before OCR/vision: tiny files, tiny sides, or flat (decorative) content
+OCR_MIN_FILE_BYTES = 1024
+OCR_MIN_SIDE_PIXELS = 32
+IMAGE_CACHE_PATH = "data/_cache/image_text.sqlite3"  # vision/OCR results by image hash, shared across users
+IMAGE_CACHE_MAX_ENTRIES = 200_000  # LRU evicted
+# Near-identical (perceptual) cache hits only for small, simple images such as logos and headers, per user;
+# everything else (slides, charts, scans) needs the exact same bytes
+IMAGE_CACHE_PERCEPTUAL_MAX_SIDE = 400  # pixels
+IMAGE_CACHE_PERCEPTUAL_MAX_ENTROPY = 3.0  # bits of the grayscale histogram
+OCR_MIN_ENTROPY = 0.1  # bits of the grayscale histogram; kept low so sparse text scans still pass
+
+# Semantic answer cache (per app worker, see core/services/answer_cache.py)
+ANSWER_CACHE_MAX_ENTRIES = 1000  # LRU evicted
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_SIMILARITY = 0.95  # cosine similarity of resolved queries needed for a hit
+
+# Parsed document store (core/services/parsed_store.py, core/services/docpack.py)
+PARSED_DOCUMENT_FORMAT = settings.PARSED_DOCUMENT_FORMAT  # "docpack" or "json"
+DOCPACK_ZSTD_LEVEL = 3  # higher compresses a little better but slows down uploads
+
+# Streaming ingestion (core/embeddings/ingestion.py): bounded queue sizes give backpressure
+INGEST_PAGE_QUEUE_SIZE = 64  # parsed pages waiting to be chunked
+INGEST_CHUNK_QUEUE_SIZE = 2048  # chunks waiting to be embedded
+INGEST_UPSERT_QUEUE_SIZE = 4  # embedded batches waiting for Chroma
+INGEST_EMBED_BATCH_SIZE = 256  # chunks per embedding micro-batch
+INGEST_FLUSH_SECONDS = 0.5  # embed a partial batch if no chunk arrives for this long
+
+# Background upload jobs (core/services/jobs.py)
+JOB_HEARTBEAT_SECONDS = 15  # how often a running job refreshes its lease
+JOB_LEASE_SECONDS = 60  # a job without heartbeat for this long is resumed by another worker
+JOB_MAX_ATTEMPTS = 3  # runs (first run + resumes) before a job is marked failed
+
+# Documents with more pages than this are split into page ranges parsed in parallel
+PDF_SHARD_SIZE = settings.PDF_SHARD_SIZE
 
 PORT1 = 11434  # port where ollama is running
 PORT2 = 11435  # port where second ollama instance is running
 
+# LLM request timeouts in seconds, per ollama port (remote GPU server uses REMOTE_LLM_TIMEOUT)
+LLM_ENDPOINT_TIMEOUTS = {PORT1: 1000, PORT2: 1000}
+LLM_DEFAULT_TIMEOUT = 1000
+REMOTE_LLM_TIMEOUT = 600
+
+# Concurrent requests allowed per (model, port); keep in sync with OLLAMA_NUM_PARALLEL of each instance
+LLM_DEFAULT_PARALLELISM = settings.OLLAMA_NUM_PARALLEL
+LLM_ENDPOINT_PARALLELISM = {
+    PORT1: settings.OLLAMA_NUM_PARALLEL,
+    PORT2: settings.OLLAMA_NUM_PARALLEL,
+}
+
+# LLM scheduler priority classes (lower is served first)
+PRIORITY_INTERACTIVE = 0  # /query: decomposition, generation, combination
+PRIORITY_STUDIO = 1  # user-triggered studio features: insights, roadmaps
+PRIORITY_BACKGROUND = 2  # summarization, mind map, stop words, image parsing
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_STUDIO: "studio",
+    PRIORITY_BACKGROUND: "background",
+}
+
 GPT_OSS_20B = "gpt-oss:20b-50k-8k"
 QWEN3_14B = "qwen3:14b-39500-8k"
 
+# Context window (prompt + output) and output tokens reserved per model, see core/utils/token_budget.py
+MODEL_CONTEXT_WINDOWS = {GPT_OSS_20B: 50_000, QWEN3_14B: 39_500}
+MODEL_MAX_OUTPUT_TOKENS = {GPT_OSS_20B: 8_000, QWEN3_14B: 8_000}
+DEFAULT_CONTEXT_WINDOW = 32_000  # models missing from the maps above
+DEFAULT_MAX_OUTPUT_TOKENS = 8_000
+PROMPT_SAFETY_MARGIN = 256  # tokens kept free for chat template / special tokens
+
 # GPU LLM configurations
 GPU_QUERY_LLM = GPULLMConfig(model=GPT_OSS_20B, port=PORT2)
 GPU_QUERY_LLM2 = GPULLMConfig(model=GPT_OSS_20B, port=PORT1)
@@ -37,6 +139,8 @@ GPU_TECHNICAL_ROADMAP_LLM = GPULLMConfig(model=GPT_OSS_20B, port=PORT1)
 GPU_INSIGHTS_LLM = GPULLMConfig(model=GPT_OSS_20B, port=PORT1)
 
 IMAGE_PARSER_LLM = "gemma3:12b"
+VISION_BATCH_SIZE = settings.VISION_BATCH_SIZE  # images per local vision request (one upload's images only)
+VISION_BATCH_TIMEOUT = 0.5  # seconds to wait for a vision batch to fill
 # Fallback LLM models
 # Used if SWITCHES["FALLBACK_TO_GEMINI"] = True
 FALLBACK_GEMINI_MODEL = "gemini-2.0-flash"
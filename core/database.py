@@ -1,11 +1,27 @@
-from pymongo import MongoClient
+from pymongo import ASCENDING, AsyncMongoClient, MongoClient
 from pymongo.errors import CollectionInvalid
 from core.config import settings
 
 MONGO_URI = settings.DATABASE_URL
-client = MongoClient(MONGO_URI)
+MONGO_OPTIONS = {
+    "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+    "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+    "maxIdleTimeMS": 60000,
+    # Applies to every operation (server selection included) unless a call
+    # overrides it with `with pymongo.timeout(seconds):`
+    "timeoutMS": settings.MONGO_TIMEOUT_MS or None,
+}
+
+# Sync client: startup, CLI tools and code running in worker threads.
+# connect=False: sockets are opened on first use, in the worker process (fork safe, fast import)
+client = MongoClient(MONGO_URI, connect=False, **MONGO_OPTIONS)
 db = client[settings.DATABASE_NAME]
 
+# Async client: everything running on the event loop (routes, jobs, studio
+# features), so a slow round-trip doesn't block other requests and socket emits
+async_client = AsyncMongoClient(MONGO_URI, connect=False, **MONGO_OPTIONS)
+async_db = async_client[settings.DATABASE_NAME]
+
 
 user_schema = {
     "$jsonSchema": {
@@ -130,11 +146,29 @@ user_schema = {
 }
 
 
-try:
-    db.create_collection("users", validator=user_schema)
-    db.users.create_index("userId", unique=True)
-    print("Collection 'users' created with schema validation.")
-except CollectionInvalid:
-    print("Collection 'users' already exists.")
-except Exception as e:
-    print("Error creating collection:", e)
+def init_collections():
+    """Create collections and indexes if missing. Called once per worker at startup."""
+    try:
+        db.create_collection("users", validator=user_schema)
+        db.users.create_index("userId", unique=True)
+        print("Collection 'users' created with schema validation.")
+    except CollectionInvalid:
+        print("Collection 'users' already exists.")
+
+    db.jobs.create_index("jobId", unique=True)
+    db.jobs.create_index([("status", 1), ("heartbeatAt", 1)])
+
+    # Normalized thread layout (see core/services/thread_store.py)
+    db.threads.create_index([("userId", ASCENDING), ("threadId", ASCENDING)], unique=True)
+    db.threads.create_index([("userId", ASCENDING), ("createdAt", ASCENDING)])
+    db.thread_documents.create_index(
+        [("userId", ASCENDING), ("threadId", ASCENDING), ("docId", ASCENDING)],
+        unique=True,
+    )
+    db.thread_documents.create_index(
+        [("userId", ASCENDING), ("threadId", ASCENDING), ("file_name", ASCENDING)]
+    )
+    db.chat_messages.create_index(
+        [("userId", ASCENDING), ("threadId", ASCENDING), ("seq", ASCENDING)],
+        unique=True,
+    )
@@ -0,0 +1,69 @@
+import hashlib
+from array import array
+from typing import Callable, List
+
+from core.constants import EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH
+from core.utils.disk_cache import DiskCache
+from core.utils.metrics import increment
+
+_cache = None
+
+
+def get_embedding_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def _cache_key(model_name: str, text: str) -> str:
+    return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def embed_with_cache(
+    texts: List[str], model_name: str, embed_fn: Callable[[List[str]], List[List[float]]]
+) -> List[List[float]]:
+    """
+    Embed texts, reusing vectors cached on disk for the same (model, text).
+    Only the cache misses are passed to `embed_fn`. Blocking, run in a thread.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        model_name (str): Name of the embedding model, part of the cache key.
+        embed_fn (Callable): Embeds a list of texts, e.g. embeddings.embed_documents.
+
+    Returns:
+        List[List[float]]: One vector per text, in input order.
+    """
+    cache = get_embedding_cache()
+    keys = [_cache_key(model_name, text) for text in texts]
+    cached = cache.get_many(keys)
+
+    vectors: List[List[float]] = [None] * len(texts)
+    misses = {}  # key -> indices, so duplicate chunks are embedded once
+    for i, key in enumerate(keys):
+        blob = cached.get(key)
+        if blob is not None:
+            vectors[i] = array("f", blob).tolist()
+        else:
+            misses.setdefault(key, []).append(i)
+
+    miss_count = sum(len(indices) for indices in misses.values())
+    increment("embedding_cache", "hits", len(texts) - miss_count)
+    increment("embedding_cache", "misses", miss_count)
+
+    if misses:
+        miss_keys = list(misses)
+        new_vectors = embed_fn([texts[misses[key][0]] for key in miss_keys])
+        to_store = {}
+        for key, vector in zip(miss_keys, new_vectors):
+            vector = list(vector)
+            for i in misses[key]:
+                vectors[i] = vector
+            to_store[key] = array("f", vector).tobytes()
+        cache.set_many(to_store)
+
+    print(
+        f"Embedding cache: {len(texts) - miss_count} reused, {len(misses)} embedded"
+    )
+    return vectors
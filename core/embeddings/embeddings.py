@@ -1,13 +1,18 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-
-
-def get_embedding_function():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",  # decide model, this just temp
-        # model_name="NovaSearch/stella_en_400M_v5",
-        model_kwargs={
-            "device": "cpu",
-            # "device": "cuda" if torch.cuda.is_available() else "cpu",
-            "trust_remote_code": True,
-        },
-    )
+from core.constants import EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
+from core.embeddings.engine import EmbeddingEngine
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"  # decide model, this just temp
+# model_name="NovaSearch/stella_en_400M_v5"
+
+# Part of the embedding cache key, so changing the model or backend never reuses stale vectors
+# (torch keeps the bare model name so vectors cached before backends existed stay valid)
+EMBEDDING_CACHE_NAME = (
+    EMBEDDING_MODEL_NAME
+    if EMBEDDING_BACKEND == "torch"
+    else f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}:{EMBEDDING_ONNX_FILE}"
+)
+
+
+def get_embedding_function() -> EmbeddingEngine:
+    """Embeddings for Chroma; the model itself is loaded on first use."""
+    return EmbeddingEngine(EMBEDDING_MODEL_NAME)
@@ -0,0 +1,169 @@
+"""
+Embedding engine used for chunks and queries.
+
+Backends (EMBEDDING_BACKEND):
+    torch: sentence-transformers on PyTorch (the original setup)
+    onnx:  sentence-transformers on ONNX Runtime, by default the int8-quantized
+           export of the model (EMBEDDING_ONNX_FILE), usually 2-3x faster on CPU
+Both load lazily on first use, encode EMBEDDING_BATCH_SIZE texts per forward
+pass and use EMBEDDING_NUM_THREADS CPU threads. The onnx backend needs the
+optional requirements-onnx.txt.
+
+The two backends give slightly different vectors, so stored chunks are only
+searchable with the backend that embedded them. Every Chroma collection is
+tagged with it and refused under another one (see
+core/embeddings/vectorstore.py); switching backends means re-ingesting the
+documents.
+
+Single query embeddings from concurrent requests are grouped by QueryBatcher
+into one forward pass (up to EMBEDDING_QUERY_BATCH_SIZE queries, waiting at
+most EMBEDDING_QUERY_BATCH_WAIT seconds for more to arrive).
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from core.constants import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_NUM_THREADS,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_QUERY_BATCH_SIZE,
+    EMBEDDING_QUERY_BATCH_WAIT,
+)
+from core.utils.metrics import increment
+
+
+def _load_torch_model(model_name: str):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    return SentenceTransformer(model_name, device="cpu", trust_remote_code=True)
+
+
+def _load_onnx_model(model_name: str):
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "EMBEDDING_BACKEND=onnx needs `pip install -r requirements-onnx.txt`"
+        ) from e
+    from sentence_transformers import SentenceTransformer
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = EMBEDDING_NUM_THREADS
+    return SentenceTransformer(
+        model_name,
+        device="cpu",
+        backend="onnx",
+        model_kwargs={
+            "file_name": EMBEDDING_ONNX_FILE,
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        },
+    )
+
+
+_BACKENDS = {"torch": _load_torch_model, "onnx": _load_onnx_model}
+
+
+class QueryBatcher:
+    """
+    Groups embed_query calls made from different threads (request handlers,
+    Chroma's executor) into batched encode calls on one worker thread.
+    """
+
+    def __init__(self, encode, batch_size: int, wait: float):
+        self._encode = encode
+        self._batch_size = batch_size
+        self._wait = wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> List[float]:
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="query-embedding-batcher", daemon=True
+                )
+                self._worker.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._wait
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            increment("embedding", "query_batches")
+            increment("embedding", "queries", len(batch))
+            try:
+                vectors = self._encode([text for text, _ in batch])
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class EmbeddingEngine(Embeddings):
+    """LangChain-compatible embeddings on a configurable CPU backend."""
+
+    def __init__(self, model_name: str, backend: str = EMBEDDING_BACKEND):
+        if backend not in _BACKENDS:
+            raise ValueError(
+                f"Unknown embedding backend '{backend}', expected one of {list(_BACKENDS)}"
+            )
+        self.model_name = model_name
+        self.backend = backend
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._query_batcher = QueryBatcher(
+            self._encode, EMBEDDING_QUERY_BATCH_SIZE, EMBEDDING_QUERY_BATCH_WAIT
+        )
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start_time = time.time()
+                    print(f"Loading embedding model ({self.backend})...")
+                    self._model = _BACKENDS[self.backend](self.model_name)
+                    print(
+                        f"Embedding model loaded in {time.time() - start_time:.2f} seconds."
+                    )
+        return self._model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        start_time = time.time()
+        vectors = self.model.encode(
+            texts, batch_size=EMBEDDING_BATCH_SIZE, show_progress_bar=False
+        )
+        increment("embedding", "texts", len(texts))
+        increment("embedding", "seconds", time.time() - start_time)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._query_batcher.embed(text)
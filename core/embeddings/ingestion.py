@@ -0,0 +1,186 @@
+import asyncio
+import time
+from typing import List, Set
+
+from core.constants import (
+    INGEST_CHUNK_QUEUE_SIZE,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_FLUSH_SECONDS,
+    INGEST_PAGE_QUEUE_SIZE,
+    INGEST_UPSERT_QUEUE_SIZE,
+)
+from core.embeddings.cache import embed_with_cache
+from core.embeddings.embeddings import EMBEDDING_CACHE_NAME
+from core.embeddings import lexical
+from core.embeddings.vectorstore import build_page_chunks, get_vectorstore
+from core.models.document import Page
+from core.utils.metrics import increment, set_value
+
+# Marks the end of input on a stage queue
+_DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Streams parsed pages into the vector store while other pages are still
+    being parsed:
+
+        add_page -> [pages] -> chunker -> [chunks] -> embedder -> [batches] -> upserter
+
+    Every queue is bounded, so a slow stage makes the stages before it wait
+    (backpressure) instead of piling up every chunk in memory. Each stage
+    reports items processed and busy seconds under the "ingestion" metrics
+    namespace. A stage that fails skips the item, records the error in
+    `errors` and the ids of the affected documents in `failed_documents`,
+    whose chunks are then incomplete.
+
+    Usage:
+        pipeline = IngestionPipeline(user_id, thread_id)
+        await pipeline.start()
+        ... await pipeline.add_page(doc_meta, page) ...
+        await pipeline.finish()
+    """
+
+    def __init__(self, user_id: str, thread_id: str):
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.chunk_count = 0
+        self.errors: List[str] = []
+        self.failed_documents: Set[str] = set()
+        self._pages: asyncio.Queue = asyncio.Queue(maxsize=INGEST_PAGE_QUEUE_SIZE)
+        self._chunks: asyncio.Queue = asyncio.Queue(maxsize=INGEST_CHUNK_QUEUE_SIZE)
+        self._batches: asyncio.Queue = asyncio.Queue(maxsize=INGEST_UPSERT_QUEUE_SIZE)
+        self._tasks: List[asyncio.Task] = []
+        self._vectorstore = None
+        self._chunks_done = False
+        self._started_at = time.time()
+
+    async def start(self):
+        self._vectorstore = await asyncio.to_thread(
+            get_vectorstore, self.user_id, self.thread_id
+        )
+        self._tasks = [
+            asyncio.create_task(self._chunker()),
+            asyncio.create_task(self._embedder()),
+            asyncio.create_task(self._upserter()),
+        ]
+
+    async def add_page(self, doc_meta: dict, page: Page):
+        """Queue a parsed page; waits while the pipeline is saturated."""
+        await self._pages.put((doc_meta, page))
+        set_value("ingestion", "pages/queue_depth", self._pages.qsize())
+
+    async def finish(self) -> int:
+        """Flush everything queued so far and wait for the stages to drain."""
+        await self._pages.put(_DONE)
+        await asyncio.gather(*self._tasks)
+        print(
+            f"Ingested {self.chunk_count} chunks for user {self.user_id} in "
+            f"{time.time() - self._started_at:.2f} seconds"
+        )
+        return self.chunk_count
+
+    def _fail(self, metadatas):
+        self.failed_documents.update(metadata["document_id"] for metadata in metadatas)
+
+    def _record(self, stage: str, items: int, seconds: float):
+        increment("ingestion", f"{stage}/items", items)
+        increment("ingestion", f"{stage}/busy_seconds", seconds)
+        if seconds > 0:
+            set_value("ingestion", f"{stage}/items_per_second", items / seconds)
+
+    async def _chunker(self):
+        while True:
+            item = await self._pages.get()
+            if item is _DONE:
+                await self._chunks.put(_DONE)
+                return
+            doc_meta, page = item
+            start = time.time()
+            try:
+                chunks = await asyncio.to_thread(
+                    build_page_chunks, doc_meta, page, self.user_id, self.thread_id
+                )
+            except Exception as e:
+                print(f"[ingestion] chunking failed for {doc_meta.get('file_name')}: {e}")
+                self.errors.append(str(e))
+                self.failed_documents.add(doc_meta["id"])
+                continue
+            self._record("chunker", 1, time.time() - start)
+            for chunk in chunks:
+                await self._chunks.put(chunk)
+            set_value("ingestion", "chunks/queue_depth", self._chunks.qsize())
+
+    async def _next_batch(self) -> list:
+        """
+        Collect up to INGEST_EMBED_BATCH_SIZE chunks, flushing early when no new
+        chunk arrives within INGEST_FLUSH_SECONDS. Sets _chunks_done at end of input.
+        """
+        batch = []
+        while len(batch) < INGEST_EMBED_BATCH_SIZE:
+            try:
+                if batch:
+                    item = await asyncio.wait_for(
+                        self._chunks.get(), timeout=INGEST_FLUSH_SECONDS
+                    )
+                else:
+                    item = await self._chunks.get()
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                self._chunks_done = True
+                break
+            batch.append(item)
+        return batch
+
+    async def _embedder(self):
+        while not self._chunks_done:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            ids, texts, metadatas = zip(*batch)
+            start = time.time()
+            try:
+                embeddings = await asyncio.to_thread(
+                    embed_with_cache,
+                    list(texts),
+                    EMBEDDING_CACHE_NAME,
+                    self._vectorstore.embeddings.embed_documents,
+                )
+            except Exception as e:
+                print(f"[ingestion] embedding failed for {len(batch)} chunks: {e}")
+                self.errors.append(str(e))
+                self._fail(metadatas)
+                continue
+            self._record("embedder", len(batch), time.time() - start)
+            await self._batches.put((list(ids), list(texts), list(metadatas), embeddings))
+        await self._batches.put(_DONE)
+
+    async def _upserter(self):
+        while True:
+            item = await self._batches.get()
+            if item is _DONE:
+                return
+            ids, texts, metadatas, embeddings = item
+            start = time.time()
+            try:
+                await asyncio.to_thread(
+                    self._vectorstore._collection.upsert,
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=metadatas,
+                    ids=ids,
+                )
+                await asyncio.to_thread(
+                    lexical.add_chunks,
+                    self.user_id,
+                    self.thread_id,
+                    zip(ids, texts, metadatas),
+                )
+            except Exception as e:
+                print(f"[ingestion] upsert failed for {len(ids)} chunks: {e}")
+                self.errors.append(str(e))
+                self._fail(metadatas)
+                continue
+            self.chunk_count += len(ids)
+            self._record("upserter", len(ids), time.time() - start)
@@ -0,0 +1,210 @@
+"""
+Per-thread lexical (BM25) index of document chunks.
+
+Dense all-MiniLM search misses exact-term questions (part numbers, acronyms,
+clause IDs). Every thread therefore also keeps an SQLite FTS5 index at
+`data/{user_id}/threads/{thread_id}/lexical.sqlite3`, filled with the same
+chunks that go to Chroma. Chunks are upserted by chunk id, so re-ingesting a
+document does not duplicate them. The retriever fuses both rankings (see
+core/embeddings/retriever.py).
+"""
+
+import os
+import re
+import sqlite3
+from typing import Iterable, List, Tuple
+
+LEXICAL_INDEX_FILE = "lexical.sqlite3"
+
+# Keep part numbers and identifiers such as "AB-1234" or "max_tokens" whole
+_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '-_'"
+# Query terms; dotted IDs ("3.2.1") become FTS phrases
+_QUERY_TERM = re.compile(r"\w[\w.\-]*\w|\w", re.UNICODE)
+
+
+def index_path(user_id: str, thread_id: str) -> str:
+    return os.path.join("data", user_id, "threads", thread_id, LEXICAL_INDEX_FILE)
+
+
+def index_exists(user_id: str, thread_id: str) -> bool:
+    return os.path.exists(index_path(user_id, thread_id))
+
+
+def is_complete(user_id: str, thread_id: str) -> bool:
+    """
+    Whether the index holds every chunk of the thread. Chunks are indexed as
+    they are ingested and new threads are marked complete when created, but
+    threads ingested before the index existed need a one-time backfill from
+    Chroma first (see core/embeddings/retriever.py).
+    """
+    if not index_exists(user_id, thread_id):
+        return False
+    conn = _connect(user_id, thread_id)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'complete'").fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def mark_complete(user_id: str, thread_id: str):
+    conn = _connect(user_id, thread_id)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')"
+            )
+    finally:
+        conn.close()
+
+
+def _connect(user_id: str, thread_id: str) -> sqlite3.Connection:
+    path = index_path(user_id, thread_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY,
+            chunk_id TEXT UNIQUE NOT NULL,
+            document_id TEXT,
+            title TEXT,
+            page_no INTEGER,
+            chunk_index INTEGER,
+            content TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+            content, content='chunks', content_rowid='id', tokenize="{_TOKENIZER}"
+        );
+        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+            INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+        """
+    )
+    return conn
+
+
+def add_chunks(
+    user_id: str, thread_id: str, chunks: Iterable[Tuple[str, str, dict]]
+) -> int:
+    """
+    Upsert chunks into the thread's index. Blocking, run in a thread.
+
+    Args:
+        chunks: (chunk_id, text, metadata) as produced by build_page_chunks.
+
+    Returns:
+        int: Number of chunks written.
+    """
+    rows = [
+        (
+            chunk_id,
+            metadata.get("document_id", ""),
+            metadata.get("title", ""),
+            metadata.get("page_no", 1),
+            metadata.get("chunk_index", 0),
+            text,
+        )
+        for chunk_id, text, metadata in chunks
+    ]
+    if not rows:
+        return 0
+    conn = _connect(user_id, thread_id)
+    try:
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO chunks (chunk_id, document_id, title, page_no, chunk_index, content)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(chunk_id) DO UPDATE SET
+                    document_id = excluded.document_id,
+                    title = excluded.title,
+                    page_no = excluded.page_no,
+                    chunk_index = excluded.chunk_index,
+                    content = excluded.content
+                """,
+                rows,
+            )
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def delete_documents(user_id: str, thread_id: str, document_ids: List[str]) -> int:
+    """Remove every chunk of the given documents. Blocking, run in a thread."""
+    if not document_ids or not index_exists(user_id, thread_id):
+        return 0
+    conn = _connect(user_id, thread_id)
+    try:
+        with conn:
+            cursor = conn.executemany(
+                "DELETE FROM chunks WHERE document_id = ?",
+                [(document_id,) for document_id in document_ids],
+            )
+    finally:
+        conn.close()
+    return cursor.rowcount
+
+
+def build_match_query(query: str) -> str:
+    """Turn a free-text question into an FTS5 query: any of its quoted terms."""
+    terms = dict.fromkeys(term.lower() for term in _QUERY_TERM.findall(query))
+    return " OR ".join('"' + term.replace('"', "") + '"' for term in terms)
+
+
+def search(user_id: str, thread_id: str, query: str, k: int) -> List[dict]:
+    """
+    BM25 search over the thread's chunks. Blocking, run in a thread.
+
+    Returns:
+        List[dict]: Best first, each {"document_id", "title", "page_no",
+        "chunk_index", "content"}.
+    """
+    match = build_match_query(query)
+    if not match or not index_exists(user_id, thread_id):
+        return []
+    conn = _connect(user_id, thread_id)
+    try:
+        rows = conn.execute(
+            """
+            SELECT c.document_id, c.title, c.page_no, c.chunk_index, c.content
+            FROM chunks_fts
+            JOIN chunks c ON c.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH ?
+            ORDER BY bm25(chunks_fts)
+            LIMIT ?
+            """,
+            (match, k),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {
+            "document_id": document_id,
+            "title": title,
+            "page_no": page_no,
+            "chunk_index": chunk_index,
+            "content": content,
+        }
+        for document_id, title, page_no, chunk_index, content in rows
+    ]
+
+
+def delete_index(user_id: str, thread_id: str):
+    """Remove the thread's index, e.g. when the thread is deleted."""
+    path = index_path(user_id, thread_id)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
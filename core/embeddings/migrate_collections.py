@@ -0,0 +1,129 @@
+"""
+Move threads out of the shared per-user `user_docs` Chroma collection into one
+collection per thread (VECTORSTORE_LAYOUT = "thread").
+
+Stored embeddings are copied as they are, so nothing is re-embedded. Run it
+from the repository root, preferably while the app is stopped:
+
+    python -m core.embeddings.migrate_collections [--user USER_ID] [--dry-run] [--keep-legacy]
+
+Threads that are not migrated keep working: get_vectorstore() routes a thread
+to `user_docs` as long as it has no collection of its own.
+"""
+
+import argparse
+import os
+import time
+
+import chromadb
+
+from core.embeddings.registry import LEGACY_COLLECTION, thread_collection_name
+
+DATA_DIR = "data"
+BATCH_SIZE = 5000
+
+
+def _thread_ids(legacy) -> set:
+    thread_ids = set()
+    offset = 0
+    while True:
+        page = legacy.get(include=["metadatas"], limit=BATCH_SIZE, offset=offset)
+        if not page["ids"]:
+            return thread_ids
+        for metadata in page["metadatas"]:
+            if metadata and metadata.get("thread_id"):
+                thread_ids.add(metadata["thread_id"])
+        offset += len(page["ids"])
+
+
+def migrate_thread(client, legacy, thread_id: str, keep_legacy: bool = False) -> int:
+    """Copy one thread's chunks into its own collection. Returns the chunk count."""
+    rows = legacy.get(
+        where={"thread_id": {"$eq": thread_id}},
+        include=["embeddings", "documents", "metadatas"],
+    )
+    ids = rows["ids"]
+    if not ids:
+        return 0
+
+    target = client.get_or_create_collection(
+        thread_collection_name(thread_id), metadata=legacy.metadata
+    )
+    for start in range(0, len(ids), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        target.upsert(
+            ids=ids[start:end],
+            embeddings=rows["embeddings"][start:end],
+            documents=rows["documents"][start:end],
+            metadatas=rows["metadatas"][start:end],
+        )
+
+    copied = len(target.get(ids=ids, include=[])["ids"])
+    if copied != len(ids):
+        raise RuntimeError(f"only {copied}/{len(ids)} chunks were copied")
+
+    if not keep_legacy:
+        for start in range(0, len(ids), BATCH_SIZE):
+            legacy.delete(ids=ids[start : start + BATCH_SIZE])
+    return len(ids)
+
+
+def migrate_user(user_id: str, dry_run: bool = False, keep_legacy: bool = False):
+    persist_path = os.path.join(DATA_DIR, user_id, "chroma")
+    client = chromadb.PersistentClient(path=persist_path)
+    try:
+        legacy = client.get_collection(LEGACY_COLLECTION)
+    except Exception:
+        print(f"[{user_id}] no {LEGACY_COLLECTION} collection, nothing to migrate")
+        return
+
+    thread_ids = sorted(_thread_ids(legacy))
+    print(f"[{user_id}] {legacy.count()} chunks in {len(thread_ids)} threads")
+    if dry_run:
+        return
+
+    for thread_id in thread_ids:
+        start_time = time.time()
+        try:
+            count = migrate_thread(client, legacy, thread_id, keep_legacy)
+            print(
+                f"[{user_id}] thread {thread_id}: moved {count} chunks in {time.time() - start_time:.2f} seconds"
+            )
+        except Exception as e:
+            print(f"[{user_id}] thread {thread_id}: migration failed, left in place: {e}")
+
+    if not keep_legacy and legacy.count() == 0:
+        client.delete_collection(LEGACY_COLLECTION)
+        print(f"[{user_id}] removed empty {LEGACY_COLLECTION} collection")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split per-user Chroma collections into per-thread collections."
+    )
+    parser.add_argument("--user", help="Only migrate this user id")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report what would be moved"
+    )
+    parser.add_argument(
+        "--keep-legacy",
+        action="store_true",
+        help=f"Copy instead of move (leave the chunks in {LEGACY_COLLECTION})",
+    )
+    args = parser.parse_args()
+
+    if args.user:
+        user_ids = [args.user]
+    else:
+        user_ids = sorted(
+            name
+            for name in os.listdir(DATA_DIR)
+            if os.path.isdir(os.path.join(DATA_DIR, name, "chroma"))
+        )
+
+    for user_id in user_ids:
+        migrate_user(user_id, dry_run=args.dry_run, keep_legacy=args.keep_legacy)
+
+
+if __name__ == "__main__":
+    main()
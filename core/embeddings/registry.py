@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import chromadb
+from langchain_chroma import Chroma
+
+from core.constants import VECTORSTORE_MAX_OPEN_HANDLES
+from core.utils.metrics import increment, set_value
+
+METRICS_NAMESPACE = "vectorstore"
+
+# Shared collection of all a user's threads (VECTORSTORE_LAYOUT = "user" and stores from before per-thread collections)
+LEGACY_COLLECTION = "user_docs"
+
+
+def thread_collection_name(thread_id: str) -> str:
+    return f"thread_{thread_id}"
+
+
+class _UserHandle:
+    """Open Chroma client for one user plus the collection wrappers built on it."""
+
+    def __init__(self, persist_path: str, client):
+        self.persist_path = persist_path
+        self.client = client
+        self.vectorstores: Dict[str, Chroma] = {}
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide registry of open Chroma clients keyed by user.
+
+    Opening a persistent Chroma client loads the sqlite catalog and HNSW
+    segments from disk, so handles are kept open between calls and evicted
+    least-recently-used once more than `max_handles` users are open.
+
+    Chroma must only run one system per persist path. An evicted client is
+    therefore "retired": once the last request still holding it lets go, its
+    system is queued and stopped on the next open (outside garbage collection,
+    which may run while any lock is held), and reopening the user before then
+    reuses it.
+    Clients are opened under a per-user lock, so one user's disk load never
+    blocks the others.
+    """
+
+    def __init__(self, max_handles: int = VECTORSTORE_MAX_OPEN_HANDLES):
+        self.max_handles = max(1, max_handles)
+        self._handles: "OrderedDict[str, _UserHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._open_locks: Dict[str, threading.Lock] = {}
+        # persist_path -> (weak reference to the client, finalizer queueing its system)
+        self._retired: Dict[str, Tuple[weakref.ref, weakref.finalize]] = {}
+        # (user_id, persist_path, system) of released clients; list.append takes no lock
+        self._pending_stops: List[tuple] = []
+
+    def get(self, user_id: str, collection_name: str, embedding_function) -> Chroma:
+        """Return a cached Chroma vector store for (user, collection), opening it on a miss."""
+        with self._lock:
+            handle = self._handles.get(user_id)
+            if handle is not None:
+                self._handles.move_to_end(user_id)
+                vectorstore = handle.vectorstores.get(collection_name)
+                if vectorstore is not None:
+                    increment(METRICS_NAMESPACE, "hits")
+                    return vectorstore
+            increment(METRICS_NAMESPACE, "misses")
+
+        handle = self._handle(user_id)
+        vectorstore = Chroma(
+            client=handle.client,
+            collection_name=collection_name,
+            embedding_function=embedding_function,
+        )
+        with self._lock:
+            return handle.vectorstores.setdefault(collection_name, vectorstore)
+
+    def collection_exists(self, user_id: str, collection_name: str) -> bool:
+        """Whether the user's Chroma store already has the collection (opens the store on a miss)."""
+        handle = self._handle(user_id)
+        if collection_name in handle.vectorstores:
+            return True
+        try:
+            handle.client.get_collection(collection_name)
+            return True
+        except Exception:
+            return False
+
+    def delete_collection(self, user_id: str, collection_name: str) -> bool:
+        """Delete a collection of the user's store. Returns True if it existed."""
+        handle = self._handle(user_id)
+        with self._lock:
+            handle.vectorstores.pop(collection_name, None)
+        try:
+            handle.client.delete_collection(collection_name)
+            return True
+        except Exception:
+            return False
+
+    def _handle(self, user_id: str) -> _UserHandle:
+        self._stop_released()
+        with self._lock:
+            handle = self._handles.get(user_id)
+            if handle is not None:
+                self._handles.move_to_end(user_id)
+                return handle
+            open_lock = self._open_locks.setdefault(user_id, threading.Lock())
+
+        with open_lock:
+            with self._lock:
+                handle = self._handles.get(user_id)
+            if handle is not None:
+                return handle
+            # Disk load outside the registry lock
+            handle = self._open(user_id)
+            with self._lock:
+                self._handles[user_id] = handle
+                self._evict()
+        return handle
+
+    def invalidate(self, user_id: str) -> bool:
+        """Close and drop the handle of a user. Returns True if one was open."""
+        with self._lock:
+            handle = self._handles.pop(user_id, None)
+            self._update_gauge()
+            if handle is None:
+                return False
+            self._retire(user_id, handle)
+        return True
+
+    def close_all(self):
+        """Stop every open and retired Chroma system (used on shutdown)."""
+        with self._lock:
+            handles = list(self._handles.items())
+            self._handles.clear()
+            retired = list(self._retired.values())
+            self._retired.clear()
+            self._update_gauge()
+        for user_id, handle in handles:
+            handle.vectorstores.clear()
+            self._pending_stops.append(
+                (user_id, handle.persist_path, handle.client._system)
+            )
+        for _, finalizer in retired:
+            finalizer()
+        self._stop_released()
+
+    def _open(self, user_id: str) -> _UserHandle:
+        persist_path = os.path.join("data", user_id, "chroma")
+        os.makedirs(persist_path, exist_ok=True)
+
+        with self._lock:
+            retired = self._retired.pop(persist_path, None)
+        if retired is not None:
+            client_ref, finalizer = retired
+            client = client_ref()
+            # detach() fails if the system was already stopped
+            if client is not None and finalizer.detach():
+                print(f"Reusing retired Chroma client for user {user_id}")
+                increment(METRICS_NAMESPACE, "reused")
+                return _UserHandle(persist_path, client)
+
+        start_time = time.time()
+        client = chromadb.PersistentClient(path=persist_path)
+        end_time = time.time()
+        print(
+            f"Opened Chroma client in {end_time - start_time:.2f} seconds for user {user_id}"
+        )
+        increment(METRICS_NAMESPACE, "opened")
+        return _UserHandle(persist_path, client)
+
+    def _evict(self):
+        # Caller holds self._lock
+        while len(self._handles) > self.max_handles:
+            user_id, handle = self._handles.popitem(last=False)
+            print(f"Evicting Chroma handle for user {user_id}")
+            self._retire(user_id, handle)
+        self._update_gauge()
+
+    def _retire(self, user_id: str, handle: _UserHandle):
+        """
+        Drop a handle (caller holds self._lock). Requests still holding its
+        client finish on it; when the client is garbage collected its system
+        is queued for _stop_released, so a path never has two live systems.
+        """
+        handle.vectorstores.clear()
+        finalizer = weakref.finalize(
+            handle.client,
+            self._queue_stop,
+            user_id,
+            handle.persist_path,
+            handle.client._system,
+        )
+        self._retired[handle.persist_path] = (weakref.ref(handle.client), finalizer)
+
+    def _queue_stop(self, user_id: str, persist_path: str, system):
+        # weakref.finalize callback: runs inside garbage collection, possibly while
+        # this thread holds a registry lock, so it must not take any lock itself
+        self._pending_stops.append((user_id, persist_path, system))
+
+    def _stop_released(self):
+        """Stop the systems of released clients. Called without any lock held."""
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        systems = SharedSystemClient._identifier_to_system
+        while self._pending_stops:
+            try:
+                user_id, persist_path, system = self._pending_stops.pop()
+            except IndexError:
+                return
+            open_lock = self._open_locks.setdefault(user_id, threading.Lock())
+            # Serialized with _open: a client opened meanwhile shares the cached system
+            with open_lock, self._lock:
+                if user_id in self._handles and systems.get(persist_path) is system:
+                    continue
+                if systems.get(persist_path) is system:
+                    systems.pop(persist_path, None)
+            try:
+                system.stop()
+            except Exception as e:
+                print(f"Failed to stop Chroma system for {persist_path}: {e}")
+            increment(METRICS_NAMESPACE, "closed")
+
+    def _update_gauge(self):
+        set_value(METRICS_NAMESPACE, "open_handles", len(self._handles))
+
+
+vectorstore_registry = VectorStoreRegistry()
+
+
+def invalidate_vectorstore(user_id: str, thread_id: Optional[str] = None) -> bool:
+    """
+    Drop the cached vector store handle of a user, e.g. after one of their threads
+    is deleted. The next retrieval reopens it from disk.
+    """
+    invalidated = vectorstore_registry.invalidate(user_id)
+    if invalidated:
+        print(f"Invalidated vector store handle for user {user_id} (thread {thread_id})")
+    return invalidated
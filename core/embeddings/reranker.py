@@ -0,0 +1,91 @@
+"""
+Cross-encoder reranking of retrieved chunks.
+
+The retriever over-fetches RERANK_CANDIDATES chunks (dense + BM25). A small
+CPU cross-encoder scores each (query, chunk) pair. Chunks are then kept best
+first while they fit in RETRIEVAL_TOKEN_BUDGET tokens of the answering model.
+Chunks the cross-encoder considers irrelevant (below RERANK_MIN_SCORE) are
+dropped once RERANK_MIN_CHUNKS are kept. The number of chunks in the prompt
+therefore adapts to the question instead of always being CHUNK_COUNT.
+"""
+
+import math
+import threading
+import time
+from typing import List
+
+from core.constants import (
+    CHUNK_COUNT,
+    RERANK_MIN_CHUNKS,
+    RERANK_MIN_SCORE,
+    RERANK_MODEL_NAME,
+    RETRIEVAL_TOKEN_BUDGET,
+)
+from core.utils.count_tokens import count_tokens
+from core.utils.metrics import increment
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_reranker():
+    """Load the cross-encoder on first use (a few seconds, ~90 MB)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+
+                print(f"Loading reranker model {RERANK_MODEL_NAME}...")
+                _model = CrossEncoder(RERANK_MODEL_NAME, device="cpu")
+                print("Reranker model loaded.")
+    return _model
+
+
+def rerank_within_budget(query: str, chunks: List[dict], gpu_model: str) -> List[dict]:
+    """
+    Rerank candidate chunks and keep the best ones that fit the token budget.
+    Blocking, run in a thread. Falls back to the first CHUNK_COUNT candidates
+    if the reranker can't be used.
+
+    Args:
+        query (str): The question the chunks are retrieved for.
+        chunks (List[dict]): Candidates with "title" and "content".
+        gpu_model (str): Model the prompt is built for, used by count_tokens.
+
+    Returns:
+        List[dict]: Kept chunks, most relevant first.
+    """
+    if not chunks:
+        return []
+
+    start_time = time.time()
+    try:
+        logits = get_reranker().predict(
+            [(query, chunk["content"]) for chunk in chunks]
+        )
+        scores = [1 / (1 + math.exp(-float(logit))) for logit in logits]
+    except Exception as e:
+        print(f"Reranking failed, keeping retrieval order: {e}")
+        return chunks[:CHUNK_COUNT]
+
+    ranked = sorted(zip(scores, chunks), key=lambda pair: pair[0], reverse=True)
+    kept = []
+    used_tokens = 0
+    for score, chunk in ranked:
+        if len(kept) >= RERANK_MIN_CHUNKS and score < RERANK_MIN_SCORE:
+            break
+        tokens = count_tokens(chunk["title"] + "\n" + chunk["content"], gpu_model)
+        if kept and used_tokens + tokens > RETRIEVAL_TOKEN_BUDGET:
+            break
+        kept.append(chunk)
+        used_tokens += tokens
+
+    increment("reranker", "queries")
+    increment("reranker", "candidates", len(chunks))
+    increment("reranker", "kept", len(kept))
+    increment("reranker", "tokens", used_tokens)
+    print(
+        f"Reranked {len(chunks)} chunks in {time.time() - start_time:.2f} seconds, kept {len(kept)} ({used_tokens} tokens)"
+    )
+    return kept
@@ -1,5 +1,15 @@
+import asyncio
+from typing import List
+
+from core.constants import RRF_K
+from core.embeddings import lexical
 from core.embeddings.vectorstore import get_vectorstore
 
+# Threads whose lexical index is being rebuilt from Chroma in this process
+_backfilling = set()
+# Keeps backfill tasks referenced until they finish
+_backfill_tasks = set()
+
 
 def get_user_retriever(
     user_id: str, thread_id: str, document_id: str = None, k: int = 5
@@ -20,3 +30,71 @@ def get_user_retriever(
 
     retriever = vectorstore.as_retriever(search_kwargs=search_kwargs)
     return retriever
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[dict]], limit: int, rrf_k: int = RRF_K
+) -> List[dict]:
+    """
+    Fuse several best-first chunk rankings: score = sum(1 / (rrf_k + rank)).
+    Chunks are matched on (document_id, page_no, chunk_index).
+
+    Returns:
+        List[dict]: The `limit` best chunks, first occurrence of each kept.
+    """
+    scores = {}
+    chunks = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            key = (chunk["document_id"], chunk["page_no"], chunk.get("chunk_index"))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            chunks.setdefault(key, chunk)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [chunks[key] for key in best]
+
+
+def _backfill_lexical_index(user_id: str, thread_id: str):
+    """Build the lexical index of a thread ingested before it existed."""
+    try:
+        vectorstore = get_vectorstore(user_id, thread_id=thread_id)
+        stored = vectorstore._collection.get(
+            where={
+                "$and": [
+                    {"user_id": {"$eq": user_id}},
+                    {"thread_id": {"$eq": thread_id}},
+                ]
+            },
+            include=["documents", "metadatas"],
+        )
+        count = lexical.add_chunks(
+            user_id,
+            thread_id,
+            zip(stored["ids"], stored["documents"], stored["metadatas"]),
+        )
+        lexical.mark_complete(user_id, thread_id)
+        print(f"Built lexical index of thread {thread_id} from {count} stored chunks")
+    except Exception as e:
+        print(f"Failed to build lexical index of thread {thread_id}: {e}")
+    finally:
+        _backfilling.discard((user_id, thread_id))
+
+
+async def lexical_search(user_id: str, thread_id: str, query: str, k: int) -> List[dict]:
+    """
+    BM25 search of the thread's chunks. Threads whose index is not complete get
+    it backfilled from Chroma in the background and return [] until it is ready.
+    """
+    try:
+        if not await asyncio.to_thread(lexical.is_complete, user_id, thread_id):
+            if (user_id, thread_id) not in _backfilling:
+                _backfilling.add((user_id, thread_id))
+                task = asyncio.create_task(
+                    asyncio.to_thread(_backfill_lexical_index, user_id, thread_id)
+                )
+                _backfill_tasks.add(task)
+                task.add_done_callback(_backfill_tasks.discard)
+            return []
+        return await asyncio.to_thread(lexical.search, user_id, thread_id, query, k)
+    except Exception as e:
+        print(f"Lexical search failed for thread {thread_id}: {e}")
+        return []
@@ -1,15 +1,25 @@
 import asyncio
-import os
+import math
 import time
-from typing import List
+from typing import List, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from core.embeddings.embeddings import get_embedding_function
-from core.models.document import Documents
+from core.constants import VECTORSTORE_LAYOUT
+from core.embeddings import lexical
+from core.embeddings.cache import embed_with_cache
+from core.embeddings.embeddings import (
+    EMBEDDING_CACHE_NAME,
+    EMBEDDING_MODEL_NAME,
+    get_embedding_function,
+)
+from core.embeddings.registry import (
+    LEGACY_COLLECTION,
+    thread_collection_name,
+    vectorstore_registry,
+)
+from core.models.document import Documents, Page
 
-print("Loading embedding model...")
 embedding_function = get_embedding_function()
-print("Embedding model loaded.")
 
 
 def chunk_page_text(page_text: str) -> List[str]:
@@ -19,19 +29,159 @@ def chunk_page_text(page_text: str) -> List[str]:
     return splitter.split_text(page_text)
 
 
-# Get Chroma vector store instance
-def get_vectorstore(user_id: str, thread_id: str) -> Chroma:
-    persist_path = os.path.join("data", user_id, "chroma")
-    os.makedirs(persist_path, exist_ok=True)
+# Threads known to live in their own collection (never changes back)
+_thread_collections = set()
 
-    return Chroma(
-        collection_name="user_docs",
-        persist_directory=persist_path,
+
+def _has_legacy_chunks(user_id: str, thread_id: str) -> bool:
+    if not vectorstore_registry.collection_exists(user_id, LEGACY_COLLECTION):
+        return False
+    legacy = vectorstore_registry.get(
+        user_id,
+        collection_name=LEGACY_COLLECTION,
         embedding_function=embedding_function,
     )
+    found = legacy._collection.get(
+        where={"thread_id": {"$eq": thread_id}}, limit=1, include=[]
+    )
+    return bool(found["ids"])
+
+
+def collection_for_thread(user_id: str, thread_id: str) -> str:
+    """
+    Pick the collection holding a thread's chunks.
+
+    With VECTORSTORE_LAYOUT = "thread" every thread gets its own collection, so
+    HNSW search only walks that thread's graph. Threads ingested into the
+    shared per-user collection before that stay there until
+    core/embeddings/migrate_collections.py moves them.
+    """
+    if VECTORSTORE_LAYOUT != "thread" or thread_id is None:
+        return LEGACY_COLLECTION
+    if (user_id, thread_id) in _thread_collections:
+        return thread_collection_name(thread_id)
+
+    name = thread_collection_name(thread_id)
+    if vectorstore_registry.collection_exists(user_id, name) or not _has_legacy_chunks(
+        user_id, thread_id
+    ):
+        _thread_collections.add((user_id, thread_id))
+        return name
+    return LEGACY_COLLECTION
+
+
+# Collection metadata key holding the embeddings (model and backend) its vectors come from
+EMBEDDING_METADATA_KEY = "embedding"
+
+# (user_id, collection) pairs already checked against the current embedding backend
+_checked_collections = set()
+
+
+def check_embedding_backend(vectorstore: Chroma):
+    """
+    Tag a collection with the current embeddings on first use and refuse one
+    filled by another backend: query vectors of one backend against chunks
+    of the other quietly lose recall. Untagged collections holding chunks were
+    filled before backends existed, i.e. with torch.
+    """
+    collection = vectorstore._collection
+    metadata = collection.metadata or {}
+    tag = metadata.get(EMBEDDING_METADATA_KEY)
+    if tag is None:
+        tag = EMBEDDING_CACHE_NAME if collection.count() == 0 else EMBEDDING_MODEL_NAME
+        # Chroma refuses metadata updates that carry hnsw:* settings
+        if not any(key.startswith("hnsw:") for key in metadata):
+            collection.modify(metadata={**metadata, EMBEDDING_METADATA_KEY: tag})
+    if tag != EMBEDDING_CACHE_NAME:
+        raise ValueError(
+            f"Collection {collection.name} was embedded with '{tag}' but the current "
+            f"embeddings are '{EMBEDDING_CACHE_NAME}'. Switch EMBEDDING_BACKEND back "
+            "or re-ingest the thread's documents."
+        )
 
 
-import math
+# Get Chroma vector store instance (cached per user, see core/embeddings/registry.py)
+def get_vectorstore(user_id: str, thread_id: str) -> Chroma:
+    name = collection_for_thread(user_id, thread_id)
+    vectorstore = vectorstore_registry.get(
+        user_id,
+        collection_name=name,
+        embedding_function=embedding_function,
+    )
+    if (user_id, name) not in _checked_collections:
+        check_embedding_backend(vectorstore)
+        _checked_collections.add((user_id, name))
+    return vectorstore
+
+
+def delete_thread_vectors(user_id: str, thread_id: str):
+    """Remove a thread's chunks: its own collection and any legacy rows."""
+    _thread_collections.discard((user_id, thread_id))
+    _checked_collections.discard((user_id, thread_collection_name(thread_id)))
+    try:
+        vectorstore_registry.delete_collection(
+            user_id, thread_collection_name(thread_id)
+        )
+        if vectorstore_registry.collection_exists(user_id, LEGACY_COLLECTION):
+            legacy = vectorstore_registry.get(
+                user_id,
+                collection_name=LEGACY_COLLECTION,
+                embedding_function=embedding_function,
+            )
+            legacy._collection.delete(where={"thread_id": {"$eq": thread_id}})
+    except Exception as e:
+        print(f"Failed to delete vectors of thread {thread_id}: {e}")
+
+
+def delete_document_vectors(user_id: str, thread_id: str, document_ids: List[str]):
+    """
+    Remove the chunks of some documents of a thread from Chroma and the lexical
+    index, e.g. of a file that failed after some of its pages were ingested.
+    """
+    if not document_ids:
+        return
+    try:
+        vectorstore = get_vectorstore(user_id, thread_id)
+        vectorstore._collection.delete(
+            where={
+                "$and": [
+                    {"thread_id": {"$eq": thread_id}},
+                    {"document_id": {"$in": list(document_ids)}},
+                ]
+            }
+        )
+        lexical.delete_documents(user_id, thread_id, document_ids)
+    except Exception as e:
+        print(f"Failed to delete vectors of documents {document_ids}: {e}")
+
+
+def build_page_chunks(
+    doc_meta: dict, page: Page, user_id: str, thread_id: str
+) -> List[Tuple[str, str, dict]]:
+    """
+    Split one page into chunks ready for upsert.
+
+    Args:
+        doc_meta (dict): {"id", "file_name", "title"} of the page's document.
+        page (Page): Parsed page.
+
+    Returns:
+        List[Tuple[str, str, dict]]: (chunk_id, text, metadata) per chunk.
+    """
+    chunk_data = []
+    for i, chunk in enumerate(chunk_page_text(page.text)):
+        chunk_id = f"{doc_meta['id']}_page{page.number}_chunk{i}"
+        metadata = {
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "document_id": doc_meta["id"],
+            "page_no": page.number,
+            "chunk_index": i,
+            "file_name": doc_meta["file_name"],
+            "title": doc_meta["title"],
+        }
+        chunk_data.append((chunk_id, chunk, metadata))
+    return chunk_data
 
 
 async def save_documents_to_store(docs: Documents, user_id: str, thread_id: str):
@@ -47,20 +197,13 @@ async def save_documents_to_store(docs: Documents, user_id: str, thread_id: str)
     # Chunking
     start_time = time.time()
     for doc in docs.documents:
+        doc_meta = {"id": doc.id, "file_name": doc.file_name, "title": doc.title}
         for page in doc.content:
-            chunks = await asyncio.to_thread(chunk_page_text, page.text)
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{doc.id}_page{page.number}_chunk{i}"
-                metadata = {
-                    "user_id": user_id,
-                    "thread_id": thread_id,
-                    "document_id": doc.id,
-                    "page_no": page.number,
-                    "chunk_index": i,
-                    "file_name": doc.file_name,
-                    "title": doc.title,
-                }
-                chunk_data.append((chunk_id, chunk, metadata))
+            chunk_data.extend(
+                await asyncio.to_thread(
+                    build_page_chunks, doc_meta, page, user_id, thread_id
+                )
+            )
     end_time = time.time()
     print(
         f"Processed {len(chunk_data)} chunks in {end_time - start_time:.2f} seconds for user {user_id}"
@@ -76,7 +219,10 @@ async def save_documents_to_store(docs: Documents, user_id: str, thread_id: str)
 
         start_time = time.time()
         embeddings = await asyncio.to_thread(
-            vectorstore.embeddings.embed_documents, list(batch_texts)
+            embed_with_cache,
+            list(batch_texts),
+            EMBEDDING_CACHE_NAME,
+            vectorstore.embeddings.embed_documents,
         )
         end_time = time.time()
         print(
@@ -95,5 +241,7 @@ async def save_documents_to_store(docs: Documents, user_id: str, thread_id: str)
         )
         end_time = time.time()
         print(f"Upserted batch {batch_idx + 1} in {end_time - start_time:.2f} seconds")
+        # Same chunks into the thread's BM25 index
+        await asyncio.to_thread(lexical.add_chunks, user_id, thread_id, batch)
 
     print(f"Saved {len(chunk_data)} chunks to Chroma for user {user_id}")
@@ -1,10 +1,19 @@
 import asyncio
+import re
 import time
+from functools import lru_cache
 from core.config import settings
 from google import genai
 from openai import AsyncOpenAI
 from langchain_core.output_parsers import PydanticOutputParser
-from core.constants import SWITCHES, FALLBACK_OPENAI_MODEL, FALLBACK_GEMINI_MODEL
+from core.constants import (
+    SWITCHES,
+    FALLBACK_OPENAI_MODEL,
+    FALLBACK_GEMINI_MODEL,
+    PRIORITY_BACKGROUND,
+)
+from core.llm.scheduler import llm_scheduler
+from core.services.query_stream import AnswerFieldExtractor
 
 if SWITCHES["REMOTE_GPU"]:
     import core.llm.configurations.remote_llm as llm_module
@@ -13,6 +22,13 @@ else:
 
 MyServerLLM = llm_module.MyServerLLM
 
+
+@lru_cache(maxsize=None)
+def get_server_llm(model: str, port: int) -> MyServerLLM:
+    """Reuse one LLM wrapper per (model, port); transports are pooled per endpoint."""
+    return MyServerLLM(model=model, port=port)
+
+
 API_KEYS = [
     settings.API_KEY_1,
     settings.API_KEY_2,
@@ -21,6 +37,23 @@ API_KEYS = [
     settings.API_KEY_5,
 ]
 
+async def call_gpu_llm(gpu_llm, prompt: str, token_stream=None) -> str:
+    """
+    Run one GPU call. With a `token_stream` (QueryStream) the model output is
+    streamed and the "answer" field is forwarded token by token while generating.
+    """
+    if token_stream is None:
+        return await gpu_llm._acall(prompt)
+
+    await token_stream.reset_answer()
+    extractor = AnswerFieldExtractor()
+    pieces = []
+    async for piece in gpu_llm.stream_text(prompt):
+        pieces.append(piece)
+        await token_stream.token(extractor.feed(piece))
+    return re.sub(r"<think>.*?</think>", "", "".join(pieces), flags=re.DOTALL)
+
+
 openai_client = AsyncOpenAI(api_key=settings.OPENAI_API)
 MAX_RETRIES = 8  # Total attempts across all LLMs
 
@@ -33,6 +66,9 @@ async def invoke_llm(
     contents,
     port=11434,
     remove_thinking=False,
+    priority=PRIORITY_BACKGROUND,
+    user_id=None,
+    token_stream=None,
 ):
     """
     Unified structured LLM invocation with retries and fallbacks:
@@ -40,6 +76,10 @@ async def invoke_llm(
     - Gemini API
     - OpenAI API
     Each returns parsed structured data using the same logic.
+
+    GPU calls wait for a slot from the LLM scheduler; `priority` (PRIORITY_*)
+    and `user_id` decide the order in which queued calls are served.
+    If `token_stream` is given, answer tokens of GPU calls are pushed to it.
     """
     global count
 
@@ -61,10 +101,11 @@ async def invoke_llm(
         if gpu_model:
             try:
                 print("Trying GPU server...")
-                gpu_llm = MyServerLLM(model=gpu_model, port=port)
-                s = time.time()
-                llm_output = await asyncio.to_thread(gpu_llm._call, prompt)
-                e = time.time()
+                gpu_llm = get_server_llm(gpu_model, port)
+                async with llm_scheduler.slot(gpu_model, port, priority, user_id):
+                    s = time.time()
+                    llm_output = await call_gpu_llm(gpu_llm, prompt, token_stream)
+                    e = time.time()
                 print(f"Success via GPU server, LLM call took {e - s:.2f}s")
                 structured = parser.parse(llm_output)
                 return structured
@@ -75,10 +116,15 @@ async def invoke_llm(
                 temp_port = 11434
                 try:
                     print(f"Retrying GPU server on alternate port {temp_port}...")
-                    gpu_llm = MyServerLLM(model=gpu_model, port=temp_port)
-                    s = time.time()
-                    llm_output = await asyncio.to_thread(gpu_llm._call, prompt)
-                    e = time.time()
+                    gpu_llm = get_server_llm(gpu_model, temp_port)
+                    async with llm_scheduler.slot(
+                        gpu_model, temp_port, priority, user_id
+                    ):
+                        s = time.time()
+                        llm_output = await call_gpu_llm(
+                            gpu_llm, prompt, token_stream
+                        )
+                        e = time.time()
                     print(f"Success via GPU server, LLM call took {e - s:.2f}s")
                     structured = parser.parse(llm_output)
                     return structured
@@ -1,41 +1,18 @@
+import asyncio
+import json
 from langchain_ollama import ChatOllama
 from langchain_core.language_models import LLM
-from typing import Optional, List, Tuple, Dict
+from typing import Any, AsyncIterator, Optional, List
 from pydantic import PrivateAttr
 import re
-import threading
-from contextlib import contextmanager
-
-# Global dictionary of locks per (model, port)
-_locks: Dict[Tuple[str, int], threading.Lock] = {}
-_locks_global_lock = threading.Lock()  # Protects access to the _locks dict
-
-
-@contextmanager
-def model_port_lock(model: str, port: int):
-    """
-    Context manager that ensures only one request per (model, port)
-    is processed at a time. Blocks others until the lock is released.
-    """
-    key = (model, port)
-
-    # Ensure thread-safe creation of locks
-    with _locks_global_lock:
-        if key not in _locks:
-            _locks[key] = threading.Lock()
-
-    lock = _locks[key]
-    lock.acquire()
-    try:
-        yield
-    finally:
-        lock.release()
+from core.constants import LLM_ENDPOINT_TIMEOUTS, LLM_DEFAULT_TIMEOUT
+from core.llm.http_pool import get_async_client
 
 
 class MyServerLLM(LLM):
     """
     Custom LLM wrapper using ChatOllama to call a locally running Ollama model.
-    Ensures only one request per (model, port) is processed at a time.
+    Concurrency per (model, port) is controlled by core/llm/scheduler.py.
     """
 
     model: str
@@ -47,9 +24,16 @@ class MyServerLLM(LLM):
         super().__init__(model=model, port=port, **kwargs)
 
         self._client = ChatOllama(
-            model=model, base_url=f"http://localhost:{port}", timeout=1000, **kwargs
+            model=model,
+            base_url=self.base_url,
+            timeout=LLM_ENDPOINT_TIMEOUTS.get(port, LLM_DEFAULT_TIMEOUT),
+            **kwargs,
         )
 
+    @property
+    def base_url(self) -> str:
+        return f"http://localhost:{self.port}"
+
     @property
     def _llm_type(self) -> str:
         return "ollama_local_llm"
@@ -57,15 +41,85 @@ class MyServerLLM(LLM):
     def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
         """
         Call the local Ollama model using ChatOllama.
-        Blocks concurrent requests for the same (model, port).
         """
-        with model_port_lock(self.model, self.port):
-            print(f"Processing request for model={self.model}, port={self.port}")
-            try:
-                response = self._client.invoke(prompt, stop=stop)
-                cleaned_text = re.sub(
-                    r"<think>.*?</think>", "", response.content, flags=re.DOTALL
-                )
-                return cleaned_text
-            except Exception as e:
-                raise RuntimeError(f"Failed to call Ollama locally: {e}") from e
+        print(f"Processing request for model={self.model}, port={self.port}")
+        try:
+            response = self._client.invoke(prompt, stop=stop)
+            cleaned_text = re.sub(
+                r"<think>.*?</think>", "", response.content, flags=re.DOTALL
+            )
+            return cleaned_text
+        except Exception as e:
+            raise RuntimeError(f"Failed to call Ollama locally: {e}") from e
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Call the local Ollama chat API over the pooled async HTTP client.
+        Cancelling the caller aborts the upstream request.
+        """
+        client = get_async_client(
+            self.base_url, LLM_ENDPOINT_TIMEOUTS.get(self.port, LLM_DEFAULT_TIMEOUT)
+        )
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+        }
+        if stop:
+            payload["options"] = {"stop": stop}
+
+        print(f"Processing request for model={self.model}, port={self.port}")
+        try:
+            response = await client.post("/api/chat", json=payload)
+            response.raise_for_status()
+            data = response.json()
+        except asyncio.CancelledError:
+            print(f"Request for model={self.model}, port={self.port} cancelled")
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to call Ollama locally: {e}") from e
+
+        content = (data.get("message") or {}).get("content", "")
+        return re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL)
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the raw model output of the local Ollama chat API piece by piece.
+        """
+        client = get_async_client(
+            self.base_url, LLM_ENDPOINT_TIMEOUTS.get(self.port, LLM_DEFAULT_TIMEOUT)
+        )
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        }
+
+        print(f"Streaming request for model={self.model}, port={self.port}")
+        try:
+            async with client.stream("POST", "/api/chat", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(data["error"])
+                    piece = (data.get("message") or {}).get("content", "")
+                    if piece:
+                        yield piece
+                    if data.get("done"):
+                        break
+        except asyncio.CancelledError:
+            print(f"Request for model={self.model}, port={self.port} cancelled")
+            raise
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to stream from Ollama locally: {e}") from e
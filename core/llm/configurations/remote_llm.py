@@ -1,8 +1,11 @@
+import asyncio
 import requests
 from langchain_core.language_models import LLM
-from typing import Optional, List
+from typing import Any, AsyncIterator, Optional, List
 import re
 from core.config import settings
+from core.constants import REMOTE_LLM_TIMEOUT
+from core.llm.http_pool import get_async_client
 
 QUERY_URL = settings.QUERY_URL
 
@@ -15,11 +18,15 @@ class MyServerLLM(LLM):
 
     model: str
     url: str
+    port: int = 11434
 
     def __init__(self, model: str, port: int = 11434, **kwargs):
         print(f"Initializing MyServerLLM with model={model} at port={port}")
         super().__init__(
-            model=model, url=f"{QUERY_URL}?model={model}&port={port}", **kwargs
+            model=model,
+            port=port,
+            url=f"{QUERY_URL}?model={model}&port={port}",
+            **kwargs,
         )
 
     @property
@@ -34,18 +41,55 @@ class MyServerLLM(LLM):
             response = requests.post(
                 self.url,
                 json={"prompt": prompt},
-                timeout=600,
+                timeout=REMOTE_LLM_TIMEOUT,
             )
             response.raise_for_status()
             data = response.json()
             print(data)
-            cleaned_text = re.sub(
-                r"<think>.*?</think>",
-                "",
-                data.get("response", ""),
-                flags=re.DOTALL,
-                # r"<think>.*?</think>", "", data.get("content", ""), flags=re.DOTALL
-            )
-            return cleaned_text
+            return self._clean(data)
         except requests.exceptions.RequestException as e:
             raise RuntimeError(f"Failed to call GPU LLM server: {e}") from e
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Call the GPU LLM endpoint over the pooled async HTTP client.
+        Cancelling the caller aborts the upstream request.
+        """
+        client = get_async_client(QUERY_URL, REMOTE_LLM_TIMEOUT)
+        try:
+            response = await client.post(
+                QUERY_URL,
+                params={"model": self.model, "port": self.port},
+                json={"prompt": prompt},
+            )
+            response.raise_for_status()
+            data = response.json()
+        except asyncio.CancelledError:
+            print(f"Request for model={self.model}, port={self.port} cancelled")
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to call GPU LLM server: {e}") from e
+        print(data)
+        return self._clean(data)
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        The GPU server answers in one piece, so the whole output is yielded at once.
+        """
+        yield await self._acall(prompt)
+
+    @staticmethod
+    def _clean(data: dict) -> str:
+        return re.sub(
+            r"<think>.*?</think>",
+            "",
+            data.get("response", ""),
+            flags=re.DOTALL,
+            # r"<think>.*?</think>", "", data.get("content", ""), flags=re.DOTALL
+        )
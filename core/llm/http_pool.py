@@ -0,0 +1,59 @@
+import importlib.util
+from typing import Dict
+
+import httpx
+
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+MAX_CONNECTIONS_PER_ENDPOINT = 32
+MAX_KEEPALIVE_CONNECTIONS_PER_ENDPOINT = 16
+KEEPALIVE_EXPIRY = 120  # seconds an idle connection is kept in the pool
+CONNECT_TIMEOUT = 10
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_async_client(base_url: str, timeout: float) -> httpx.AsyncClient:
+    """
+    Return the pooled AsyncClient for an endpoint, creating it on first use.
+
+    One client per endpoint keeps connections alive between LLM calls instead of
+    paying a TCP (and TLS) handshake per request. Cancelling the awaiting task
+    closes the underlying connection, which makes Ollama abort the generation.
+
+    Args:
+        base_url (str): Endpoint base url, e.g. "http://localhost:11434".
+        timeout (float): Read/write/pool timeout for this endpoint in seconds.
+
+    Returns:
+        httpx.AsyncClient: Shared client for the endpoint.
+    """
+    client = _clients.get(base_url)
+    if client is not None and not client.is_closed:
+        return client
+
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS_PER_ENDPOINT,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS_PER_ENDPOINT,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    _clients[base_url] = client
+    print(f"Created pooled HTTP client for {base_url} (http2={HTTP2_AVAILABLE})")
+    return client
+
+
+async def close_async_clients():
+    """Close all pooled clients (used on shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Failed to close HTTP client: {e}")
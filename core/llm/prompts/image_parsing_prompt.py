@@ -2,3 +2,13 @@ def image_parsing_prompt() -> str:
     return (
         "Extract all possible text and information from the image including any charts, tables, graphs, trends, diagrams and visual descriptions. Don't make up any information. Only output the extracted information without any imagination."
     )
+
+
+def batch_image_parsing_prompt(image_count: int) -> str:
+    return (
+        f"You are given {image_count} images. For each image, in the order they are given, "
+        "extract all possible text and information including any charts, tables, graphs, trends, diagrams and visual descriptions. "
+        "Don't make up any information. Only output the extracted information without any imagination. "
+        "Start the output of every image with a line containing only `=== IMAGE <n> ===`, where <n> is the image number starting at 1, "
+        f"and output exactly {image_count} such sections, even if an image contains nothing (leave its section empty)."
+    )
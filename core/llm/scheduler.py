@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from core.constants import (
+    LLM_DEFAULT_PARALLELISM,
+    LLM_ENDPOINT_PARALLELISM,
+    PRIORITY_BACKGROUND,
+    PRIORITY_NAMES,
+)
+from core.utils.metrics import increment, set_value
+
+METRICS_NAMESPACE = "llm_scheduler"
+ANONYMOUS_USER = "_anonymous"
+
+
+class _Endpoint:
+    """Slots and wait queues of one (model, port) endpoint."""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.active = 0
+        # priority -> user_id -> waiting futures (round-robin across users)
+        self.queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+
+    def has_waiters(self) -> bool:
+        return any(queue for queue in self.queues.values())
+
+    def enqueue(self, priority: int, user_id: str, future: asyncio.Future):
+        queue = self.queues.setdefault(priority, OrderedDict())
+        queue.setdefault(user_id, deque()).append(future)
+
+    def remove(self, priority: int, user_id: str, future: asyncio.Future):
+        queue = self.queues.get(priority, {})
+        waiters = queue.get(user_id)
+        if not waiters:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del queue[user_id]
+
+    def pop_next(self) -> Optional[asyncio.Future]:
+        """Highest priority first; inside a priority, one waiter per user in turn."""
+        for priority in sorted(self.queues):
+            queue = self.queues[priority]
+            while queue:
+                user_id, waiters = next(iter(queue.items()))
+                future = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(user_id)
+                else:
+                    del queue[user_id]
+                if not future.done():
+                    return future
+        return None
+
+    def depth(self, priority: int) -> int:
+        return sum(len(waiters) for waiters in self.queues.get(priority, {}).values())
+
+
+class LLMScheduler:
+    """
+    Admission control for GPU LLM endpoints.
+
+    Each (model, port) endpoint runs at most LLM_ENDPOINT_PARALLELISM[port]
+    requests at once (match it to OLLAMA_NUM_PARALLEL of that server). Waiting
+    requests are served by priority class, and round-robin between users within
+    a class so one user's background job cannot monopolise an endpoint.
+    """
+
+    def __init__(self):
+        self._endpoints: Dict[Tuple[str, int], _Endpoint] = {}
+
+    def _endpoint(self, model: str, port: int) -> _Endpoint:
+        key = (model, port)
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            capacity = LLM_ENDPOINT_PARALLELISM.get(port, LLM_DEFAULT_PARALLELISM)
+            endpoint = self._endpoints[key] = _Endpoint(f"{model}@{port}", capacity)
+        return endpoint
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        port: int,
+        priority: int = PRIORITY_BACKGROUND,
+        user_id: Optional[str] = None,
+    ):
+        """
+        Wait for a free slot on the endpoint and hold it for the duration of the block.
+
+        Args:
+            model (str): Model name.
+            port (int): Port of the ollama instance serving the model.
+            priority (int): One of the PRIORITY_* constants, lower is served first.
+            user_id (str, optional): Requesting user, used for fair queuing.
+        """
+        endpoint = self._endpoint(model, port)
+        user_key = user_id or ANONYMOUS_USER
+        start_time = time.time()
+
+        if endpoint.active < endpoint.capacity and not endpoint.has_waiters():
+            endpoint.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            endpoint.enqueue(priority, user_key, future)
+            self._report(endpoint)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot was handed over right before the cancellation
+                    self._release(endpoint)
+                else:
+                    endpoint.remove(priority, user_key, future)
+                    self._report(endpoint)
+                raise
+
+        waited = time.time() - start_time
+        priority_name = PRIORITY_NAMES.get(priority, str(priority))
+        increment(METRICS_NAMESPACE, f"{endpoint.name}/{priority_name}/granted")
+        increment(METRICS_NAMESPACE, f"{endpoint.name}/{priority_name}/wait_seconds", waited)
+        if waited > 1:
+            print(f"LLM request ({priority_name}) waited {waited:.2f}s for {endpoint.name}")
+        self._report(endpoint)
+
+        try:
+            yield
+        finally:
+            self._release(endpoint)
+
+    def _release(self, endpoint: _Endpoint):
+        endpoint.active -= 1
+        while endpoint.active < endpoint.capacity:
+            future = endpoint.pop_next()
+            if future is None:
+                break
+            endpoint.active += 1
+            future.set_result(None)
+        self._report(endpoint)
+
+    def _report(self, endpoint: _Endpoint):
+        set_value(METRICS_NAMESPACE, f"{endpoint.name}/active", endpoint.active)
+        for priority, name in PRIORITY_NAMES.items():
+            set_value(
+                METRICS_NAMESPACE, f"{endpoint.name}/{name}/queued", endpoint.depth(priority)
+            )
+
+    def queue_depths(self) -> dict:
+        """Current number of waiting requests per endpoint and priority class."""
+        return {
+            endpoint.name: {
+                name: endpoint.depth(priority) for priority, name in PRIORITY_NAMES.items()
+            }
+            for endpoint in self._endpoints.values()
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,67 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+from core.constants import OCR_MAX_WORKERS, PARSER_MAX_WORKERS
+from core.utils.metrics import increment, set_value
+
+PARSER_POOL = "parser_pool"
+OCR_POOL = "ocr_pool"
+
+_POOL_SIZES = {PARSER_POOL: PARSER_MAX_WORKERS, OCR_POOL: OCR_MAX_WORKERS}
+_executors: Dict[str, ProcessPoolExecutor] = {}
+_in_flight: Dict[str, int] = {name: 0 for name in _POOL_SIZES}
+
+
+def get_executor(name: str) -> ProcessPoolExecutor:
+    """
+    Bounded process pool for CPU-bound work: PARSER_POOL for document
+    extraction (core/parsers/extractors.py), OCR_POOL for Tesseract
+    (core/parsers/ocr.py). Created lazily with the spawn start method so
+    workers do not inherit the event loop, socket.io or the loaded embedding
+    model of the app process.
+    """
+    if name not in _executors:
+        print(f"Starting {name} with {_POOL_SIZES[name]} workers")
+        _executors[name] = ProcessPoolExecutor(
+            max_workers=_POOL_SIZES[name],
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executors[name]
+
+
+async def run_in_pool(name: str, fn: Callable, *args: Any) -> Any:
+    """
+    Run `fn(*args)` in the named process pool without blocking the event loop.
+    `fn` and its arguments must be picklable (module-level functions, plain data).
+    If a worker died and broke the pool, the pool is recreated for later calls.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor(name)
+
+    _in_flight[name] += 1
+    set_value(name, "in_flight", _in_flight[name])
+    try:
+        return await loop.run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        increment(name, "broken")
+        if _executors.get(name) is executor:
+            del _executors[name]
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        _in_flight[name] -= 1
+        set_value(name, "in_flight", _in_flight[name])
+        increment(name, "tasks")
+
+
+async def run_in_parser_pool(fn: Callable, *args: Any) -> Any:
+    return await run_in_pool(PARSER_POOL, fn, *args)
+
+
+def shutdown_parser_executor():
+    """Shut down every process pool (parser and OCR)."""
+    for name in list(_executors):
+        _executors.pop(name).shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,290 @@
+"""
+CPU-bound document extraction, run inside the parser process pool (core/parsers/executor.py).
+
+Everything here is synchronous and must stay importable without the app
+(no socket.io, no LLM clients). Each extractor returns a plain dict:
+
+    {
+        "pages": [{"number": int, "text": str, "images": [str]}],
+        "ocr": [(placeholder, image_path)],  # images the caller still has to parse
+        "full_text": str,                    # only when it differs from the joined pages
+    }
+
+Pages contain `{PENDING_<image name>}` placeholders where the OCR text of an
+image goes; the caller parses the images and fills them in.
+"""
+
+import io
+import os
+import re
+import shutil
+import traceback
+from pathlib import Path
+from typing import Optional
+
+import olefile
+
+
+def _placeholder(image_name: str) -> str:
+    return f"{{PENDING_{image_name}}}"
+
+
+def _make_dir(path: str):
+    try:
+        os.makedirs(path, exist_ok=True)
+    except Exception:
+        traceback.print_exc()
+
+
+def extract_text_from_doc(path: str) -> str:
+    """Extract readable text from a legacy .doc file (pure Python)."""
+    if not olefile.isOleFile(path):
+        raise ValueError(f"{path} is not a valid .doc file")
+
+    with olefile.OleFileIO(path) as ole:
+        if not ole.exists("WordDocument"):
+            raise ValueError("No WordDocument stream found")
+        stream = ole.openstream("WordDocument")
+        data = stream.read()
+
+    # Decode binary to text (best effort)
+    text = data.decode("latin-1", errors="ignore")
+    # Remove control characters
+    text = re.sub(r"[\x00-\x08\x0B\x0C\x0E-\x1F]+", " ", text)
+    # Collapse extra whitespace
+    text = re.sub(r"\s{2,}", " ", text)
+    # Keep only readable ASCII chunks
+    text = "\n".join(re.findall(r"[ -~]{5,}", text))
+    return text.strip()
+
+
+def extract_doc(file_path: str) -> dict:
+    text = extract_text_from_doc(file_path)
+    return {"pages": [{"number": 1, "text": text, "images": []}], "ocr": []}
+
+
+def extract_markdown(file_path: str, image_dir: str) -> dict:
+    import markdown
+    from bs4 import BeautifulSoup
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        md_text = f.read()
+
+    # Convert markdown -> HTML -> plain text
+    try:
+        html = markdown.markdown(md_text)
+    except Exception:
+        traceback.print_exc()
+        html = md_text  # fallback
+    try:
+        soup = BeautifulSoup(html, "html.parser")
+        plain_text = soup.get_text(separator="\n")
+    except Exception:
+        traceback.print_exc()
+        plain_text = md_text
+
+    _make_dir(image_dir)
+
+    ocr = []
+    image_names = []
+
+    # Regex to find Markdown image syntax: ![alt](path)
+    image_pattern = re.compile(r"!\[.*?\]\((.*?)\)")
+    matches = image_pattern.findall(md_text)
+
+    page_text = plain_text
+    for idx, img_path in enumerate(matches, start=1):
+        try:
+            resolved_path = img_path
+            if not os.path.isabs(resolved_path):
+                # make path relative to md file
+                resolved_path = os.path.join(os.path.dirname(file_path), resolved_path)
+
+            if not os.path.exists(resolved_path):
+                print(f"Markdown image not found: {resolved_path}")
+                continue
+
+            ext_img = Path(resolved_path).suffix.lstrip(".")
+            image_name = f"md_img{idx}.{ext_img}"
+            dest_path = os.path.join(image_dir, image_name)
+
+            # Copy image into project folder
+            try:
+                shutil.copy(resolved_path, dest_path)
+            except Exception:
+                traceback.print_exc()
+                continue
+            image_names.append(image_name)
+
+            placeholder = _placeholder(image_name)
+            page_text += f"\n\n{placeholder}"
+            ocr.append((placeholder, dest_path))
+        except Exception:
+            traceback.print_exc()
+
+    return {
+        "pages": [{"number": 1, "text": page_text, "images": image_names}],
+        "ocr": ocr,
+        "full_text": md_text,  # preserve original markdown
+    }
+
+
+def extract_spreadsheet(file_path: str, ext: str) -> dict:
+    import pandas as pd
+
+    # Read Excel or CSV file
+    if ext == ".xlsx":
+        df = pd.read_excel(file_path, engine="openpyxl")
+    elif ext == ".xls":
+        df = pd.read_excel(file_path, engine="xlrd")
+    else:
+        df = pd.read_csv(file_path)
+
+    # Clean merged cells & empty rows
+    # df = df.ffill().dropna(how='all')
+
+    # Normalize newlines inside cells
+    df = df.applymap(lambda x: str(x).replace("\n", " ") if isinstance(x, str) else x)
+
+    try:
+        text = df.to_json(orient="records", lines=True)
+        # text = df.to_markdown(index=False)
+
+    except Exception:
+        print("Error converting DataFrame to string")
+        traceback.print_exc()
+        text = str(df)
+
+    # Optional: compact whitespace
+    text = re.sub(r"\s{2,}", " ", text).strip()
+    return {"pages": [{"number": 1, "text": text, "images": []}], "ocr": []}
+
+
+def extract_presentation(file_path: str, image_dir: str) -> dict:
+    from pptx import Presentation
+
+    prs = Presentation(file_path)
+    pages = []
+    ocr = []
+    _make_dir(image_dir)
+
+    try:
+        for slide_number, slide in enumerate(prs.slides, start=1):
+            # Extract text
+            slide_text = []
+            for shape in slide.shapes:
+                try:
+                    if hasattr(shape, "text") and getattr(shape, "text", "").strip():
+                        slide_text.append(shape.text.strip())
+                except Exception:
+                    traceback.print_exc()
+            page_text = "\n".join(slide_text)
+
+            image_names = []
+
+            # Extract images
+            for shape_index, shape in enumerate(slide.shapes, start=1):
+                try:
+                    if getattr(shape, "shape_type", None) == 13:  # PICTURE
+                        image = shape.image
+                        image_name = f"slide{slide_number}_img{shape_index}.{image.ext}"
+                        image_path = os.path.join(image_dir, image_name)
+
+                        try:
+                            with open(image_path, "wb") as f:
+                                f.write(image.blob)
+                        except Exception:
+                            traceback.print_exc()
+                            continue
+
+                        placeholder = _placeholder(image_name)
+                        page_text += f"\n\n{placeholder}"
+                        image_names.append(image_name)
+                        ocr.append((placeholder, image_path))
+                except Exception:
+                    traceback.print_exc()
+
+            pages.append({"number": slide_number, "text": page_text, "images": image_names})
+    except Exception:
+        traceback.print_exc()
+
+    return {"pages": pages, "ocr": ocr}
+
+
+def count_pdf_pages(file_path: str) -> int:
+    import fitz
+
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+
+def extract_pdf(
+    file_path: str, image_dir: str, start: int = 0, end: Optional[int] = None
+) -> dict:
+    """
+    Extract text and embedded raster images of a fitz-readable file.
+    `start`/`end` (0-based, end exclusive) limit extraction to a page range so
+    shards of one document can be parsed by several processes, each with its
+    own fitz handle.
+    """
+    import fitz
+    from PIL import Image
+
+    doc = fitz.open(file_path)
+    pages = []
+    ocr = []
+    _make_dir(image_dir)
+
+    try:
+        end = len(doc) if end is None else min(end, len(doc))
+        for page_number in range(start, end):
+            try:
+                page = doc.load_page(page_number)
+                page_text = page.get_text("text")
+            except Exception:
+                traceback.print_exc()
+                page_text = ""
+                page = None
+
+            image_names = []
+
+            # Extract embedded raster images, only these are sent to OCR
+            try:
+                image_list = page.get_images(full=True) if page else []
+            except Exception:
+                traceback.print_exc()
+                image_list = []
+
+            for img_index, img in enumerate(image_list):
+                try:
+                    xref = img[0]
+                    base_image = doc.extract_image(xref)
+                    image_bytes = base_image.get("image")
+                    image_ext = base_image.get("ext", "png")
+                    if not image_bytes:
+                        continue
+                    image = Image.open(io.BytesIO(image_bytes))
+
+                    image_name = f"page{page_number + 1}_img{img_index + 1}.{image_ext}"
+                    image_path = os.path.join(image_dir, image_name)
+                    try:
+                        image.save(image_path)
+                    except Exception:
+                        traceback.print_exc()
+                        continue
+
+                    # Put placeholder where the image OCR result should go
+                    placeholder = _placeholder(image_name)
+                    page_text += f"\n\n{placeholder}"
+                    image_names.append(image_name)
+                    ocr.append((placeholder, image_path))
+                except Exception:
+                    traceback.print_exc()
+
+            pages.append(
+                {"number": page_number + 1, "text": page_text, "images": image_names}
+            )
+    finally:
+        doc.close()
+
+    return {"pages": pages, "ocr": ocr}
@@ -1,14 +1,28 @@
 import asyncio
 import base64
+import re
 import time
 import aiofiles
 import httpx
-from PIL import Image
-import pytesseract
-from core.constants import IMAGE_PARSER_LLM
+from core.constants import (
+    IMAGE_PARSER_LLM,
+    PRIORITY_BACKGROUND,
+    VISION_BATCH_SIZE,
+    VISION_BATCH_TIMEOUT,
+)
 from core.config import settings
 import os
-from core.llm.prompts.image_parsing_prompt import image_parsing_prompt
+from typing import List, Optional
+from core.llm.http_pool import get_async_client
+from core.llm.prompts.image_parsing_prompt import (
+    batch_image_parsing_prompt,
+    image_parsing_prompt,
+)
+from core.llm.scheduler import llm_scheduler
+from core.parsers.image_cache import ImageResultCache, for_image
+from core.parsers.ocr import image_filter, ocr_engine, upload_slot
+from core.parsers.vision_batcher import VisionBatcher
+from core.utils.metrics import increment
 
 # Optional for Windows if Tesseract throws errors:
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -18,147 +32,215 @@ MODEL = IMAGE_PARSER_LLM
 gemma = settings.USE_VISION_MODEL
 REMOTE_GPU = settings.REMOTE_GPU
 VISION_SERVER_PORT = 11434
+VISION_TIMEOUT = 60  # seconds per image
+TESSERACT_ENGINE = "tesseract"
+
+_IMAGE_SECTION = re.compile(
+    r"^\s*=+\s*IMAGE\s+(\d+)\s*=+\s*$", re.MULTILINE | re.IGNORECASE
+)
+
+
+async def remote_gemma_parse(
+    image_bytes: bytes, user_id: str = None, retries: int = 2
+) -> str | None:
+    """Try Gemma via remote vision API, return plain text or None."""
+
+    async with llm_scheduler.slot(
+        MODEL, VISION_SERVER_PORT, PRIORITY_BACKGROUND, user_id
+    ):
+        client = get_async_client(VISION_URL, VISION_TIMEOUT)
+        for attempt in range(1, retries + 1):
+            try:
+                prompt = image_parsing_prompt()
+                files = {"file": ("filename", image_bytes)}
+                data = {"prompt": prompt}
+                params = {"model": MODEL, "port": VISION_SERVER_PORT}
+
+                start_time = time.time()
+                response = await client.post(
+                    VISION_URL,
+                    files=files,
+                    data=data,
+                    params=params,
+                    timeout=VISION_TIMEOUT,
+                )
+                end_time = time.time()
+
+                if response.status_code == 200:
+                    payload = response.json()
+                    print(f"Gemma[Remote] succeeded in {end_time - start_time:.2f} seconds")
+
+                    if isinstance(payload, dict) and "text" in payload:
+                        return payload["text"]
+                    return str(payload)
 
-_SEMAPHORES: dict[tuple[str, int], asyncio.Semaphore] = {}
-_SEMAPHORE_LOCK = asyncio.Lock()
+                print(
+                    f"[Gemma[Remote] attempt {attempt}] Failed with status {response.status_code}: {response.text}"
+                )
 
+            except Exception as e:
+                print(f"[Gemma[Remote] attempt {attempt}] Exception: {e}")
+            await asyncio.sleep(1)
+
+    return None
+
+
+async def local_vision_request(
+    images: List[bytes], prompt: str, user_id: str = None, retries: int = 2
+) -> str | None:
+    """Send one or more images to the local Ollama vision endpoint, return its text or None."""
+
+    async with llm_scheduler.slot(
+        MODEL, VISION_SERVER_PORT, PRIORITY_BACKGROUND, user_id
+    ):
+        client = get_async_client(
+            f"http://localhost:{VISION_SERVER_PORT}", VISION_TIMEOUT
+        )
+        payload = {
+            "model": MODEL,
+            "prompt": prompt,
+            "images": [base64.b64encode(image).decode("utf-8") for image in images],
+            "stream": False,
+        }
+        for attempt in range(1, retries + 1):
+            try:
+                start_time = time.time()
+                response = await client.post(
+                    "/api/generate",
+                    json=payload,
+                    timeout=VISION_TIMEOUT * len(images),
+                )
+                end_time = time.time()
 
-async def get_semaphore(port: int, model: str) -> asyncio.Semaphore:
-    """Return a shared semaphore for the given model/port pair."""
+                response.raise_for_status()
+                result = response.json()
+                text = result.get("completion") or result.get("response") or ""
+                print(
+                    f"Gemma[Local] succeeded for {len(images)} image(s) in {end_time - start_time:.2f} seconds"
+                )
+                return text
 
-    key = (model, port)
-    semaphore = _SEMAPHORES.get(key)
-    if semaphore is not None:
-        return semaphore
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code if e.response else "unknown"
+                body = e.response.text if e.response else ""
+                print(f"[Gemma[Local] attempt {attempt}] HTTP {status}: {body}")
+            except Exception as e:
+                print(f"[Gemma[Local] attempt {attempt}] Exception: {e}")
 
-    async with _SEMAPHORE_LOCK:
-        semaphore = _SEMAPHORES.get(key)
-        if semaphore is None:
-            _SEMAPHORES[key] = asyncio.Semaphore(1)
-            semaphore = _SEMAPHORES[key]
+            await asyncio.sleep(1)
 
-    return semaphore
+    return None
 
 
-async def image_parser(image_path: str, retries: int = 2) -> str:
-    """
-    Parse image text using Gemma vision API.
+async def local_vision_parse(image_bytes: bytes, user_id: str = None) -> str | None:
+    """Try local Ollama vision endpoint for a single image, return plain text or None."""
+    return await local_vision_request([image_bytes], image_parsing_prompt(), user_id)
 
-    Sends the image file as multipart/form-data
 
-    Also sends `model` and `port` as query params. Falls back to Tesseract OCR
-    if Gemma fails after `retries` attempts. Always returns plain text or an
-    empty string if everything fails.
+def split_batch_output(text: str, image_count: int) -> Optional[List[str]]:
+    """
+    Split a multi-image answer on its `=== IMAGE n ===` markers.
+    Returns None unless images 1..image_count each got exactly one section, in order.
     """
+    markers = list(_IMAGE_SECTION.finditer(text))
+    if [int(marker.group(1)) for marker in markers] != list(range(1, image_count + 1)):
+        return None
+    sections = []
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        sections.append(text[marker.end() : end].strip())
+    return sections
+
+
+async def local_vision_batch(
+    images: List[bytes], user_id: str = None
+) -> Optional[List[str]]:
+    """Parse several images with one local vision request."""
+    text = await local_vision_request(
+        images, batch_image_parsing_prompt(len(images)), user_id
+    )
+    if text is None:
+        return None
+    # An answer that can't be split counts as a mismatch and is retried per image
+    return split_batch_output(text, len(images)) or []
 
-    def tesseract_parse() -> str:
-        """Fallback OCR with Tesseract."""
-        try:
-            image = Image.open(image_path).convert("RGB")
-            return pytesseract.image_to_string(image)
-        except Exception as e:
-            print(f"[Tesseract] Exception: {e}")
-            return ""
 
-    async def remote_gemma_parse() -> str | None:
-        """Try Gemma via remote vision API, return plain text or None."""
-
-        semaphore = await get_semaphore(VISION_SERVER_PORT, MODEL)
-        async with semaphore:
-            for attempt in range(1, retries + 1):
-                try:
-                    async with aiofiles.open(image_path, "rb") as f:
-                        file_content = await f.read()
-
-                    prompt = image_parsing_prompt()
-                    files = {"file": ("filename", file_content)}
-                    data = {"prompt": prompt}
-                    params = {"model": MODEL, "port": VISION_SERVER_PORT}
-
-                    start_time = time.time()
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(
-                            VISION_URL,
-                            files=files,
-                            data=data,
-                            params=params,
-                            timeout=60,
-                        )
-                    end_time = time.time()
-
-                    if response.status_code == 200:
-                        payload = response.json()
-                        print(f"Gemma[Remote] succeeded in {end_time - start_time:.2f} seconds")
-
-                        if isinstance(payload, dict) and "text" in payload:
-                            return payload["text"]
-                        return str(payload)
-
-                    print(
-                        f"[Gemma[Remote] attempt {attempt}] Failed with status {response.status_code}: {response.text}"
-                    )
-
-                except Exception as e:
-                    print(f"[Gemma[Remote] attempt {attempt}] Exception: {e}")
-                await asyncio.sleep(1)
+vision_batcher = VisionBatcher(
+    send_batch=local_vision_batch,
+    send_single=local_vision_parse,
+    batch_size=VISION_BATCH_SIZE,
+    timeout=VISION_BATCH_TIMEOUT,
+)
 
-        return None
 
-    async def local_vision_parse() -> str | None:
-        """Try local Ollama vision endpoint, return plain text or None."""
-
-        semaphore = await get_semaphore(VISION_SERVER_PORT, MODEL)
-        async with semaphore:
-            for attempt in range(1, retries + 1):
-                try:
-                    async with aiofiles.open(image_path, "rb") as f:
-                        file_content = await f.read()
-
-                    image_b64 = base64.b64encode(file_content).decode("utf-8")
-                    prompt = image_parsing_prompt()
-                    payload = {
-                        "model": MODEL,
-                        "prompt": prompt,
-                        "images": [image_b64],
-                        "stream": False,
-                    }
-
-                    start_time = time.time()
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(
-                            f"http://localhost:{VISION_SERVER_PORT}/api/generate",
-                            json=payload,
-                            timeout=60,
-                        )
-                    end_time = time.time()
-
-                    response.raise_for_status()
-                    result = response.json()
-                    text = result.get("completion") or result.get("response") or ""
-                    print(f"Gemma[Local] succeeded in {end_time - start_time:.2f} seconds")
-                    return text
-
-                except httpx.HTTPStatusError as e:
-                    status = e.response.status_code if e.response else "unknown"
-                    body = e.response.text if e.response else ""
-                    print(f"[Gemma[Local] attempt {attempt}] HTTP {status}: {body}")
-                except Exception as e:
-                    print(f"[Gemma[Local] attempt {attempt}] Exception: {e}")
-
-                await asyncio.sleep(1)
+async def image_parser(
+    image_path: str, retries: int = 2, user_id: str = None, prefilter: bool = True
+) -> str:
+    """
+    Parse image text using Gemma vision API.
 
-        return None
+    Remotely the image is sent as multipart/form-data with `model` and `port`
+    as query params (`retries` attempts). Locally, images of one user are
+    grouped into multi-image Ollama requests (VISION_BATCH_SIZE, flushed after
+    VISION_BATCH_TIMEOUT). Falls back to Tesseract OCR (batched on the OCR
+    process pool, see core/parsers/ocr.py) if Gemma fails. Always returns plain
+    text or an empty string if everything fails. Vision calls share the LLM
+    scheduler slots of the (model, port) endpoint as background work of `user_id`.
+
+    With `prefilter`, tiny or flat (decorative) images are skipped and give "".
+    At most OCR_MAX_PENDING_PER_UPLOAD images of one user are parsed at once.
+    The file is read once; filter, cache key and vision request share the bytes.
+    """
+    async with upload_slot(user_id):
+        try:
+            async with aiofiles.open(image_path, "rb") as f:
+                image_bytes = await f.read()
+        except Exception as e:
+            print(f"Could not read image {image_path}: {e}")
+            return ""
 
+        if prefilter:
+            reason = await asyncio.to_thread(image_filter, image_bytes)
+            if reason:
+                increment("ocr", "skipped")
+                print(f"Skipping image {os.path.basename(image_path)}: {reason}")
+                return ""
+
+        # Identical images, or near-identical logos and headers of this user, reuse earlier results
+        cache = await for_image(image_bytes, user_id)
+        if cache is None:
+            return await _parse_image(image_path, image_bytes, retries, user_id, None)
+        return await cache.single_flight(
+            lambda: _parse_image(image_path, image_bytes, retries, user_id, cache)
+        )
+
+
+async def _parse_image(
+    image_path: str,
+    image_bytes: bytes,
+    retries: int,
+    user_id: str,
+    cache: Optional[ImageResultCache],
+) -> str:
     if gemma:
+        vision_engine = f"vision:{MODEL}"
+        cached = await cache.get(vision_engine) if cache else None
+        if cached is not None:
+            return cached
         if REMOTE_GPU:
-            gemma_result = await remote_gemma_parse()
+            gemma_result = await remote_gemma_parse(image_bytes, user_id, retries)
         else:
-            gemma_result = await local_vision_parse()
+            gemma_result = await vision_batcher.parse(image_bytes, user_id)
         if gemma_result:
+            if cache:
+                await cache.set(vision_engine, gemma_result.strip())
             return gemma_result.strip()
 
     # fallback to Tesseract
     try:
+        cached = await cache.get(TESSERACT_ENGINE) if cache else None
+        if cached is not None:
+            return cached
         if gemma:
             if REMOTE_GPU:
                 print(
@@ -169,7 +251,10 @@ async def image_parser(image_path: str, retries: int = 2) -> str:
                     f"Gemma[Local] failed for {os.path.basename(image_path)}, falling back to Tesseract"
                 )
         print(f"processing image: {os.path.basename(image_path)} with Tesseract")
-        return (await asyncio.to_thread(tesseract_parse)).strip()
+        text = (await ocr_engine.ocr(image_path)).strip()
+        if cache:
+            await cache.set(TESSERACT_ENGINE, text)
+        return text
     except Exception as e:
         print(f"[Fallback Tesseract] Fatal exception: {e}")
         return ""
@@ -0,0 +1,153 @@
+"""
+Cache of image parsing results, shared across pages, documents and users.
+
+Results are stored per parsing engine (vision model or Tesseract) under two
+keys:
+    exact:      sha256 of the image bytes (shared across users)
+    perceptual: user + image size + 256-bit difference hash (dHash) of the pixels
+The perceptual key also catches the same logo or header re-encoded by a
+different tool. Slides and charts built from one template can differ only in
+small text or numbers and still share a dHash, so perceptual keys are only
+used for small, low-entropy images (IMAGE_CACHE_PERCEPTUAL_MAX_SIDE,
+IMAGE_CACHE_PERCEPTUAL_MAX_ENTROPY) and never match another user's images.
+"""
+
+import asyncio
+import hashlib
+import io
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.constants import (
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_PATH,
+    IMAGE_CACHE_PERCEPTUAL_MAX_ENTROPY,
+    IMAGE_CACHE_PERCEPTUAL_MAX_SIDE,
+)
+from core.parsers.ocr import grayscale_entropy
+from core.utils.disk_cache import DiskCache
+from core.utils.metrics import increment
+
+DHASH_SIZE = 16  # 16x16 comparisons -> 256-bit hash
+
+_cache = None
+# Results being computed right now, so identical images parsed concurrently run once
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def get_image_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(IMAGE_CACHE_PATH, IMAGE_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def image_hashes(image_bytes: bytes) -> Tuple[str, Optional[str]]:
+    """
+    Return (sha256 of the bytes, perceptual key). The perceptual key is None
+    if the image can't be decoded or may carry text that a dHash can't tell
+    apart. Blocking, run in a thread.
+    """
+    from PIL import Image
+
+    sha = hashlib.sha256(image_bytes).hexdigest()
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if (
+                max(image.size) > IMAGE_CACHE_PERCEPTUAL_MAX_SIDE
+                or grayscale_entropy(image) > IMAGE_CACHE_PERCEPTUAL_MAX_ENTROPY
+            ):
+                return sha, None
+            size = f"{image.size[0]}x{image.size[1]}"
+            gray = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE))
+            pixels = list(gray.getdata())
+    except Exception:
+        return sha, None
+
+    bits = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return sha, f"{size}:{bits:064x}"
+
+
+class _ParseAbandoned(Exception):
+    """The task parsing a shared in-flight image was cancelled."""
+
+
+class ImageResultCache:
+    """Lookup/store helper bound to one image; create with `await for_image(image_bytes)`."""
+
+    def __init__(self, sha: str, perceptual: Optional[str], user_id: Optional[str] = None):
+        self.sha = sha
+        # Perceptual matches are only trusted within one user's uploads
+        self.perceptual = f"{user_id}:{perceptual}" if perceptual else None
+
+    def _keys(self, engine: str):
+        keys = [f"{engine}:sha:{self.sha}"]
+        if self.perceptual:
+            keys.append(f"{engine}:dhash:{self.perceptual}")
+        return keys
+
+    async def get(self, engine: str) -> Optional[str]:
+        keys = self._keys(engine)
+        found = await asyncio.to_thread(get_image_cache().get_many, keys)
+        for kind, key in zip(("exact", "perceptual"), keys):
+            if key in found:
+                increment("image_cache", f"hits_{kind}")
+                return found[key].decode("utf-8")
+        increment("image_cache", "misses")
+        return None
+
+    async def set(self, engine: str, text: str):
+        value = text.encode("utf-8")
+        await asyncio.to_thread(
+            get_image_cache().set_many, {key: value for key in self._keys(engine)}
+        )
+
+    async def single_flight(self, parse: Callable[[], Awaitable[str]]) -> str:
+        """
+        Run `parse`, or wait for the same image already being parsed. The
+        in-flight entry is shared across files and users, so when its owner is
+        cancelled the waiters parse the image themselves instead of seeing a
+        cancellation they never asked for.
+        """
+        key = self.perceptual or self.sha
+        while key in _in_flight:
+            shared = _in_flight[key]
+            increment("image_cache", "hits_in_flight")
+            try:
+                return await asyncio.shield(shared)
+            except _ParseAbandoned:
+                if _in_flight.get(key) is shared:
+                    _in_flight.pop(key, None)
+
+        future = asyncio.get_running_loop().create_future()
+        _in_flight[key] = future
+        try:
+            result = await parse()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(_ParseAbandoned())
+            future.exception()  # mark retrieved when nobody else waits
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else waits
+            raise
+        finally:
+            if _in_flight.get(key) is future:
+                _in_flight.pop(key, None)
+
+
+async def for_image(
+    image_bytes: bytes, user_id: Optional[str] = None
+) -> Optional[ImageResultCache]:
+    try:
+        sha, perceptual = await asyncio.to_thread(image_hashes, image_bytes)
+    except Exception as e:
+        print(f"[image-cache] could not hash image: {e}")
+        return None
+    return ImageResultCache(sha, perceptual, user_id)
@@ -0,0 +1,170 @@
+"""
+Tesseract OCR engine.
+
+Images are queued and sent to the OCR process pool in batches of up to
+OCR_BATCH_SIZE, flushed after OCR_BATCH_TIMEOUT seconds. Only
+OCR_MAX_WORKERS * 2 batches are in flight at once, so an image-heavy upload
+can no longer start hundreds of Tesseract processes. upload_slot() limits
+the images of one user parsed at once. image_filter() is a cheap
+check used by image_parser to skip tiny or flat (decorative) images before
+they reach OCR or the vision model.
+"""
+
+import asyncio
+import io
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from core.constants import (
+    OCR_BATCH_SIZE,
+    OCR_BATCH_TIMEOUT,
+    OCR_MAX_WORKERS,
+    OCR_MIN_ENTROPY,
+    OCR_MIN_FILE_BYTES,
+    OCR_MIN_SIDE_PIXELS,
+    OCR_MAX_PENDING_PER_UPLOAD,
+)
+from core.parsers.executor import OCR_POOL, run_in_pool
+from core.utils.metrics import increment
+
+
+def tesseract_batch(image_paths: List[str]) -> List[str]:
+    """OCR a batch of images inside an OCR pool worker. Failed images give ""."""
+    import pytesseract
+    from PIL import Image
+
+    texts = []
+    for image_path in image_paths:
+        try:
+            with Image.open(image_path) as image:
+                texts.append(pytesseract.image_to_string(image.convert("RGB")))
+        except Exception as e:
+            print(f"[Tesseract] Exception for {os.path.basename(image_path)}: {e}")
+            texts.append("")
+    return texts
+
+
+def grayscale_entropy(image) -> float:
+    """Entropy in bits of the grayscale histogram of a PIL image (0 = flat, 8 = max)."""
+    # A small thumbnail is enough to tell flat or simple images from busy ones
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail((64, 64))
+    histogram = thumbnail.histogram()
+    total = sum(histogram)
+    return -sum(
+        (count / total) * math.log2(count / total) for count in histogram if count
+    )
+
+
+def image_filter(image_bytes: bytes) -> Optional[str]:
+    """
+    Return why an image is not worth parsing (None if it is): tiny files,
+    tiny dimensions, or a near-uniform grayscale histogram (lines, fills,
+    spacers, backgrounds). Blocking, run in a thread.
+    """
+    from PIL import Image
+
+    try:
+        if len(image_bytes) < OCR_MIN_FILE_BYTES:
+            return "file too small"
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if min(image.size) < OCR_MIN_SIDE_PIXELS:
+                return f"too small ({image.size[0]}x{image.size[1]})"
+            entropy = grayscale_entropy(image)
+    except Exception as e:
+        print(f"[image-filter] could not inspect image: {e}")
+        return None
+
+    if entropy < OCR_MIN_ENTROPY:
+        return f"low entropy ({entropy:.2f} bits)"
+    return None
+
+
+class OcrEngine:
+    """Batches Tesseract requests onto the OCR process pool."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._in_flight = asyncio.Semaphore(OCR_MAX_WORKERS * 2)
+        self._batches = set()
+
+    def _ensure_started(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.Queue()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def ocr(self, image_path: str) -> str:
+        """Queue one image and wait for its text."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_path, future))
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + OCR_BATCH_TIMEOUT
+            while len(batch) < OCR_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            increment("ocr", "batches")
+            increment("ocr", "images", len(batch))
+            texts = await run_in_pool(
+                OCR_POOL, tesseract_batch, [path for path, _ in batch]
+            )
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight.release()
+
+
+ocr_engine = OcrEngine()
+
+
+_upload_semaphores = {}
+_upload_users = {}
+
+
+@asynccontextmanager
+async def upload_slot(user_id: Optional[str]):
+    """
+    Cap how many images of one user's uploads are parsed at once (vision or
+    OCR), so a single large upload cannot take every slot.
+    """
+    key = user_id or "unknown_user"
+    semaphore = _upload_semaphores.setdefault(
+        key, asyncio.Semaphore(OCR_MAX_PENDING_PER_UPLOAD)
+    )
+    _upload_users[key] = _upload_users.get(key, 0) + 1
+    try:
+        async with semaphore:
+            yield
+    finally:
+        _upload_users[key] -= 1
+        # Forget idle users so the dicts do not grow forever
+        if _upload_users[key] == 0:
+            del _upload_users[key]
+            del _upload_semaphores[key]
@@ -1,13 +1,12 @@
-import json
 import os
-from typing import List
+from typing import Callable, List, Optional
 
-import aiofiles
 import asyncio
 
 from app.socket_handler import sio
 from core.models.document import Documents
 from core.parsers.main import extract_document
+from core.services import parsed_store
 import time
 
 
@@ -16,17 +15,22 @@ async def process_files(
     files_data: List[dict],
     user_id: str,
     thread_id: str,
+    on_page: Optional[Callable] = None,
+    on_file: Optional[Callable] = None,
 ) -> Documents:
     """
     Process a list of uploaded files:
-    - Pass each file to the document parser.
-    - Store the parsed result as JSON in `data/{user_id}/threads/{thread_id}/parsed/`.
+    - Pass each file to the document parser (`on_page` is forwarded to
+      extract_document to receive pages as soon as they are parsed).
+    - Await `on_file(file_data, document_or_None)` once each file is finished.
+    - Store the parsed result in the thread's parsed document store
+      (core/services/parsed_store.py).
     - Accumulate all parsed documents into a Documents object.
 
     Returns:
         Documents: A structured object containing parsed documents.
     """
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
+    parsed_dir = parsed_store.parsed_dir(user_id, thread_id)
     try:
         os.makedirs(parsed_dir, exist_ok=True)
     except Exception as e:
@@ -54,10 +58,16 @@ async def process_files(
                     file_name=file_data.get("file_name"),
                     user_id=user_id,
                     thread_id=thread_id,
+                    on_page=on_page,
+                    doc_id=file_data.get("doc_id"),
                 )
             except Exception as e:
                 print(f"[parse-error] {file_data.get('file_name')}: {e}")
-                return None
+            if on_file:
+                try:
+                    await on_file(file_data, parsed_data)
+                except Exception as e:
+                    print(f"[on-file-error] {file_data.get('file_name')}: {e}")
 
             if parsed_data is None:
                 print(
@@ -70,18 +80,13 @@ async def process_files(
             parsed_dict["user_id"] = user_id
 
             try:
-                parsed_json = json.dumps(parsed_dict, indent=2, ensure_ascii=False)
-            except Exception as e:
-                print(f"[json-error] Failed to serialize parsed data: {e}")
-                return parsed_data
-
-            try:
-                name, _ = os.path.splitext(file_data.get("file_name", "document"))
-                json_file_path = os.path.join(parsed_dir, f"{name}.json")
-                async with aiofiles.open(json_file_path, "w", encoding="utf-8") as f:
-                    await f.write(parsed_json)
+                await parsed_store.save_document(
+                    user_id, thread_id, parsed_dict, indent=2
+                )
             except Exception as e:
-                print(f"[write-error] Failed to write {json_file_path}: {e}")
+                print(
+                    f"[write-error] Failed to store parsed {file_data.get('file_name')}: {e}"
+                )
 
             return parsed_data
         except Exception as e:
@@ -103,7 +108,8 @@ async def process_files(
             print(f"[batch-error] Failed batch starting at {i}: {e}")
             results = []
         for result in results:
-            if isinstance(result, Exception):
+            # CancelledError is not an Exception; never take it for a document
+            if isinstance(result, BaseException):
                 print(f"[task-exception] {result}")
                 continue
             if result:
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.utils.metrics import increment
+
+# send_batch(images, user_id) -> one text per image, or None if the request failed
+SendBatch = Callable[[List[bytes], Optional[str]], Awaitable[Optional[List[str]]]]
+# send_single(image, user_id) -> text, or None if the request failed
+SendSingle = Callable[[bytes, Optional[str]], Awaitable[Optional[str]]]
+
+
+class VisionBatcher:
+    """
+    Groups the images of one user into multi-image vision requests.
+
+    Images wait until `batch_size` of them are queued for the same user or
+    `timeout` seconds passed since the first one, then go out as one request.
+    When a batch reply can't be split into exactly one result per image, the
+    images of that batch are retried one by one.
+    """
+
+    def __init__(
+        self,
+        send_batch: SendBatch,
+        send_single: SendSingle,
+        batch_size: int,
+        timeout: float,
+    ):
+        self.send_batch = send_batch
+        self.send_single = send_single
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._pending: Dict[str, List[Tuple[bytes, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def parse(self, image_bytes: bytes, user_id: Optional[str]) -> Optional[str]:
+        """Queue an image and wait for its text (None if the vision model failed)."""
+        if self.batch_size <= 1:
+            return await self.send_single(image_bytes, user_id)
+
+        key = user_id or "unknown_user"
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((image_bytes, future))
+
+        if len(pending) >= self.batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.timeout, self._flush, key)
+        return await future
+
+    def _flush(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, user_id: str, batch: List[Tuple[bytes, asyncio.Future]]):
+        images = [image for image, _ in batch]
+        try:
+            texts = None
+            if len(images) > 1:
+                increment("vision_batcher", "batches")
+                texts = await self.send_batch(images, user_id)
+                if texts is not None and len(texts) != len(images):
+                    print(
+                        f"[vision-batch] got {len(texts)} results for {len(images)} images, retrying one by one"
+                    )
+                    increment("vision_batcher", "mismatches")
+                    texts = None
+            if texts is None:
+                texts = await asyncio.gather(
+                    *(self.send_single(image, user_id) for image in images)
+                )
+        except Exception as e:
+            print(f"[vision-batch] failed: {e}")
+            texts = [None] * len(batch)
+
+        increment("vision_batcher", "images", len(batch))
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
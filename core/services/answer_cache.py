@@ -0,0 +1,191 @@
+"""
+Semantic cache of /query answers.
+
+Entries are scoped to (user, thread, mode, use_self_knowledge). An entry is
+reused when the embedding of a new resolved query has cosine similarity
+>= ANSWER_CACHE_SIMILARITY with the cached resolved query. The cache lives in
+each app worker's memory, is LRU bounded (ANSWER_CACHE_MAX_ENTRIES), and
+entries expire after ANSWER_CACHE_TTL_SECONDS.
+
+Invalidation works across workers through a small marker file per thread
+(`data/{user}/threads/{thread}/.answers_version`). bump_thread_version() rewrites
+it whenever the thread's documents or derived data change (uploads,
+mark_extra_done). Entries recorded under an older version are dropped on lookup.
+Callers read the version (current_version) before retrieving anything and pass
+it to store(); an answer whose thread changed while it was being generated is
+not cached.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from core.constants import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from core.utils.metrics import get_metrics, increment, set_value
+
+_entries: "OrderedDict[tuple, dict]" = OrderedDict()  # (scope, resolved_query) -> entry
+_lock = threading.Lock()
+
+
+def _version_path(user_id: str, thread_id: str) -> str:
+    return os.path.join("data", user_id, "threads", thread_id, ".answers_version")
+
+
+def thread_version(user_id: str, thread_id: str) -> str:
+    try:
+        with open(_version_path(user_id, thread_id), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+
+async def current_version(user_id: str, thread_id: str) -> str:
+    """Version of the thread's documents; read it before retrieval starts."""
+    return await asyncio.to_thread(thread_version, user_id, thread_id)
+
+
+def bump_thread_version(user_id: str, thread_id: str):
+    """Invalidate cached answers of a thread in every worker."""
+    path = _version_path(user_id, thread_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+        increment("answer_cache", "invalidations")
+    except Exception as e:
+        print(f"[answer-cache] failed to bump version for thread {thread_id}: {e}")
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _embed(text: str) -> List[float]:
+    from core.embeddings.vectorstore import embedding_function
+
+    return _normalize(embedding_function.embed_query(text))
+
+
+def _update_hit_rate():
+    counters = get_metrics("answer_cache")
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    if lookups:
+        set_value("answer_cache", "hit_rate", counters.get("hits", 0) / lookups)
+
+
+def _scope(user_id: str, thread_id: str, mode: str, use_self_knowledge: bool) -> tuple:
+    return (user_id, thread_id, mode, bool(use_self_knowledge))
+
+
+async def lookup(
+    user_id: str,
+    thread_id: str,
+    mode: str,
+    use_self_knowledge: bool,
+    resolved_query: str,
+    version: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Return the cached response payload for a near-identical resolved query of
+    the same thread and mode, or None. `version` is the thread version read
+    when the query started (read now if not given).
+
+    Returns:
+        dict: {"answer", "sources", "resolved_query", "similarity"} on a hit.
+    """
+    scope = _scope(user_id, thread_id, mode, use_self_knowledge)
+    if version is None:
+        version = await current_version(user_id, thread_id)
+    now = time.time()
+
+    with _lock:
+        candidates = []
+        for key, entry in list(_entries.items()):
+            if key[0] != scope:
+                continue
+            if entry["version"] != version or now - entry["created_at"] > ANSWER_CACHE_TTL_SECONDS:
+                del _entries[key]
+                increment("answer_cache", "expired")
+                continue
+            candidates.append((key, entry))
+
+    if not candidates:
+        increment("answer_cache", "misses")
+        _update_hit_rate()
+        return None
+
+    embedding = await asyncio.to_thread(_embed, resolved_query)
+    best_key, best_entry, best_similarity = None, None, -1.0
+    for key, entry in candidates:
+        similarity = sum(a * b for a, b in zip(embedding, entry["embedding"]))
+        if similarity > best_similarity:
+            best_key, best_entry, best_similarity = key, entry, similarity
+
+    if best_similarity < ANSWER_CACHE_SIMILARITY:
+        increment("answer_cache", "misses")
+        _update_hit_rate()
+        return None
+
+    with _lock:
+        if best_key in _entries:
+            _entries.move_to_end(best_key)
+    increment("answer_cache", "hits")
+    _update_hit_rate()
+    print(
+        f"Answer cache hit ({best_similarity:.3f}) for '{resolved_query}' ~ '{best_entry['resolved_query']}'"
+    )
+    return {
+        "answer": best_entry["answer"],
+        "sources": best_entry["sources"],
+        "resolved_query": best_entry["resolved_query"],
+        "similarity": best_similarity,
+    }
+
+
+async def store(
+    user_id: str,
+    thread_id: str,
+    mode: str,
+    use_self_knowledge: bool,
+    resolved_query: str,
+    answer: str,
+    sources: dict,
+    version: str,
+):
+    """
+    Remember the answer of a resolved query. `version` is the thread version
+    read before retrieval; if the thread changed since, the answer was built
+    without the new documents and is not stored.
+    """
+    if not answer or not resolved_query:
+        return
+    if await current_version(user_id, thread_id) != version:
+        increment("answer_cache", "stale_stores")
+        return
+    embedding = await asyncio.to_thread(_embed, resolved_query)
+    key = (_scope(user_id, thread_id, mode, use_self_knowledge), resolved_query)
+
+    with _lock:
+        _entries[key] = {
+            "resolved_query": resolved_query,
+            "embedding": embedding,
+            "answer": answer,
+            "sources": sources,
+            "version": version,
+            "created_at": time.time(),
+        }
+        _entries.move_to_end(key)
+        while len(_entries) > ANSWER_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            increment("answer_cache", "evictions")
+        set_value("answer_cache", "entries", len(_entries))
+    increment("answer_cache", "stores")
@@ -0,0 +1,145 @@
+"""
+Compact on-disk format of a parsed document (`.docpack`).
+
+    b"DOCPACK1" | header length (uint32, big endian) | header | frames
+
+The header is msgpack and uncompressed:
+
+    {"meta": {id, type, file_name, title, summary, ...},
+     "pages": [[number, offset, length], ...],
+     "full_text": [offset, length] or None}
+
+Offsets are relative to the end of the header. Every page is its own zstd
+frame holding msgpack {"text", "images"}, so a single page can be read
+without decompressing the others. full_text is only stored when it differs
+from the page texts joined with newlines (as it does for markdown). Otherwise
+it is rebuilt from the pages, so the text is not stored twice.
+
+`meta` is what the document had when it was written. Later changes (summary)
+go to the parsed store's index entry, so the body is never rewritten.
+"""
+
+import struct
+from typing import Dict, List, Optional
+
+import msgpack
+import zstandard
+
+from core.constants import DOCPACK_ZSTD_LEVEL
+
+MAGIC = b"DOCPACK1"
+EXTENSION = ".docpack"
+_HEADER_LENGTH = struct.Struct(">I")
+BODY_FIELDS = ("content", "full_text")
+
+
+def _joined_pages(pages: List[dict]) -> str:
+    return "\n".join(page.get("text", "") for page in pages)
+
+
+def pack(document: dict) -> bytes:
+    """Serialize a parsed document (Document.model_dump() plus extra metadata)."""
+    compressor = zstandard.ZstdCompressor(level=DOCPACK_ZSTD_LEVEL)
+    pages = document.get("content") or []
+    frames = []
+    page_table = []
+    offset = 0
+    for page in pages:
+        frame = compressor.compress(
+            msgpack.packb(
+                {"text": page.get("text", ""), "images": page.get("images") or []}
+            )
+        )
+        page_table.append([page.get("number"), offset, len(frame)])
+        frames.append(frame)
+        offset += len(frame)
+
+    full_text = document.get("full_text") or ""
+    full_text_location = None
+    if full_text != _joined_pages(pages):
+        frame = compressor.compress(full_text.encode("utf-8"))
+        full_text_location = [offset, len(frame)]
+        frames.append(frame)
+
+    header = msgpack.packb(
+        {
+            "meta": {k: v for k, v in document.items() if k not in BODY_FIELDS},
+            "pages": page_table,
+            "full_text": full_text_location,
+        }
+    )
+    return b"".join([MAGIC, _HEADER_LENGTH.pack(len(header)), header, *frames])
+
+
+class DocPackReader:
+    """Reads the header on open; pages and full_text are decompressed on demand."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            if self._file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a docpack file")
+            (header_length,) = _HEADER_LENGTH.unpack(
+                self._file.read(_HEADER_LENGTH.size)
+            )
+            header = msgpack.unpackb(self._file.read(header_length))
+        except Exception:
+            self._file.close()
+            raise
+        self._body_start = len(MAGIC) + _HEADER_LENGTH.size + header_length
+        self._decompressor = zstandard.ZstdDecompressor()
+        self.meta: Dict = header["meta"]
+        self._page_table = header["pages"]
+        self._pages = {}
+        for number, offset, length in self._page_table:
+            self._pages.setdefault(number, (offset, length))
+        self._full_text = header["full_text"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _frame(self, offset: int, length: int) -> bytes:
+        self._file.seek(self._body_start + offset)
+        return self._decompressor.decompress(self._file.read(length))
+
+    def _page(self, number: int, offset: int, length: int) -> dict:
+        return {"number": number, **msgpack.unpackb(self._frame(offset, length))}
+
+    @property
+    def page_numbers(self) -> List[int]:
+        return [number for number, _, _ in self._page_table]
+
+    def page(self, number: int) -> Optional[dict]:
+        """One page as {"number", "text", "images"}, or None."""
+        location = self._pages.get(number)
+        if location is None:
+            return None
+        return self._page(number, *location)
+
+    def pages(self) -> List[dict]:
+        return [self._page(*row) for row in self._page_table]
+
+    def full_text(self) -> str:
+        if self._full_text is not None:
+            return self._frame(*self._full_text).decode("utf-8")
+        return _joined_pages(self.pages())
+
+    def to_dict(self, with_pages: bool = True) -> dict:
+        """The document in its Document.model_dump() shape (content=[] unless with_pages)."""
+        pages = self.pages() if with_pages or self._full_text is None else []
+        full_text = (
+            self._frame(*self._full_text).decode("utf-8")
+            if self._full_text is not None
+            else _joined_pages(pages)
+        )
+        return {
+            **self.meta,
+            "content": pages if with_pages else [],
+            "full_text": full_text,
+        }
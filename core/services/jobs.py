@@ -0,0 +1,356 @@
+"""
+Background upload jobs persisted in the `jobs` Mongo collection.
+
+A job is created once the uploaded files are saved to disk. It then runs
+outside the HTTP request through these stages:
+    queued -> parsing (pages are indexed while parsing) -> saving -> done
+Per-file status and errors are stored in the job and every change is pushed to
+the user's `{user_id}/progress` socket channel. A file also fails when some of
+its chunks could not be embedded or stored. Chunks of a failed file that were
+already indexed are deleted again, so they are never retrieved.
+
+The worker running a job refreshes `heartbeatAt`. Every worker runs
+job_watchdog(), which claims jobs whose heartbeat is older than
+JOB_LEASE_SECONDS, e.g. after a restart, and runs them again. Document ids are
+fixed when the job is created, so re-running a job overwrites the same Chroma
+chunks instead of duplicating them.
+"""
+
+import asyncio
+import datetime
+import os
+import socket
+import traceback
+import uuid
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
+from app.socket_handler import sio
+from core.constants import (
+    JOB_HEARTBEAT_SECONDS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+)
+from core.database import async_db
+from core.embeddings.ingestion import IngestionPipeline
+from core.embeddings.vectorstore import delete_document_vectors
+from core.services import thread_store
+from core.services.answer_cache import bump_thread_version
+from core.models.document import Documents
+from core.parsers.process_files import process_files
+from core.studio_features.summarizer import summarize_documents
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Keeps running job tasks referenced until they finish
+_running_tasks = set()
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+async def create_upload_job(user_id: str, thread_id: str, files_data: List[dict]) -> dict:
+    """
+    Persist a new upload job for files already saved by upload_files.
+
+    Args:
+        files_data (List[dict]): {"title", "file_name", "path"} per uploaded file.
+
+    Returns:
+        dict: The job document.
+    """
+    now = _now()
+    job = {
+        "jobId": str(uuid.uuid4()),
+        "type": "upload",
+        "userId": user_id,
+        "threadId": thread_id,
+        "status": QUEUED,
+        "stage": QUEUED,
+        "files": [
+            {
+                **file_data,
+                "doc_id": str(uuid.uuid4())[:5],
+                "status": "pending",
+                "error": None,
+            }
+            for file_data in files_data
+        ],
+        "documents": [],
+        "errors": [],
+        "attempts": 1,
+        "owner": WORKER_ID,
+        "createdAt": now,
+        "updatedAt": now,
+        "heartbeatAt": now,
+    }
+    await async_db.jobs.insert_one(job)
+    job.pop("_id", None)
+    return job
+
+
+async def get_job(job_id: str, user_id: str) -> Optional[dict]:
+    return await async_db.jobs.find_one(
+        {"jobId": job_id, "userId": user_id}, {"_id": 0, "owner": 0}
+    )
+
+
+def job_summary(job: dict) -> dict:
+    """Compact job state sent over the progress socket channel."""
+    files = job.get("files", [])
+    return {
+        "job_id": job["jobId"],
+        "thread_id": job["threadId"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "files_total": len(files),
+        "files_done": sum(1 for f in files if f["status"] in ("parsed", "added")),
+        "files_failed": sum(1 for f in files if f["status"] == "failed"),
+        "error": job.get("error"),
+    }
+
+
+async def _update_job(job_id: str, message: str = None, **fields) -> Optional[dict]:
+    fields["updatedAt"] = _now()
+    job = await async_db.jobs.find_one_and_update(
+        {"jobId": job_id},
+        {"$set": fields},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        await _emit(job, message)
+    return job
+
+
+async def _emit(job: dict, message: str = None):
+    payload = {"message": message or f"Upload job {job['stage']}", "job": job_summary(job)}
+    try:
+        await sio.emit(f"{job['userId']}/progress", payload)
+    except Exception as e:
+        print(f"[emit-error] job={job['jobId']} err={e}")
+
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        # A missed beat must not end the loop, or the job's lease expires while it runs
+        try:
+            await async_db.jobs.update_one(
+                {"jobId": job_id, "owner": WORKER_ID}, {"$set": {"heartbeatAt": _now()}}
+            )
+        except Exception as e:
+            print(f"[job-heartbeat] job={job_id} err={e}")
+
+
+async def _discard_chunks(user_id: str, thread_id: str, doc_ids: List[str]):
+    """Delete the indexed chunks of files that never became thread documents."""
+    if doc_ids:
+        print(f"Discarding indexed chunks of failed documents {doc_ids}")
+        await asyncio.to_thread(delete_document_vectors, user_id, thread_id, doc_ids)
+
+
+async def run_upload_job(job_id: str) -> dict:
+    """
+    Run (or resume) an upload job: parse and index the files that are not
+    added yet, add the documents to the thread and start summarization.
+
+    Returns:
+        dict: The upload response, same shape POST /upload/ returned before jobs.
+    """
+    job = await async_db.jobs.find_one({"jobId": job_id}, {"_id": 0})
+    if not job:
+        return {"error": "Job not found"}
+
+    user_id, thread_id = job["userId"], job["threadId"]
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        pending = [f for f in job["files"] if f["status"] != "added"]
+        await _update_job(
+            job_id, "Parsing documents", status=RUNNING, stage="parsing", error=None
+        )
+
+        async def on_file(file_data: dict, document):
+            status = "parsed" if document else "failed"
+            error = None if document else "Failed to parse file"
+            await async_db.jobs.update_one(
+                {"jobId": job_id, "files.doc_id": file_data["doc_id"]},
+                {"$set": {"files.$.status": status, "files.$.error": error}},
+            )
+            await _update_job(
+                job_id,
+                f"{'Processed' if document else 'Failed to process'} {file_data.get('title')}",
+            )
+
+        # Pages are chunked, embedded and upserted while the other files are still parsing
+        ingestion = IngestionPipeline(user_id, thread_id)
+        await ingestion.start()
+        try:
+            parsed_data: Documents = await process_files(
+                pending, user_id, thread_id, on_page=ingestion.add_page, on_file=on_file
+            )
+        finally:
+            await ingestion.finish()
+        if ingestion.errors:
+            await async_db.jobs.update_one(
+                {"jobId": job_id}, {"$push": {"errors": {"$each": ingestion.errors}}}
+            )
+
+        # Files whose chunks could not all be embedded/stored fail like unparsable ones
+        if ingestion.failed_documents:
+            for file_data in pending:
+                if file_data["doc_id"] in ingestion.failed_documents:
+                    await async_db.jobs.update_one(
+                        {"jobId": job_id, "files.doc_id": file_data["doc_id"]},
+                        {
+                            "$set": {
+                                "files.$.status": "failed",
+                                "files.$.error": "Failed to index file",
+                            }
+                        },
+                    )
+            parsed_data.documents = [
+                doc
+                for doc in parsed_data.documents
+                if doc.id not in ingestion.failed_documents
+            ]
+
+        # Pages of files that failed later on were already indexed; never let them be retrieved
+        parsed_ids = {doc.id for doc in parsed_data.documents}
+        await _discard_chunks(
+            user_id,
+            thread_id,
+            [f["doc_id"] for f in pending if f["doc_id"] not in parsed_ids],
+        )
+
+        asyncio.create_task(summarize_documents(parsed_data.model_copy()))
+
+        job = await _update_job(job_id, "Saving documents", stage="saving")
+        documents_to_add = [
+            {
+                "docId": doc.id,
+                "title": doc.title,
+                "type": doc.type,
+                "time_uploaded": job["createdAt"],
+                "file_name": doc.file_name,
+            }
+            for doc in parsed_data.documents
+        ]
+        if documents_to_add:
+            # Add document objects to the thread
+            await thread_store.add_documents(user_id, thread_id, documents_to_add)
+            added_ids = [doc["docId"] for doc in documents_to_add]
+            await async_db.jobs.update_one(
+                {"jobId": job_id},
+                {
+                    "$set": {"files.$[f].status": "added"},
+                    "$push": {"documents": {"$each": documents_to_add}},
+                },
+                array_filters=[{"f.doc_id": {"$in": added_ids}}],
+            )
+            # Cached answers of the thread were given without these documents
+            bump_thread_version(user_id, thread_id)
+
+        job = await async_db.jobs.find_one({"jobId": job_id}, {"_id": 0})
+        if not job["documents"]:
+            await _update_job(
+                job_id,
+                "No documents could be processed successfully",
+                status=FAILED,
+                stage="done",
+                error="No documents could be processed successfully",
+            )
+            return {"error": "No documents could be processed successfully"}
+
+        await _update_job(
+            job_id, "Files uploaded and processed", status=COMPLETED, stage="done"
+        )
+        return {
+            "status": "success",
+            "message": "Files uploaded and processed",
+            "thread_id": thread_id,
+            "job_id": job_id,
+            "documents": job["documents"],
+        }
+    except Exception as e:
+        traceback.print_exc()
+        job = await async_db.jobs.find_one({"jobId": job_id}, {"_id": 0, "files": 1})
+        await _discard_chunks(
+            user_id,
+            thread_id,
+            [f["doc_id"] for f in (job or {}).get("files", []) if f["status"] != "added"],
+        )
+        await _update_job(
+            job_id, f"Upload failed: {e}", status=FAILED, stage="done", error=str(e)
+        )
+        return {"error": f"Upload failed: {e}"}
+    finally:
+        heartbeat.cancel()
+
+
+def start_job(job_id: str) -> asyncio.Task:
+    """Run a job in the background of this worker."""
+    task = asyncio.create_task(run_upload_job(job_id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return task
+
+
+async def _claim_stale_job() -> Optional[dict]:
+    """Atomically take over one job whose worker stopped sending heartbeats."""
+    now = _now()
+    return await async_db.jobs.find_one_and_update(
+        {
+            "status": {"$in": [QUEUED, RUNNING]},
+            "heartbeatAt": {"$lt": now - datetime.timedelta(seconds=JOB_LEASE_SECONDS)},
+            "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+        },
+        {
+            "$set": {"owner": WORKER_ID, "heartbeatAt": now, "updatedAt": now},
+            "$inc": {"attempts": 1},
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _fail_exhausted_jobs():
+    stale = _now() - datetime.timedelta(seconds=JOB_LEASE_SECONDS)
+    async for job in async_db.jobs.find(
+        {
+            "status": {"$in": [QUEUED, RUNNING]},
+            "heartbeatAt": {"$lt": stale},
+            "attempts": {"$gte": JOB_MAX_ATTEMPTS},
+        },
+        {"jobId": 1},
+    ):
+        await _update_job(
+            job["jobId"],
+            "Upload failed after several attempts",
+            status=FAILED,
+            stage="done",
+            error="Job was interrupted too many times",
+        )
+
+
+async def job_watchdog():
+    """Resume jobs abandoned by a stopped worker; runs for the app's lifetime."""
+    while True:
+        try:
+            await _fail_exhausted_jobs()
+            while job := await _claim_stale_job():
+                print(f"Resuming job {job['jobId']} (attempt {job['attempts']})")
+                await _emit(job, "Resuming interrupted upload")
+                start_job(job["jobId"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[job-watchdog] {e}")
+        await asyncio.sleep(JOB_LEASE_SECONDS)
@@ -0,0 +1,58 @@
+"""
+Move every user's embedded threads (`users.threads`) into the normalized
+`threads`, `thread_documents` and `chat_messages` collections.
+
+Users are also migrated lazily on first access, so running this is optional.
+It is safe to run while the app is up, and it can be re-run:
+
+    python -m core.services.migrate_threads [--user USER_ID]
+"""
+
+import argparse
+import asyncio
+
+from core.database import db, init_collections
+from core.services.thread_store import migrate_user
+
+
+async def _migrate_users(user_ids) -> int:
+    migrated = 0
+    for user_id in user_ids:
+        try:
+            migrated += await migrate_user(user_id)
+        except Exception as e:
+            print(f"Failed to migrate user {user_id}: {e}")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split embedded threads out of the user documents."
+    )
+    parser.add_argument("--user", help="Only migrate this user id")
+    args = parser.parse_args()
+
+    init_collections()
+    if args.user:
+        user_ids = [args.user]
+    else:
+        user_ids = [
+            user["userId"]
+            for user in db.users.find(
+                {
+                    "$or": [
+                        {"threads": {"$exists": True, "$ne": {}}},
+                        # left behind by a worker that died mid-migration
+                        {"threads_migration": {"$exists": True}},
+                    ]
+                },
+                {"userId": 1},
+            )
+        ]
+
+    migrated = asyncio.run(_migrate_users(user_ids))
+    print(f"Migrated {migrated} threads of {len(user_ids)} users")
+
+
+if __name__ == "__main__":
+    main()
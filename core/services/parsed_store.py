@@ -0,0 +1,335 @@
+"""
+Parsed documents of a thread, looked up by document id.
+
+Each parsed document is stored in full at
+`data/{user}/threads/{thread}/parsed/{doc id}.docpack`, a compressed
+format whose pages load lazily (see core/services/docpack.py). With
+PARSED_DOCUMENT_FORMAT = "json", or without msgpack/zstandard installed, it
+is stored as `{doc id}.json` instead, the original format. Both formats
+are always readable. Bodies are named by document id, so two uploads with the
+same file stem (a re-uploaded report.pdf, report.pdf next to report.docx)
+never share a file; documents parsed earlier keep their `{file stem}.json`
+body, which their index entry points to.
+
+A small index entry is stored next to it at `parsed/_index/{doc_id}.json`:
+
+    {"id", "type", "file_name", "title", "summary", "path"}
+
+Lookups by id, titles and summaries are read from the index entries. The full
+document (full_text and pages) is only read when a caller needs it. Metadata
+updates (update_metadata) only rewrite the index entry, and its fields take
+precedence over the ones stored in the document body. Threads parsed before
+the index existed get their index built on first access, with one scan of
+parsed/.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import aiofiles
+
+from core.constants import PARSED_DOCUMENT_FORMAT
+
+try:
+    from core.services import docpack
+except ImportError:  # msgpack / zstandard not installed
+    docpack = None
+
+if PARSED_DOCUMENT_FORMAT == "docpack" and docpack is None:
+    print("msgpack/zstandard not installed, storing parsed documents as JSON")
+
+INDEX_DIR = "_index"
+INDEX_FIELDS = ("id", "type", "file_name", "title", "summary")
+
+_index_locks: Dict[tuple, asyncio.Lock] = {}
+
+
+def parsed_dir(user_id: str, thread_id: str) -> str:
+    return os.path.join("data", user_id, "threads", thread_id, "parsed")
+
+
+def _index_dir(user_id: str, thread_id: str) -> str:
+    return os.path.join(parsed_dir(user_id, thread_id), INDEX_DIR)
+
+
+def document_file_name(document_id: str, extension: str = ".json") -> str:
+    """Name of the body file of a parsed document."""
+    # Ids are generated server-side, but never let one point outside parsed/
+    if not document_id or os.path.basename(document_id) != document_id:
+        raise ValueError(f"Invalid document id: {document_id!r}")
+    return f"{document_id}{extension}"
+
+
+def _use_docpack() -> bool:
+    return PARSED_DOCUMENT_FORMAT == "docpack" and docpack is not None
+
+
+async def _read_json(path: str) -> Optional[dict]:
+    try:
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            content = await f.read()
+        data = json.loads(content)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _write_json(path: str, data: dict, indent: Optional[int] = None):
+    # Write then rename, so readers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+        await f.write(json.dumps(data, indent=indent, ensure_ascii=False))
+    os.replace(tmp_path, path)
+
+
+def _write_docpack(path: str, document: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(docpack.pack(document))
+    os.replace(tmp_path, path)
+
+
+def _read_docpack(path: str, with_pages: bool) -> Optional[dict]:
+    try:
+        with docpack.DocPackReader(path) as reader:
+            return reader.to_dict(with_pages=with_pages)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Failed to read {path}: {e}")
+        return None
+
+
+def _read_docpack_meta(path: str) -> Optional[dict]:
+    with docpack.DocPackReader(path) as reader:
+        return reader.meta
+
+
+async def _read_body(
+    user_id: str, thread_id: str, entry: dict, with_pages: bool = True
+) -> Optional[dict]:
+    """Full document of an index entry, with the entry's metadata applied."""
+    path = os.path.join(parsed_dir(user_id, thread_id), entry["path"])
+    if path.endswith(".docpack"):
+        if docpack is None:
+            print(f"Cannot read {path}: msgpack/zstandard not installed")
+            return None
+        document = await asyncio.to_thread(_read_docpack, path, with_pages)
+    else:
+        document = await _read_json(path)
+        if document and not with_pages:
+            document["content"] = []
+    if document:
+        document.update({field: entry.get(field) for field in INDEX_FIELDS})
+    return document
+
+
+def _index_entry(document: dict, file_name: str) -> dict:
+    entry = {field: document.get(field) for field in INDEX_FIELDS}
+    entry["path"] = file_name
+    return entry
+
+
+async def save_document(
+    user_id: str, thread_id: str, document: dict, indent: Optional[int] = None
+):
+    """
+    Write a parsed document (Document.model_dump() plus thread/user ids) and
+    its index entry. `indent` only applies to the JSON format.
+    """
+    await _ensure_index(user_id, thread_id)
+    directory = parsed_dir(user_id, thread_id)
+    os.makedirs(os.path.join(directory, INDEX_DIR), exist_ok=True)
+    previous = await get_entry(user_id, thread_id, document["id"])
+
+    if _use_docpack():
+        file_name = document_file_name(document["id"], docpack.EXTENSION)
+        await asyncio.to_thread(
+            _write_docpack, os.path.join(directory, file_name), document
+        )
+    else:
+        file_name = document_file_name(document["id"])
+        await _write_json(os.path.join(directory, file_name), document, indent=indent)
+    await _write_json(
+        os.path.join(directory, INDEX_DIR, f"{document['id']}.json"),
+        _index_entry(document, file_name),
+    )
+
+    # A re-parsed document (same id) leaves its old body behind if it was in
+    # another format or named after the file. Bodies named after the file may
+    # be shared with another id's entry, so they are only removed if unshared.
+    old_path = previous.get("path") if previous else None
+    if old_path and old_path != file_name:
+        shared = any(
+            entry.get("path") == old_path and entry.get("id") != document["id"]
+            for entry in await list_entries(user_id, thread_id)
+        )
+        if not shared:
+            try:
+                os.remove(os.path.join(directory, os.path.basename(old_path)))
+            except FileNotFoundError:
+                pass
+
+
+async def update_metadata(
+    user_id: str, thread_id: str, document_id: str, **fields
+) -> bool:
+    """
+    Update index fields (title, summary, ...) of a stored document without
+    rewriting its body. Returns False if the document is not in the store.
+    """
+    entry = await get_entry(user_id, thread_id, document_id)
+    if not entry:
+        return False
+    entry.update({k: v for k, v in fields.items() if k in INDEX_FIELDS})
+    await _write_json(
+        os.path.join(_index_dir(user_id, thread_id), f"{document_id}.json"), entry
+    )
+    return True
+
+
+async def _ensure_index(user_id: str, thread_id: str):
+    """Build the index of a thread parsed before it existed (one scan of parsed/)."""
+    directory = parsed_dir(user_id, thread_id)
+    if os.path.isdir(os.path.join(directory, INDEX_DIR)) or not os.path.isdir(
+        directory
+    ):
+        return
+
+    lock = _index_locks.setdefault((user_id, thread_id), asyncio.Lock())
+    async with lock:
+        if os.path.isdir(os.path.join(directory, INDEX_DIR)):
+            return
+        entries = []
+        for file_name in os.listdir(directory):
+            path = os.path.join(directory, file_name)
+            if file_name.endswith(".json"):
+                document = await _read_json(path)
+            elif file_name.endswith(".docpack") and docpack is not None:
+                document = await asyncio.to_thread(_read_docpack_meta, path)
+            else:
+                continue
+            if document and document.get("id"):
+                entries.append(_index_entry(document, file_name))
+
+        # Fill a temporary directory and rename it, so a crash never leaves a partial index
+        tmp_dir = os.path.join(directory, f"{INDEX_DIR}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        for entry in entries:
+            await _write_json(os.path.join(tmp_dir, f"{entry['id']}.json"), entry)
+        try:
+            os.rename(tmp_dir, os.path.join(directory, INDEX_DIR))
+        except OSError:
+            # Another worker built it first
+            for file_name in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, file_name))
+            os.rmdir(tmp_dir)
+        print(f"Indexed {len(entries)} parsed documents of thread {thread_id}")
+
+
+async def get_entry(user_id: str, thread_id: str, document_id: str) -> Optional[dict]:
+    """Index entry (id, type, file_name, title, summary) of a document, or None."""
+    # Ids come from request bodies; never let one point outside the index
+    if not document_id or os.path.basename(document_id) != document_id:
+        return None
+    await _ensure_index(user_id, thread_id)
+    return await _read_json(
+        os.path.join(_index_dir(user_id, thread_id), f"{document_id}.json")
+    )
+
+
+async def list_entries(user_id: str, thread_id: str) -> List[dict]:
+    """Index entries of every parsed document of a thread."""
+    await _ensure_index(user_id, thread_id)
+    directory = _index_dir(user_id, thread_id)
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".json"):
+            entry = await _read_json(os.path.join(directory, file_name))
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+async def get_field(
+    user_id: str, thread_id: str, document_id: str, field: str
+) -> Optional[Any]:
+    """One field of a document, read from the index entry when it has it."""
+    if field in INDEX_FIELDS:
+        entry = await get_entry(user_id, thread_id, document_id)
+        return entry.get(field) if entry else None
+    document = await load_document(
+        user_id, thread_id, document_id, with_pages=field == "content"
+    )
+    return document.get(field) if document else None
+
+
+async def load_document(
+    user_id: str, thread_id: str, document_id: str, with_pages: bool = True
+) -> Optional[dict]:
+    """
+    The full parsed document, or None. with_pages=False leaves `content`
+    empty, so only full_text is decoded where the format allows it.
+    """
+    entry = await get_entry(user_id, thread_id, document_id)
+    if not entry:
+        return None
+    return await _read_body(user_id, thread_id, entry, with_pages)
+
+
+async def load_pages(
+    user_id: str,
+    thread_id: str,
+    document_id: str,
+    numbers: Optional[List[int]] = None,
+) -> List[dict]:
+    """Some pages of a document (all if `numbers` is None), decoding only those."""
+    entry = await get_entry(user_id, thread_id, document_id)
+    if not entry:
+        return []
+    path = os.path.join(parsed_dir(user_id, thread_id), entry["path"])
+    if path.endswith(".docpack") and docpack is not None:
+
+        def read():
+            with docpack.DocPackReader(path) as reader:
+                if numbers is None:
+                    return reader.pages()
+                return [page for page in map(reader.page, numbers) if page]
+
+        return await asyncio.to_thread(read)
+
+    document = await _read_body(user_id, thread_id, entry) or {}
+    pages = document.get("content", [])
+    if numbers is None:
+        return pages
+    return [page for page in pages if page.get("number") in numbers]
+
+
+async def load_documents(
+    user_id: str,
+    thread_id: str,
+    document_ids: Optional[List[str]] = None,
+    with_pages: bool = True,
+) -> List[dict]:
+    """Full parsed documents of a thread (all of them, or only `document_ids`)."""
+    if document_ids is None:
+        entries = await list_entries(user_id, thread_id)
+    else:
+        entries = [
+            entry
+            for entry in [
+                await get_entry(user_id, thread_id, document_id)
+                for document_id in dict.fromkeys(document_ids)
+            ]
+            if entry
+        ]
+    documents = []
+    for entry in entries:
+        document = await _read_body(user_id, thread_id, entry, with_pages)
+        if document:
+            documents.append(document)
+    return documents
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import re
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+# Sentinel pushed on the queue once the query is finished
+_CLOSE = object()
+
+_streams: Dict[str, "QueryStream"] = {}
+
+
+class QueryStream:
+    """
+    Event channel of one streamed /query request.
+
+    Producers (query route, agent nodes, invoke_llm) push events; the SSE
+    response drains them in order. Events:
+        status       - pipeline progress, e.g. {"stage": "retrieval_done", ...}
+        answer_reset - a new answer generation started, drop the tokens so far
+        token        - {"text": ...} piece of the answer being generated
+        sources      - documents/web sources used for the answer
+        done         - final response (same body as POST /query)
+        error        - {"error": ...}
+    """
+
+    def __init__(self, stream_id: str):
+        self.stream_id = stream_id
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    async def emit(self, event: str, data: dict):
+        if not self.closed:
+            await self._queue.put((event, data))
+
+    async def status(self, stage: str, **data):
+        await self.emit("status", {"stage": stage, **data})
+
+    async def token(self, text: str):
+        if text:
+            await self.emit("token", {"text": text})
+
+    async def reset_answer(self):
+        await self.emit("answer_reset", {})
+
+    async def close(self):
+        if not self.closed:
+            await self._queue.put(_CLOSE)
+            self.closed = True
+
+    async def sse(self) -> AsyncIterator[str]:
+        """Yield queued events formatted as server-sent events until closed."""
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _CLOSE:
+                    break
+                event, data = item
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                yield f"event: {event}\ndata: {payload}\n\n"
+        finally:
+            remove_stream(self.stream_id)
+
+
+def create_stream() -> QueryStream:
+    stream_id = uuid.uuid4().hex
+    stream = QueryStream(stream_id)
+    _streams[stream_id] = stream
+    return stream
+
+
+def get_stream(stream_id: Optional[str]) -> Optional[QueryStream]:
+    if not stream_id:
+        return None
+    return _streams.get(stream_id)
+
+
+def remove_stream(stream_id: str):
+    _streams.pop(stream_id, None)
+
+
+_ANSWER_KEY = re.compile(r'"answer"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerFieldExtractor:
+    """
+    Incrementally pulls the value of the "answer" string field out of the raw
+    JSON an LLM is generating, so it can be shown before the JSON is complete.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = None  # index of the next unread char of the answer value
+        self.finished = False
+
+    def feed(self, chunk: str) -> str:
+        """Add raw model output and return the newly decoded answer text."""
+        if self.finished:
+            return ""
+        self._buffer += chunk
+
+        if self._position is None:
+            match = _ANSWER_KEY.search(self._buffer)
+            if not match:
+                return ""
+            self._position = match.end()
+
+        out = []
+        i = self._position
+        buffer = self._buffer
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.finished = True
+                i += 1
+                break
+            if char == "\\":
+                if i + 1 >= len(buffer):
+                    break  # wait for the rest of the escape sequence
+                code = buffer[i + 1]
+                if code == "u":
+                    if i + 6 > len(buffer):
+                        break
+                    try:
+                        out.append(chr(int(buffer[i + 2 : i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+                continue
+            out.append(char)
+            i += 1
+
+        self._position = i
+        return "".join(out)
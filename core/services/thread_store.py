@@ -0,0 +1,377 @@
+"""
+Data access for threads, their documents and chat messages.
+
+Threads used to be embedded in the user document (`users.threads.{id}` with
+`documents` and `chats` arrays), so every request read and rewrote the whole
+user. They now live in three collections:
+
+    threads:          one per thread   {userId, threadId, thread_name, createdAt,
+                                        updatedAt, extra_done, mindmap_enabled, chat_seq}
+    thread_documents: one per document {userId, threadId, docId, title, type,
+                                        file_name, time_uploaded}
+    chat_messages:    one per message  {userId, threadId, seq, type, content,
+                                        timestamp, sources}
+
+All functions are coroutines on the async Mongo client (core.database.async_db).
+They return threads in the old embedded shape ({thread_name, documents,
+chats, ...}), so API responses don't change; only the thread list carries a
+`chat_count` instead of the chats. Users still on the embedded layout
+are migrated the first time one of their threads is accessed (see
+migrate_user, or run `python -m core.services.migrate_threads` to migrate
+everyone at once).
+"""
+
+import asyncio
+import datetime
+import time
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne, timeout
+
+from core.database import async_db
+
+MIGRATION_TIMEOUT_SECONDS = 120
+MIGRATION_POLL_SECONDS = 0.5
+
+# Users already on the normalized layout (checked once per process)
+_migrated_users = set()
+
+_THREAD_FIELDS = {"_id": 0, "userId": 0, "threadId": 0, "chat_seq": 0}
+_CHILD_FIELDS = {"_id": 0, "userId": 0, "threadId": 0}
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+async def _claim_migration(user_id: str) -> Optional[dict]:
+    """
+    Atomically take the embedded threads of a user for migration, so only one
+    worker migrates them. They are moved to `threads_migration` until copied;
+    a claim older than MIGRATION_TIMEOUT_SECONDS (crashed worker) is taken over.
+    """
+    now = _now()
+    user = await async_db.users.find_one_and_update(
+        {
+            "userId": user_id,
+            "threads": {"$exists": True, "$ne": {}},
+            "threads_migration": {"$exists": False},
+        },
+        {"$rename": {"threads": "threads_migration"}, "$set": {"threads_migration_at": now}},
+        projection={"threads_migration": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user:
+        return user
+    stale = now - datetime.timedelta(seconds=MIGRATION_TIMEOUT_SECONDS)
+    return await async_db.users.find_one_and_update(
+        {
+            "userId": user_id,
+            "threads_migration": {"$exists": True},
+            "threads_migration_at": {"$lt": stale},
+        },
+        {"$set": {"threads_migration_at": now}},
+        projection={"threads_migration": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _wait_for_migration(user_id: str):
+    """Wait while another worker migrates the user (or its claim goes stale)."""
+    deadline = time.monotonic() + MIGRATION_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if not await async_db.users.find_one(
+            {"userId": user_id, "threads_migration": {"$exists": True}}, {"_id": 1}
+        ):
+            return
+        await asyncio.sleep(MIGRATION_POLL_SECONDS)
+
+
+async def migrate_user(user_id: str) -> int:
+    """
+    Move the embedded threads of a user into the normalized collections.
+    Idempotent: every write is an upsert, and the embedded threads are only
+    cleared afterwards. Safe to run from several workers at once: one claims
+    the user, the others wait for it to finish.
+
+    Returns:
+        int: Number of threads migrated (0 if another worker did it).
+    """
+    # Copying a large user takes longer than the default per-operation timeout
+    with timeout(MIGRATION_TIMEOUT_SECONDS):
+        user = await _claim_migration(user_id)
+        if not user:
+            await _wait_for_migration(user_id)
+            return 0
+
+        threads = user.get("threads_migration") or {}
+        for thread_id, thread in threads.items():
+            chats = thread.get("chats", [])
+            thread_fields = {
+                key: value
+                for key, value in thread.items()
+                if key not in ("documents", "chats")
+            }
+            await async_db.threads.update_one(
+                {"userId": user_id, "threadId": thread_id},
+                # $max: messages appended meanwhile already advanced chat_seq
+                {"$set": thread_fields, "$max": {"chat_seq": len(chats)}},
+                upsert=True,
+            )
+
+            document_writes = [
+                UpdateOne(
+                    {"userId": user_id, "threadId": thread_id, "docId": document["docId"]},
+                    {"$set": document},
+                    upsert=True,
+                )
+                for document in thread.get("documents", [])
+            ]
+            if document_writes:
+                await async_db.thread_documents.bulk_write(document_writes, ordered=False)
+
+            chat_writes = [
+                UpdateOne(
+                    {"userId": user_id, "threadId": thread_id, "seq": seq},
+                    {"$set": message},
+                    upsert=True,
+                )
+                for seq, message in enumerate(chats)
+            ]
+            if chat_writes:
+                await async_db.chat_messages.bulk_write(chat_writes, ordered=False)
+
+        await async_db.users.update_one(
+            {"userId": user_id},
+            {
+                "$set": {"threads": {}},
+                "$unset": {"threads_migration": "", "threads_migration_at": ""},
+            },
+        )
+
+    print(f"Migrated {len(threads)} threads of user {user_id} to the normalized layout")
+    return len(threads)
+
+
+async def _ensure_migrated(user_id: str):
+    if user_id in _migrated_users:
+        return
+    await migrate_user(user_id)
+    _migrated_users.add(user_id)
+
+
+async def get_user(user_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+    """The user document without password (and without the legacy threads fields)."""
+    projection = projection or {
+        "_id": 0,
+        "password": 0,
+        "threads": 0,
+        "threads_migration": 0,
+        "threads_migration_at": 0,
+    }
+    return await async_db.users.find_one({"userId": user_id}, projection)
+
+
+async def thread_exists(user_id: str, thread_id: str) -> bool:
+    await _ensure_migrated(user_id)
+    return (
+        await async_db.threads.find_one({"userId": user_id, "threadId": thread_id}, {"_id": 1})
+        is not None
+    )
+
+
+async def get_thread(
+    user_id: str,
+    thread_id: str,
+    with_documents: bool = True,
+    with_chats: bool = True,
+) -> Optional[dict]:
+    """Return one thread in the embedded shape, or None if it doesn't exist."""
+    await _ensure_migrated(user_id)
+    thread = await async_db.threads.find_one(
+        {"userId": user_id, "threadId": thread_id}, _THREAD_FIELDS
+    )
+    if thread is None:
+        return None
+    thread["documents"] = (
+        await get_thread_documents(user_id, thread_id) if with_documents else []
+    )
+    thread["chats"] = await get_chat_messages(user_id, thread_id) if with_chats else []
+    return thread
+
+
+async def list_threads(user_id: str) -> Dict[str, dict]:
+    """
+    Return {thread_id: thread} of a user, oldest first: thread metadata, its
+    documents and a `chat_count`. Chats themselves are loaded per thread
+    through get_thread, the list only needs their number.
+    """
+    await _ensure_migrated(user_id)
+    threads = {}
+    async for thread in async_db.threads.find({"userId": user_id}, {"_id": 0, "chat_seq": 0}).sort(
+        "createdAt", ASCENDING
+    ):
+        thread_id = thread.pop("threadId")
+        thread.pop("userId", None)
+        thread["documents"] = []
+        thread["chat_count"] = 0
+        threads[thread_id] = thread
+
+    async for document in async_db.thread_documents.find(
+        {"userId": user_id}, {"_id": 0, "userId": 0}
+    ).sort("time_uploaded", ASCENDING):
+        thread = threads.get(document.pop("threadId"))
+        if thread is not None:
+            thread["documents"].append(document)
+
+    async for group in await async_db.chat_messages.aggregate(
+        [
+            {"$match": {"userId": user_id}},
+            {"$group": {"_id": "$threadId", "count": {"$sum": 1}}},
+        ]
+    ):
+        thread = threads.get(group["_id"])
+        if thread is not None:
+            thread["chat_count"] = group["count"]
+    return threads
+
+
+async def create_thread(
+    user_id: str,
+    thread_id: str,
+    thread_name: str,
+    mindmap_enabled: bool = False,
+    now: Optional[datetime.datetime] = None,
+):
+    await _ensure_migrated(user_id)
+    now = now or _now()
+    await async_db.threads.insert_one(
+        {
+            "userId": user_id,
+            "threadId": thread_id,
+            "thread_name": thread_name,
+            "createdAt": now,
+            "updatedAt": now,
+            "extra_done": False,
+            "mindmap_enabled": mindmap_enabled,
+            "chat_seq": 0,
+        }
+    )
+
+
+async def update_thread(user_id: str, thread_id: str, **fields) -> bool:
+    """Set thread fields (and updatedAt unless given). Returns True if the thread exists."""
+    await _ensure_migrated(user_id)
+    fields.setdefault("updatedAt", _now())
+    result = await async_db.threads.update_one(
+        {"userId": user_id, "threadId": thread_id}, {"$set": fields}
+    )
+    return result.matched_count > 0
+
+
+async def delete_thread(user_id: str, thread_id: str) -> bool:
+    """Delete a thread with its documents and messages. Returns True if it existed."""
+    await _ensure_migrated(user_id)
+    result = await async_db.threads.delete_one({"userId": user_id, "threadId": thread_id})
+    await async_db.thread_documents.delete_many({"userId": user_id, "threadId": thread_id})
+    await async_db.chat_messages.delete_many({"userId": user_id, "threadId": thread_id})
+    return result.deleted_count > 0
+
+
+async def get_thread_documents(user_id: str, thread_id: str) -> List[dict]:
+    await _ensure_migrated(user_id)
+    return await async_db.thread_documents.find(
+        {"userId": user_id, "threadId": thread_id}, _CHILD_FIELDS
+    ).sort("time_uploaded", ASCENDING).to_list()
+
+
+async def find_thread_document(user_id: str, thread_id: str, file_name: str) -> Optional[dict]:
+    await _ensure_migrated(user_id)
+    return await async_db.thread_documents.find_one(
+        {"userId": user_id, "threadId": thread_id, "file_name": file_name},
+        _CHILD_FIELDS,
+    )
+
+
+async def add_documents(user_id: str, thread_id: str, documents: List[dict]):
+    """Add document entries ({docId, title, type, file_name, time_uploaded}) to a thread."""
+    if not documents:
+        return
+    await _ensure_migrated(user_id)
+    await async_db.thread_documents.bulk_write(
+        [
+            UpdateOne(
+                {"userId": user_id, "threadId": thread_id, "docId": document["docId"]},
+                {"$set": document},
+                upsert=True,
+            )
+            for document in documents
+        ],
+        ordered=False,
+    )
+    await update_thread(user_id, thread_id)
+
+
+async def get_chat_messages(user_id: str, thread_id: str) -> List[dict]:
+    await _ensure_migrated(user_id)
+    messages = await async_db.chat_messages.find(
+        {"userId": user_id, "threadId": thread_id}, _CHILD_FIELDS
+    ).sort("seq", ASCENDING).to_list()
+    for message in messages:
+        message.pop("seq", None)
+    return messages
+
+
+async def add_chat_messages(user_id: str, thread_id: str, messages: List[dict]):
+    """Append messages ({type, content, timestamp, sources?}) to a thread's chat."""
+    if not messages:
+        return
+    await _ensure_migrated(user_id)
+    # Reserve consecutive sequence numbers so concurrent appends never collide
+    thread = await async_db.threads.find_one_and_update(
+        {"userId": user_id, "threadId": thread_id},
+        {"$inc": {"chat_seq": len(messages)}, "$set": {"updatedAt": _now()}},
+        projection={"chat_seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if thread is None:
+        return
+    first_seq = thread["chat_seq"] - len(messages)
+    await async_db.chat_messages.insert_many(
+        [
+            {"userId": user_id, "threadId": thread_id, "seq": first_seq + i, **message}
+            for i, message in enumerate(messages)
+        ]
+    )
+
+
+async def delete_chat_message(user_id: str, thread_id: str, index: int) -> Optional[List[dict]]:
+    """
+    Delete the message at position `index` of a thread's chat.
+
+    Returns:
+        List[dict]: The remaining messages, or None if the index is invalid.
+    """
+    await _ensure_migrated(user_id)
+    if index < 0:
+        return None
+    messages = (
+        await async_db.chat_messages.find(
+            {"userId": user_id, "threadId": thread_id}, {"_id": 1}
+        )
+        .sort("seq", ASCENDING)
+        .skip(index)
+        .limit(1)
+        .to_list()
+    )
+    if not messages:
+        return None
+    await async_db.chat_messages.delete_one({"_id": messages[0]["_id"]})
+    await update_thread(user_id, thread_id)
+    return await get_chat_messages(user_id, thread_id)
+
+
+async def clear_chat_messages(user_id: str, thread_id: str):
+    await _ensure_migrated(user_id)
+    await async_db.chat_messages.delete_many({"userId": user_id, "threadId": thread_id})
+    await update_thread(user_id, thread_id)
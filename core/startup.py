@@ -0,0 +1,116 @@
+"""
+Worker startup and readiness.
+
+Importing the app is cheap: Mongo connects on first use, the embedding and
+reranker models load on first use, and NLTK data loads when a word cloud is
+built. Each worker then initializes in the background after it starts serving:
+
+    1. create Mongo collections/indexes (retried until Mongo is reachable)
+    2. warm up the models with one dummy inference
+
+/health/live answers as soon as the worker runs. /health/ready answers 200
+only once both steps are done.
+
+With PRELOAD_MODELS=1 the model weights are loaded at import time instead.
+docker-entrypoint.sh then starts gunicorn with --preload, so the master
+process loads them once and the forked workers share the memory
+copy-on-write. Only weights are loaded in the master. No inference runs
+there, because torch/ONNX thread pools must not be created before fork.
+"""
+
+import asyncio
+import time
+
+from core.config import settings
+from core.constants import SWITCHES
+
+STARTUP_RETRY_SECONDS = 5
+
+_state = {
+    "started_at": time.time(),
+    "database": False,
+    "models": False,
+    "errors": [],
+}
+_tasks = set()
+
+
+def _record_error(error: str):
+    _state["errors"] = _state["errors"][-4:] + [error]
+
+
+def preload_models():
+    """Load model weights (no inference). Safe to call in the gunicorn master."""
+    from core.embeddings.vectorstore import embedding_function
+
+    start_time = time.time()
+    embedding_function.model
+    if SWITCHES["RERANKING"]:
+        from core.embeddings.reranker import get_reranker
+
+        get_reranker()
+    print(f"Preloaded models in {time.time() - start_time:.2f} seconds")
+
+
+def _warm_up_models():
+    from core.embeddings.vectorstore import embedding_function
+
+    embedding_function.embed_query("warm up")
+    if SWITCHES["RERANKING"]:
+        from core.embeddings.reranker import get_reranker
+
+        get_reranker().predict([("warm up", "warm up")])
+
+
+async def _init_database():
+    from core.database import init_collections
+
+    while True:
+        try:
+            await asyncio.to_thread(init_collections)
+            _state["database"] = True
+            return
+        except Exception as e:
+            _record_error(f"database: {e}")
+            print(f"Database init failed, retrying in {STARTUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+
+async def _init_models():
+    start_time = time.time()
+    try:
+        await asyncio.to_thread(_warm_up_models)
+        print(f"Models warmed up in {time.time() - start_time:.2f} seconds")
+    except Exception as e:
+        # Models still load on first use; don't keep the worker out of rotation
+        _record_error(f"models: {e}")
+        print(f"Model warm-up failed: {e}")
+    _state["models"] = True
+
+
+def start_background_init():
+    """Start worker initialization without delaying the start of serving."""
+    _state["started_at"] = time.time()
+    for coroutine in (_init_database(), _init_models()):
+        task = asyncio.create_task(coroutine)
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+
+def cancel_background_init():
+    for task in list(_tasks):
+        task.cancel()
+
+
+def readiness() -> dict:
+    return {
+        "ready": _state["database"] and _state["models"],
+        "database": _state["database"],
+        "models": _state["models"],
+        "uptime_seconds": round(time.time() - _state["started_at"], 1),
+        "errors": _state["errors"],
+    }
+
+
+if settings.PRELOAD_MODELS:
+    preload_models()
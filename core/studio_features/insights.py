@@ -3,31 +3,40 @@ from core.llm.prompts.insights_prompt import insights_prompt
 from core.models.document import Document
 from core.llm.client import invoke_llm
 from core.llm.outputs import InsightsLLMOutput
-from core.constants import GPU_INSIGHTS_LLM
-from core.utils.compress_data import compress_global_file_data
+from core.constants import GPU_INSIGHTS_LLM, PRIORITY_STUDIO
+from core.utils.token_budget import fit_documents
 
 os.makedirs("DEBUG", exist_ok=True)
 os.makedirs("debug", exist_ok=True)
 
 
-async def generate_insights(document: Document | list[Document]) -> InsightsLLMOutput:
-    document_text = fetch_document_content(document)
-
-    prompt = build_insights_prompt(document_text)
+async def generate_insights(
+    document: Document | list[Document], user_id: str = None
+) -> InsightsLLMOutput:
+    if isinstance(document, list):
+        # Shorten the documents just enough for the prompt to fit the context window
+        prompt = fit_documents(
+            document_dicts(document),
+            GPU_INSIGHTS_LLM.model,
+            lambda documents: build_insights_prompt(join_documents(documents)),
+        )
+    else:
+        prompt = build_insights_prompt(fetch_document_content(document))
     
     response: InsightsLLMOutput = await invoke_llm(
         gpu_model=GPU_INSIGHTS_LLM.model,
         response_schema=InsightsLLMOutput,
         contents=prompt,
         port=GPU_INSIGHTS_LLM.port,
+        priority=PRIORITY_STUDIO,
+        user_id=user_id,
     )
 
     return response
 
 
-def fetch_document_content(document: Document | list[Document]) -> str:
+def fetch_document_content(document: Document) -> str:
 
-    # If a single Document, use original logic
     if isinstance(document, Document):
         if hasattr(document, "full_text") and word_count(document.full_text) < 8000:
             print("Using full text for insights extraction")
@@ -41,29 +50,25 @@ def fetch_document_content(document: Document | list[Document]) -> str:
             text = " ".join(words)
         return f"\n{document.title}\n\n{text}"
 
-    # If a list of Document, compress contents
-    elif isinstance(document, list):
-        doc_dicts = []
-        for doc in document:
-            if hasattr(doc, "full_text") and word_count(doc.full_text) < 8000:
-                text = doc.full_text
-            elif hasattr(doc, "summary") and doc.summary:
-                text = doc.summary
-            else:
-                words = doc.full_text.split()[:8000]
-                text = " ".join(words)
-            doc_dicts.append({"title": doc.title, "content": text})
-        # Dummy values for other args
-        compressed = compress_global_file_data(
-            doc_dicts,
-            max_tokens=50000,
-            gpu_model=GPU_INSIGHTS_LLM.model,
-            prompt_offset=2000,
-        )
-        # Join all compressed docs into one string
-        return "Multiple Documents\n\n".join(
-            f"Title - {d['title']}\n\nContent - {d['content']}" for d in compressed
-        )
+
+def document_dicts(documents: list[Document]) -> list[dict]:
+    doc_dicts = []
+    for doc in documents:
+        if hasattr(doc, "full_text") and word_count(doc.full_text) < 8000:
+            text = doc.full_text
+        elif hasattr(doc, "summary") and doc.summary:
+            text = doc.summary
+        else:
+            words = doc.full_text.split()[:8000]
+            text = " ".join(words)
+        doc_dicts.append({"title": doc.title, "content": text})
+    return doc_dicts
+
+
+def join_documents(doc_dicts: list[dict]) -> str:
+    return "Multiple Documents\n\n".join(
+        f"Title - {d['title']}\n\nContent - {d['content']}" for d in doc_dicts
+    )
 
 
 def word_count(text: str) -> int:
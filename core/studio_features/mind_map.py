@@ -97,6 +97,7 @@ async def create_mind_map_global(parsed_data: Documents):
                 contents=prompt,
                 gpu_model=GPU_NODE_GENERATION_LLM.model,
                 port=GPU_NODE_GENERATION_LLM.port,
+                user_id=parsed_data.user_id,
             )
 
             end = time.time()
@@ -305,6 +306,7 @@ async def add_node_descriptions_global(
                     response_schema=FlatNodeWithDescriptionOutput,
                     gpu_model=GPU_NODE_DESCRIPTION_LLM.model,
                     port=GPU_NODE_DESCRIPTION_LLM.port,
+                    user_id=parsed_data.user_id,
                 )
                 llm_res_aft = time.time()
 
@@ -398,7 +400,7 @@ async def delayed_mark(parsed_data: Documents):
     )
     await asyncio.sleep(20)
 
-    modified = mark_extra_done(parsed_data.user_id, parsed_data.thread_id, True)
+    modified = await mark_extra_done(parsed_data.user_id, parsed_data.thread_id, True)
     if modified:
         print("Marked thread as extra_done")
     else:
@@ -2,7 +2,6 @@ import asyncio
 import os
 import json
 import aiofiles
-import datetime
 from typing import List
 from core.llm.client import invoke_llm
 from core.models.document import Documents, Document
@@ -19,7 +18,7 @@ from core.llm.prompts.summarizer_prompt import (
 import time
 from app.socket_handler import sio
 from core.studio_features.mind_map import create_mind_map_global
-from core.database import db
+from core.services import parsed_store, thread_store
 from core.constants import (
     GPU_DOC_SUMMARIZER_LLM,
     GPU_GLOBAL_SUMMARIZER_LLM,
@@ -54,7 +53,7 @@ def chunk_text(text: str, max_words: int = 10000) -> list[str]:
     return [" ".join(words[i : i + max_words]) for i in range(0, len(words), max_words)]
 
 
-async def process_document_with_chunks(document: Document):
+async def process_document_with_chunks(document: Document, user_id: str = None):
     """
     Summarizes a document with conditional chunking:
     - ≤10k words: summarize directly
@@ -75,6 +74,7 @@ async def process_document_with_chunks(document: Document):
                     contents=prompt,
                     gpu_model=GPU_DOC_SUMMARIZER_LLM.model,
                     port=GPU_DOC_SUMMARIZER_LLM.port,
+                    user_id=user_id,
                 )
                 if result and result.summary and len(result.summary.split()) >= 5:
                     document.summary = result.summary
@@ -98,6 +98,7 @@ async def process_document_with_chunks(document: Document):
                     contents=prompt,
                     gpu_model=GPU_DOC_SUMMARIZER_LLM.model,
                     port=GPU_DOC_SUMMARIZER_LLM.port,
+                    user_id=user_id,
                 )
                 if result and result.summary and len(result.summary.split()) >= 5:
                     partial_summaries.append(result.summary)
@@ -127,6 +128,7 @@ async def process_document_with_chunks(document: Document):
                 contents=combine_prompt,
                 gpu_model=GPU_DOC_SUMMARIZER_LLM.model,
                 port=GPU_DOC_SUMMARIZER_LLM.port,
+                user_id=user_id,
             )
             if combined_result and combined_result.summary:
                 document.summary = combined_result.summary
@@ -135,9 +137,6 @@ async def process_document_with_chunks(document: Document):
 
 
 async def summarize_documents(parsed_data: Documents):
-    parsed_dir = f"data/{parsed_data.user_id}/threads/{parsed_data.thread_id}/parsed"
-    os.makedirs(parsed_dir, exist_ok=True)
-
     documents = parsed_data.documents
 
     async def process_document(i, document):
@@ -145,7 +144,7 @@ async def summarize_documents(parsed_data: Documents):
             f"{parsed_data.user_id}/progress",
             {"message": f"Summarizing {document.title} in chunks"},
         )
-        await process_document_with_chunks(document)
+        await process_document_with_chunks(document, parsed_data.user_id)
 
         if document.summary:
             await sio.emit(
@@ -171,18 +170,21 @@ async def summarize_documents(parsed_data: Documents):
                 ]
                 await asyncio.gather(*(process_document(i, doc) for i, doc in batch))
 
-            # Save per-document summaries
+            # Save per-document summaries (only the small index entry is rewritten)
             for document in parsed_data.documents:
+                if await parsed_store.update_metadata(
+                    parsed_data.user_id,
+                    parsed_data.thread_id,
+                    document.id,
+                    summary=document.summary,
+                ):
+                    continue
                 document_dict = document.model_dump()
                 document_dict["thread_id"] = parsed_data.thread_id
                 document_dict["user_id"] = parsed_data.user_id
-                document_json = json.dumps(document_dict, ensure_ascii=False)
-
-                name, _ = os.path.splitext(document.file_name)
-                json_file_path = os.path.join(parsed_dir, f"{name}.json")
-
-                async with aiofiles.open(json_file_path, "w", encoding="utf-8") as f:
-                    await f.write(document_json)
+                await parsed_store.save_document(
+                    parsed_data.user_id, parsed_data.thread_id, document_dict
+                )
         except Exception as e:
             print(f"Error during summarization: {e}")
 
@@ -198,45 +200,35 @@ async def global_summarizer(user_id: str, thread_id: str):
     Asynchronously summarizes all documents for a user in a specific thread.
     """
     save_dir = f"data/{user_id}/threads/{thread_id}"
-    parsed_dir = f"data/{user_id}/threads/{thread_id}/parsed"
-    os.makedirs(parsed_dir, exist_ok=True)
+    os.makedirs(save_dir, exist_ok=True)
 
-    user = db.users.find_one({"userId": user_id}, {"_id": 0, "password": 0})
+    user = await thread_store.get_user(user_id)
     if not user:
         print(f"User with ID {user_id} not found")
         await sio.emit(f"{user_id}/{thread_id}/global", {"status": False})
         return
-    user_threads = user.get("threads", {})
 
-    if thread_id not in user_threads:
+    if not await thread_store.thread_exists(user_id, thread_id):
         print(f"No thread found with ID {thread_id} for user {user_id}")
         await sio.emit(f"{user_id}/{thread_id}/global", {"status": False})
         return
 
     summaries = []
-    thread_documents = user_threads.get(thread_id, {}).get("documents", [])
+    thread_documents = await thread_store.get_thread_documents(user_id, thread_id)
     if not thread_documents:
         print(f"No documents found in thread {thread_id} for user {user_id}")
         await sio.emit(f"{user_id}/{thread_id}/global", {"status": False})
         return
 
     for document in thread_documents:
-        file_name = document["file_name"]
-        if not file_name:
-            print(f"Document {document['id']} has no file name, skipping...")
-            continue
-
-        name, _ = os.path.splitext(file_name)
-        json_file_path = os.path.join(parsed_dir, f"{name}.json")
-
-        if not os.path.exists(json_file_path):
-            print(f"Parsed file {json_file_path} does not exist, skipping...")
+        # Only the index entry (title, summary) is read, not the full text
+        document_data = await parsed_store.get_entry(
+            user_id, thread_id, document["docId"]
+        )
+        if not document_data:
+            print(f"Parsed document {document['docId']} does not exist, skipping...")
             continue
 
-        async with aiofiles.open(json_file_path, "r", encoding="utf-8") as f:
-            content = await f.read()
-        document_data = json.loads(content)
-
         if document_data.get("summary"):
             summaries.append(
                 {"title": document_data["title"], "summary": document_data["summary"]}
@@ -259,6 +251,7 @@ async def global_summarizer(user_id: str, thread_id: str):
             contents=summary_prompt,
             gpu_model=GPU_GLOBAL_SUMMARIZER_LLM.model,
             port=GPU_GLOBAL_SUMMARIZER_LLM.port,
+            user_id=user_id,
         )
 
         end_time = time.time()
@@ -282,16 +275,7 @@ async def global_summarizer(user_id: str, thread_id: str):
 
 
 async def updateThread(user_id: str, thread_id: str, updated_title: str):
-    now = datetime.datetime.now(datetime.timezone.utc)
-    db.users.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                f"threads.{thread_id}.thread_name": updated_title,
-                f"threads.{thread_id}.updatedAt": now,
-            }
-        },
-    )
+    await thread_store.update_thread(user_id, thread_id, thread_name=updated_title)
 
     event_name = f"{user_id}/title_update"
     event_data = {"thread_id": thread_id, "new_title": updated_title}
@@ -19,8 +19,23 @@ from app.socket_handler import sio
 
 from core.llm.client import invoke_llm
 
-if settings.MODE == "development":
-    nltk.download("stopwords")
+_english_stopwords = None
+
+
+def english_stopwords() -> set:
+    """NLTK English stop words, loaded (and in development downloaded) on first use."""
+    global _english_stopwords
+    if _english_stopwords is None:
+        try:
+            words = stopwords.words("english")
+        except LookupError:
+            if settings.MODE != "development":
+                raise
+            nltk.download("stopwords", quiet=True)
+            words = stopwords.words("english")
+        _english_stopwords = set(words)
+    return _english_stopwords
+
 
 async def generate_word_cloud(text: str, stop_words: list[str], max_words: int = 1000):
     """
@@ -71,7 +86,7 @@ def clean_text(text: str) -> str:
     text = re.sub(r"\s+", " ", text).strip()
 
     # Define stopwords
-    stop_words = set(stopwords.words("english"))
+    stop_words = set(english_stopwords())
     custom_stopwords = {
         "u",
         "n",
@@ -132,7 +147,7 @@ async def create_stop_words(parsed_data: Documents):
                 f"{parsed_data.user_id}/progress",
                 {"message": f"Creating stop words for {doc.title}"},
             )
-            stop_words = await get_stop_words_llm(doc_text)
+            stop_words = await get_stop_words_llm(doc_text, parsed_data.user_id)
             save_dict = {
                 "user_id": parsed_data.user_id,
                 "thread_id": parsed_data.thread_id,
@@ -167,7 +182,7 @@ def limit_words(text, max_words=5000):
     return " ".join(words)
 
 
-async def get_stop_words_llm(text: str) -> list[str]:
+async def get_stop_words_llm(text: str, user_id: str = None) -> list[str]:
     words = text.split()
     batch_size = 5000
     stopwords_set = set()
@@ -211,6 +226,7 @@ Guidelines:
                     remove_thinking=True,
                     gpu_model=GPU_STOP_WORDS_EXTRACTION_LLM.model,
                     port=GPU_STOP_WORDS_EXTRACTION_LLM.port,
+                    user_id=user_id,
                 )
 
                 stopwords_set.update(response.stopwords)
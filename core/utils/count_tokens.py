@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import tiktoken
 
 map = {
@@ -6,9 +8,14 @@ map = {
     "qwen3:4b": "cl100k_base",
     "gpt-oss:20b": "o200k_harmony",
     "gpt-oss:20b-50k-8k": "o200k_harmony",
+    "qwen3:14b-39500-8k": "cl100k_base",
 }
 
 
+@lru_cache(maxsize=None)
+def get_encoding(gpu_model: str = "gpt-oss:20b") -> tiktoken.Encoding:
+    return tiktoken.get_encoding(map.get(gpu_model, "o200k_harmony"))
+
+
 def count_tokens(text: str, gpu_model: str = "gpt-oss:20b") -> int:
-    encoding = tiktoken.get_encoding(map.get(gpu_model, "o200k_harmony"))
-    return len(encoding.encode(text))
+    return len(get_encoding(gpu_model).encode(text))
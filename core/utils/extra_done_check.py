@@ -1,23 +1,21 @@
-from core.database import db
+from core.services import thread_store
+from core.services.answer_cache import bump_thread_version
 
 
-def is_extra_done(user_id: str, thread_id: str):
-    thread = db.users.find_one(
-        {"userId": user_id, f"threads.{thread_id}": {"$exists": True}},
-        {f"threads.{thread_id}": 1},
+async def is_extra_done(user_id: str, thread_id: str):
+    thread = await thread_store.get_thread(
+        user_id, thread_id, with_documents=False, with_chats=False
     )
     if not thread:
         return False
-    return thread.get("threads", {}).get(thread_id, {}).get("extra_done", False)
+    return thread.get("extra_done", False)
 
 
-def mark_extra_done(user_id: str, thread_id: str, value: bool = True):
+async def mark_extra_done(user_id: str, thread_id: str, value: bool = True):
     try:
-        result = db.users.update_one(
-            {"userId": user_id, f"threads.{thread_id}": {"$exists": True}},
-            {"$set": {f"threads.{thread_id}.extra_done": value}},
-        )
-        return result.modified_count > 0
+        updated = await thread_store.update_thread(user_id, thread_id, extra_done=value)
+        bump_thread_version(user_id, thread_id)
+        return updated
     except Exception as e:
         print(f"Error marking extra_done: {e}")
         return False
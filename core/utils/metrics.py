@@ -0,0 +1,35 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+# Process-wide counters/gauges grouped by namespace, e.g. metrics["vectorstore"]["hits"]
+_metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_metrics_lock = threading.Lock()
+
+
+def increment(namespace: str, key: str, value: float = 1) -> None:
+    """Increment a counter inside the given namespace."""
+    with _metrics_lock:
+        _metrics[namespace][key] += value
+
+
+def set_value(namespace: str, key: str, value: float) -> None:
+    """Set a gauge inside the given namespace."""
+    with _metrics_lock:
+        _metrics[namespace][key] = value
+
+
+def get_metrics(namespace: Optional[str] = None) -> dict:
+    """
+    Return a snapshot of the collected metrics.
+
+    Args:
+        namespace (str, optional): Only return metrics of this namespace.
+
+    Returns:
+        dict: {namespace: {key: value}} or {key: value} if a namespace is given.
+    """
+    with _metrics_lock:
+        if namespace is not None:
+            return dict(_metrics.get(namespace, {}))
+        return {name: dict(values) for name, values in _metrics.items()}
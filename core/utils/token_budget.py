@@ -0,0 +1,155 @@
+"""
+Token budgets for prompts built from many documents (insights, roadmaps).
+
+Every document is tokenized once. The budget is then split by water-filling:
+documents shorter than their share are kept whole, and what they don't use
+is shared among the rest (weighted by `priorities` if given). Content is cut
+on a token boundary, moved back to the last sentence end when one is close.
+
+fit_documents() also checks the final prompt against the model's context
+window (MODEL_CONTEXT_WINDOWS minus the output reserved in
+MODEL_MAX_OUTPUT_TOKENS), so the LLM call never overflows it.
+"""
+
+import re
+from typing import Callable, List, Optional
+
+from core.constants import (
+    DEFAULT_CONTEXT_WINDOW,
+    DEFAULT_MAX_OUTPUT_TOKENS,
+    MODEL_CONTEXT_WINDOWS,
+    MODEL_MAX_OUTPUT_TOKENS,
+    PROMPT_SAFETY_MARGIN,
+)
+from core.utils.count_tokens import get_encoding
+
+# A cut is moved back to a sentence end only within this share of the kept text
+SENTENCE_WINDOW = 0.2
+FIT_ATTEMPTS = 3
+
+_SENTENCE_END = re.compile(r"[.!?]\s|\n")
+
+
+def prompt_token_limit(gpu_model: str) -> int:
+    """Tokens a prompt for `gpu_model` may use, leaving room for the output."""
+    return (
+        MODEL_CONTEXT_WINDOWS.get(gpu_model, DEFAULT_CONTEXT_WINDOW)
+        - MODEL_MAX_OUTPUT_TOKENS.get(gpu_model, DEFAULT_MAX_OUTPUT_TOKENS)
+        - PROMPT_SAFETY_MARGIN
+    )
+
+
+def allocate(
+    lengths: List[int], budget: int, priorities: Optional[List[float]] = None
+) -> List[int]:
+    """
+    Split `budget` tokens between documents of the given token lengths.
+
+    Args:
+        lengths (List[int]): Tokens of each document.
+        budget (int): Tokens available for all of them.
+        priorities (List[float], optional): Relative weight of each document
+            (default: equal). A document never gets more than its length.
+
+    Returns:
+        List[int]: Tokens kept per document, summing to at most `budget`.
+    """
+    weights = priorities or [1.0] * len(lengths)
+    allocation = [0] * len(lengths)
+    if sum(lengths) <= budget:
+        return list(lengths)
+
+    remaining = max(budget, 0)
+    # Documents needing the smallest share of the level fit first
+    pending = sorted(
+        (i for i in range(len(lengths)) if weights[i] > 0),
+        key=lambda i: lengths[i] / weights[i],
+    )
+    while pending:
+        level = remaining / sum(weights[i] for i in pending)
+        first = pending[0]
+        if lengths[first] <= weights[first] * level:
+            allocation[first] = lengths[first]
+            remaining -= lengths[first]
+            pending.pop(0)
+            continue
+        # Nobody left fits whole: everyone gets their weighted share
+        for i in pending:
+            allocation[i] = int(weights[i] * level)
+        break
+    return allocation
+
+
+def truncate_tokens(tokens: List[int], limit: int, encoding) -> str:
+    """Decode the first `limit` tokens, preferring to end on a sentence."""
+    if limit >= len(tokens):
+        return encoding.decode(tokens)
+    if limit <= 0:
+        return ""
+    text = encoding.decode(tokens[:limit]).rstrip("\ufffd")
+    window_start = int(len(text) * (1 - SENTENCE_WINDOW))
+    last_end = None
+    for match in _SENTENCE_END.finditer(text, window_start):
+        last_end = match.start() + 1
+    return text[:last_end] if last_end else text
+
+
+def pack_documents(
+    documents: List[dict],
+    gpu_model: str,
+    budget: int,
+    priorities: Optional[List[float]] = None,
+    tokens: Optional[List[List[int]]] = None,
+) -> List[dict]:
+    """
+    Truncate the 'content' of each {"title", "content"} dict so that all
+    contents together take at most `budget` tokens. Returns new dicts.
+    `tokens` are the already encoded contents, if the caller has them.
+    """
+    encoding = get_encoding(gpu_model)
+    if tokens is None:
+        tokens = [encoding.encode(doc["content"]) for doc in documents]
+    allocation = allocate([len(t) for t in tokens], budget, priorities)
+    return [
+        {**doc, "content": truncate_tokens(doc_tokens, limit, encoding)}
+        for doc, doc_tokens, limit in zip(documents, tokens, allocation)
+    ]
+
+
+def fit_documents(
+    documents: List[dict],
+    gpu_model: str,
+    render: Callable[[List[dict]], str],
+    priorities: Optional[List[float]] = None,
+) -> str:
+    """
+    Build the prompt `render(documents)` with document contents shortened just
+    enough for the prompt to fit the context window of `gpu_model`.
+
+    Raises:
+        ValueError: If the prompt doesn't fit even with empty contents.
+    """
+    encoding = get_encoding(gpu_model)
+    limit = prompt_token_limit(gpu_model)
+
+    # Template, titles and separators: everything but the contents
+    overhead = len(
+        encoding.encode(render([{**doc, "content": ""} for doc in documents]))
+    )
+    budget = limit - overhead
+    if budget <= 0:
+        raise ValueError(
+            f"Prompt template takes {overhead} tokens, over the {limit} available for {gpu_model}"
+        )
+
+    tokens = [encoding.encode(doc["content"]) for doc in documents]
+    for _ in range(FIT_ATTEMPTS):
+        packed = pack_documents(documents, gpu_model, budget, priorities, tokens)
+        prompt = render(packed)
+        used = len(encoding.encode(prompt))
+        if used <= limit:
+            return prompt
+        # Tokens merge differently at the joins; shrink by the excess and retry
+        budget = max(budget - (used - limit), 0)
+    print(f"Prompt for {gpu_model} may exceed its context window ({used}/{limit} tokens)")
+    return prompt
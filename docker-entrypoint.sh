@@ -1,10 +1,19 @@
 #!/bin/bash
 set -e
 
+# PRELOAD_MODELS=true loads the models once in the gunicorn master and shares them
+# with the forked workers (copy-on-write), see core/startup.py. Read through the
+# app's settings (environment and .env), so --preload always matches what the app does.
+GUNICORN_PRELOAD=""
+if [ "$(python -c 'from core.config import settings; print(settings.PRELOAD_MODELS)')" = "True" ]; then
+    GUNICORN_PRELOAD="--preload"
+fi
+
 # Start FastAPI backend in background
 gunicorn app.main:app \
     -k uvicorn.workers.UvicornWorker \
     --workers 4 \
+    $GUNICORN_PRELOAD \
     --bind 0.0.0.0:8000  &
 
 # Start nginx in foreground
@@ -217,7 +217,7 @@ export const ThreadSidebar = ({ threads, activeThreadId, collapsed, onToggleColl
                       </span>
                       <span className="flex items-center gap-1">
                         <MessageSquare className="w-3 h-3" />
-                        {thread.chats?.length || 0}
+                        {thread.chats?.length ?? thread.chat_count ?? 0}
                       </span>
                     </div>
                     <div className="text-xs text-muted-foreground mt-1">
@@ -13,7 +13,9 @@ export interface Thread {
   createdAt: string;
   updatedAt: string;
   documents: Document[];
-  chats: Chat[];
+  // Only loaded per thread (getThread); the thread list carries chat_count
+  chats?: Chat[];
+  chat_count?: number;
 }
 
 export interface Document {
@@ -68,7 +70,17 @@ export interface UploadResponse {
   status: string;
   message: string;
   thread_id: string;
+  job_id?: string;
+  documents: Document[];
+}
+
+export interface UploadJob {
+  jobId: string;
+  threadId: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  stage: string;
   documents: Document[];
+  error: string | null;
 }
 
 export interface QueryResponse {
@@ -353,6 +365,25 @@ export const getCurrentUser = (): User | null => {
 export const setCurrentUser = (user: User) => localStorage.setItem('current_user', JSON.stringify(user));
 export const removeCurrentUser = () => localStorage.removeItem('current_user');
 
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Uploaded files are processed in a background job; resolve once it has finished
+const waitForUploadJob = async (response: UploadResponse): Promise<UploadResponse> => {
+  if (!response.job_id) return response;
+  const token = getAuthToken();
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const res = await fetch(`${API_URL}/jobs/${response.job_id}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    const data = await res.json();
+    const job: UploadJob | undefined = data.job;
+    if (!job) throw new Error(data.error || 'Upload job not found');
+    if (job.status === 'completed') return { ...response, documents: job.documents };
+    if (job.status === 'failed') throw new Error(job.error || 'Upload failed');
+  }
+};
+
 // API functions
 export const api = {
   async register(name: string, email: string, password: string) {
@@ -402,7 +433,7 @@ export const api = {
       headers: { Authorization: `Bearer ${token}` },
       body: formData,
     });
-    return response.json();
+    return waitForUploadJob(await response.json());
   },
 
 
@@ -464,9 +495,9 @@ export const api = {
           xhr.setRequestHeader('Authorization', `Bearer ${token}`);
         }
 
-        xhr.onload = () => {
+        xhr.onload = async () => {
           try {
-            const json: UploadResponse = JSON.parse(xhr.responseText);
+            const json: UploadResponse = await waitForUploadJob(JSON.parse(xhr.responseText));
             if (!results.thread_id && json.thread_id) {
               results.thread_id = json.thread_id;
             }
@@ -77,6 +77,7 @@ const NewThread = () => {
                 updatedAt: now,
                 documents: [],
                 chats: [],
+                chat_count: 0,
               },
             },
           });
@@ -34,7 +34,7 @@ const Profile = () => {
     0
   );
   const totalChats = Object.values(user.threads || {}).reduce(
-    (acc, thread) => acc + (thread.chats?.length || 0),
+    (acc, thread) => acc + (thread.chats?.length ?? thread.chat_count ?? 0),
     0
   );
 
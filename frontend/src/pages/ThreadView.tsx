@@ -71,6 +71,7 @@ const ThreadView = () => {
         updatedAt: extra?.updatedAt ?? existingThread?.updatedAt ?? nowIso,
         documents: extra?.documents ?? existingThread?.documents ?? [],
         chats: nextChats,
+        chat_count: nextChats.length,
       };
 
       const updatedUser = {